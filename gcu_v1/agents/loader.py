@@ -1,6 +1,8 @@
-﻿import json
+﻿import logging
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+from gcu_v1.pipeline._utils import load_json_cached
 
 AGENTS_DIR = Path(__file__).resolve().parent
 
@@ -8,14 +10,22 @@ _CAPABILITY_MAP = {
     "doc_triage": "agent_01_doc_triage",
 }
 
-def load_agent_bundle(capability: str) -> Dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+# Shadow bundles are compiled into the config snapshot (build/reload), never per request;
+# (dir, capability) -> (file stamp, bundle or None if it failed to load)
+_SHADOW_CACHE: Dict[Tuple[str, str], Tuple[Tuple[Optional[int], ...], Optional[Dict[str, Any]]]] = {}
+_BUNDLE_FILES = ("manifest.json", "policy.json", "keywords.json", "schema.json")
+
+
+def load_agent_bundle(capability: str, base_dir: Optional[Path] = None) -> Dict[str, Any]:
     if capability not in _CAPABILITY_MAP:
         raise ValueError(f"Unknown capability: {capability}")
 
-    base = AGENTS_DIR / _CAPABILITY_MAP[capability]
+    base = Path(base_dir) if base_dir else AGENTS_DIR / _CAPABILITY_MAP[capability]
 
     def read_json(p: Path) -> Dict[str, Any]:
-        return json.loads(p.read_text(encoding="utf-8"))
+        return load_json_cached(p)
 
     return {
         "capability": capability,
@@ -25,3 +35,130 @@ def load_agent_bundle(capability: str) -> Dict[str, Any]:
         "keywords": read_json(base / "keywords.json"),
         "schema": read_json(base / "schema.json"),
     }
+
+
+def capabilities() -> List[str]:
+    return list(_CAPABILITY_MAP)
+
+
+def bundle_files() -> List[Path]:
+    """Files load_agent_bundle reads for every capability (change detection)."""
+    return [AGENTS_DIR / d / name for d in _CAPABILITY_MAP.values() for name in _BUNDLE_FILES]
+
+
+_JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+def _check_schema(value: Any, schema: Dict[str, Any], where: str, errors: List[str]) -> None:
+    # Subset of JSON Schema: type, required, properties, items, enum, minimum, maximum
+    typ = schema.get("type")
+    if typ in _JSON_TYPES:
+        ok = isinstance(value, _JSON_TYPES[typ]) and not (typ in ("number", "integer") and isinstance(value, bool))
+        if not ok:
+            errors.append(f"{where}: expected {typ}")
+            return
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{where}: not one of {schema['enum']}")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{where}: below minimum {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{where}: above maximum {schema['maximum']}")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{where}: missing '{key}'")
+        for key, sub in (schema.get("properties") or {}).items():
+            if key in value and isinstance(sub, dict):
+                _check_schema(value[key], sub, f"{where}.{key}", errors)
+    if isinstance(value, list) and isinstance(schema.get("items"), dict):
+        for i, item in enumerate(value):
+            _check_schema(item, schema["items"], f"{where}[{i}]", errors)
+
+
+def validate_bundle(bundle: Dict[str, Any]) -> List[str]:
+    """
+    Built-in sanity checks plus the agent's schema.json, which is applied to
+    {"manifest": ..., "policy": ..., "keywords": ...}. Returns error strings.
+    """
+    errors: List[str] = []
+    kw = bundle.get("keywords")
+    if not isinstance(kw, dict):
+        errors.append("keywords: expected object")
+    else:
+        for group in ("high_risk_signals", "potential_risk_signals", "safe_signals"):
+            items = kw.get(group, [])
+            if not isinstance(items, list):
+                errors.append(f"keywords.{group}: expected array")
+                continue
+            for i, item in enumerate(items):
+                _check_schema(
+                    item,
+                    {"type": "object", "required": ["signal"],
+                     "properties": {"signal": {"type": "string"}, "weight": {"type": "number"}}},
+                    f"keywords.{group}[{i}]",
+                    errors,
+                )
+
+    thr = (bundle.get("manifest") or {}).get("confidence_threshold")
+    if thr is not None:
+        _check_schema(thr, {"type": "number", "minimum": 0, "maximum": 1}, "manifest.confidence_threshold", errors)
+
+    schema = bundle.get("schema") or {}
+    if schema:
+        doc = {k: bundle.get(k) for k in ("manifest", "policy", "keywords")}
+        _check_schema(doc, schema, "bundle", errors)
+    return errors
+
+
+def compile_bundle(bundle: Dict[str, Any]) -> Dict[str, Any]:
+    from gcu_v1.pipeline.doc_triage import compile_signals
+
+    out = dict(bundle)
+    out["compiled_signals"] = compile_signals(bundle.get("keywords") or {})
+    return out
+
+
+def load_shadow_bundle(capability: str, shadow_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Candidate ruleset evaluated in shadow next to production (NP_SHADOW_BUNDLE_DIR).
+    build_config compiles it into the snapshot; without `shadow_dir` the snapshot's bundle
+    is returned. Never raises: a broken shadow bundle must not affect the primary run, and
+    it is logged once per change of its files.
+    """
+    if shadow_dir is None:
+        from gcu_v1.config import current_config
+
+        return current_config().shadow_bundles.get(capability)
+    if not shadow_dir:
+        return None
+
+    base = Path(shadow_dir).resolve()
+    stamp = tuple(_mtime_ns(base / name) for name in _BUNDLE_FILES)
+    key = (str(base), capability)
+    cached = _SHADOW_CACHE.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    bundle: Optional[Dict[str, Any]] = None
+    try:
+        bundle = compile_bundle(load_agent_bundle(capability, base_dir=base))
+        bundle["shadow"] = True
+    except Exception:
+        logger.warning("Shadow bundle not loadable from %s; shadow disabled", shadow_dir, exc_info=True)
+    _SHADOW_CACHE[key] = (stamp, bundle)
+    return bundle
+
+
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
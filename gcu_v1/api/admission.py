@@ -0,0 +1,266 @@
+﻿from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.responses import JSONResponse
+
+# Admission control in front of the sync handlers.
+# Without it every /run goes straight into the Starlette threadpool, which queues
+# without bound and is shared with /review and /admin. Each pool has its own
+# concurrency limit and a bounded FIFO queue; requests are shed with Retry-After when
+#   - the queue is full                               -> 429 (queue_full)
+#   - they waited longer than max_wait                -> 503 (timeout)
+#   - queueing delay stayed above target for interval -> 503 (codel), CoDel-style:
+#     while the standing queue persists, arrivals that would have to wait are
+#     rejected immediately instead of adding to it.
+# Sync read/ops endpoints (/stats, /status/batch, /audit/search, /debug/*) get a pool of
+# their own, so audit streams or profiles cannot hold threads /review and /admin need;
+# /debug/profile runs one at a time. /health and /metrics bypass admission entirely.
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "gcu_admission_in_flight",
+    "Requests admitted and currently executing",
+    ["pool"],
+)
+
+ADMISSION_QUEUED = Gauge(
+    "gcu_admission_queued",
+    "Requests waiting for admission",
+    ["pool"],
+)
+
+ADMISSION_SHED_TOTAL = Counter(
+    "gcu_admission_shed_total",
+    "Requests rejected by admission control",
+    ["pool", "reason"],  # queue_full | timeout | codel
+)
+
+ADMISSION_QUEUE_WAIT_SECONDS = Histogram(
+    "gcu_admission_queue_wait_seconds",
+    "Time spent waiting for admission",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+
+class Shed(Exception):
+    def __init__(self, reason: str, status_code: int, retry_after: int) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+
+class AdmissionPool:
+    def __init__(
+        self,
+        name: str,
+        *,
+        limit: int,
+        max_queue: int,
+        max_wait_s: float,
+        codel_target_s: float = 0.1,
+        codel_interval_s: float = 0.5,
+    ) -> None:
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait_s = max_wait_s
+        self.codel_target_s = codel_target_s
+        self.codel_interval_s = codel_interval_s
+        self.in_flight = 0
+        self._waiters: Deque[Tuple[asyncio.Future, float]] = deque()
+        self._first_above: float = 0.0
+        self.dropping = False
+        self._service_s = 0.05  # EWMA of handler time, for Retry-After
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, *, limit: int, max_queue: int, max_wait_ms: float) -> "AdmissionPool":
+        return cls(
+            name,
+            limit=int(_env_num(f"{prefix}_CONCURRENCY", limit)),
+            max_queue=int(_env_num(f"{prefix}_QUEUE_MAX", max_queue)),
+            max_wait_s=_env_num(f"{prefix}_QUEUE_MAX_WAIT_MS", max_wait_ms) / 1000.0,
+            codel_target_s=_env_num(f"{prefix}_CODEL_TARGET_MS", 100) / 1000.0,
+            codel_interval_s=_env_num(f"{prefix}_CODEL_INTERVAL_MS", 500) / 1000.0,
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        # Time to drain what is already queued, rounded up to whole seconds
+        backlog = (self.queued + 1) * self._service_s / self.limit
+        return int(min(30, max(1, math.ceil(backlog))))
+
+    def _shed(self, reason: str, status_code: int) -> Shed:
+        ADMISSION_SHED_TOTAL.labels(pool=self.name, reason=reason).inc()
+        return Shed(reason, status_code, self.retry_after())
+
+    def _codel(self, sojourn: float, now: float) -> None:
+        if sojourn < self.codel_target_s or self.codel_target_s <= 0:
+            self._first_above = 0.0
+            self.dropping = False
+        elif self._first_above == 0.0:
+            self._first_above = now + self.codel_interval_s
+        elif now >= self._first_above:
+            self.dropping = True
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.labels(pool=self.name).set(self.in_flight)
+
+    async def acquire(self) -> float:
+        """Returns the queue wait in seconds; raises Shed if the request is rejected."""
+        if self.in_flight < self.limit and not self._waiters:
+            self._admit()
+            ADMISSION_QUEUE_WAIT_SECONDS.labels(pool=self.name).observe(0.0)
+            return 0.0
+        if self.dropping:
+            raise self._shed("codel", 503)
+        if len(self._waiters) >= self.max_queue:
+            raise self._shed("queue_full", 429)
+
+        t0 = time.monotonic()
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        entry = (fut, t0)
+        self._waiters.append(entry)
+        ADMISSION_QUEUED.labels(pool=self.name).set(len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.max_wait_s)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # Granted in the same tick the wait timed out or was cancelled
+                if isinstance(e, asyncio.TimeoutError):
+                    return self._waited(t0)
+                self.release(0.0)
+                raise
+            fut.cancel()
+            try:
+                self._waiters.remove(entry)
+            except ValueError:
+                pass
+            ADMISSION_QUEUED.labels(pool=self.name).set(len(self._waiters))
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("timeout", 503)
+            raise
+        return self._waited(t0)
+
+    def _waited(self, t0: float) -> float:
+        waited = time.monotonic() - t0
+        ADMISSION_QUEUE_WAIT_SECONDS.labels(pool=self.name).observe(waited)
+        return waited
+
+    def release(self, service_s: float) -> None:
+        if service_s > 0:
+            self._service_s = 0.8 * self._service_s + 0.2 * service_s
+        self.in_flight -= 1
+        now = time.monotonic()
+        while self._waiters:
+            fut, t0 = self._waiters.popleft()
+            if fut.done():
+                continue
+            # Hand the slot over directly; in_flight stays the same
+            self.in_flight += 1
+            self._codel(now - t0, now)
+            fut.set_result(None)
+            break
+        else:
+            self._codel(0.0, now)
+        ADMISSION_QUEUED.labels(pool=self.name).set(len(self._waiters))
+        ADMISSION_IN_FLIGHT.labels(pool=self.name).set(self.in_flight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "max_wait_ms": round(self.max_wait_s * 1000.0, 3),
+            "dropping": self.dropping,
+        }
+
+
+def default_pools() -> Dict[str, AdmissionPool]:
+    return {
+        "run": AdmissionPool.from_env("run", "NP_RUN", limit=16, max_queue=64, max_wait_ms=2000),
+        "control": AdmissionPool.from_env("control", "NP_CONTROL", limit=8, max_queue=32, max_wait_ms=5000),
+        "ops": AdmissionPool.from_env("ops", "NP_OPS", limit=4, max_queue=16, max_wait_ms=5000),
+        # Blocks its thread for the whole sampling window: one at a time, never queued
+        "profile": AdmissionPool("profile", limit=1, max_queue=0, max_wait_s=0.0),
+    }
+
+
+_OPS_PATHS = ("/stats", "/status/batch", "/audit/search")
+
+
+def pool_for_path(path: str) -> Optional[str]:
+    if path == "/run":
+        return "run"
+    if path.startswith("/review/") or path.startswith("/admin/"):
+        return "control"
+    if path == "/debug/profile":
+        return "profile"
+    if path in _OPS_PATHS or path.startswith("/debug/"):
+        return "ops"
+    return None
+
+
+def ensure_thread_capacity(pools: Dict[str, AdmissionPool], headroom: int = 8) -> int:
+    """
+    Raises the anyio worker-thread limit to cover all pool limits plus headroom, so
+    admitted requests never wait for a thread behind another pool. Call from the loop.
+    """
+    from anyio import to_thread
+
+    limiter = to_thread.current_default_thread_limiter()
+    need = sum(p.limit for p in pools.values()) + headroom
+    if limiter.total_tokens < need:
+        limiter.total_tokens = need
+    return int(limiter.total_tokens)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: shed requests are answered before reaching the threadpool."""
+
+    def __init__(self, app: Any, pools: Optional[Dict[str, AdmissionPool]] = None) -> None:
+        self.app = app
+        self.pools = pools if pools is not None else default_pools()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        pool = self.pools.get(pool_for_path(scope.get("path", ""))) if scope["type"] == "http" else None
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            waited = await pool.acquire()
+        except Shed as e:
+            resp = JSONResponse(
+                {"detail": f"Overloaded ({e.reason}); retry later", "pool": pool.name},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await resp(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["gcu_admission_wait_s"] = waited
+        t0 = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release(time.monotonic() - t0)
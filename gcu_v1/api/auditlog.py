@@ -0,0 +1,173 @@
+﻿from __future__ import annotations
+
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within this process
+    fcntl = None
+
+# Append-only JSONL with a sidecar offset index (<file>.idx): entry i is the byte offset
+# of record i as little-endian u64. Appends write the records, then their offsets, under
+# one lock; readers seek straight to a page instead of parsing the file from the start.
+# The index catches up from the data file whenever it lags (files written before the
+# index existed, or a crash between the two writes).
+# Locking is per file: flock on the .idx across processes, plus a per-path thread lock
+# (the only guard where fcntl is missing), so appends to different runs never wait on
+# each other. The archive job deletes a run's files, .idx included, while holding that
+# flock; a waiter re-checks after acquiring it and locks the new .idx instead.
+
+_OFFSET = struct.Struct("<Q")
+# abspath -> [lock, users]; entries are dropped when the last user leaves
+_LOCKS: Dict[str, List[Any]] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+@contextmanager
+def _path_lock(path: str) -> Iterator[None]:
+    key = os.path.abspath(path)
+    with _LOCKS_GUARD:
+        entry = _LOCKS.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _LOCKS_GUARD:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _LOCKS[key]
+
+
+def _open_locked(path: str, create_dir: bool) -> BinaryIO:
+    while True:
+        if create_dir:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            idx = open(index_path(path), "a+b")
+        except FileNotFoundError:
+            if not create_dir:
+                raise
+            continue  # directory removed (run archived) between makedirs and open
+        if fcntl is None:
+            return idx
+        fcntl.flock(idx.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.stat(index_path(path)).st_ino == os.fstat(idx.fileno()).st_ino:
+                return idx
+        except FileNotFoundError:
+            pass
+        idx.close()  # locked an index the previous holder deleted; retry on the current one
+
+
+@contextmanager
+def _locked_index(path: str, create_dir: bool = False) -> Iterator[BinaryIO]:
+    with _path_lock(path):
+        idx = _open_locked(path, create_dir)
+        try:
+            yield idx
+        finally:
+            if fcntl is not None:
+                fcntl.flock(idx.fileno(), fcntl.LOCK_UN)
+            idx.close()
+
+
+def _catch_up(path: str, idx: BinaryIO) -> int:
+    """Indexes records the index does not cover yet; returns the record count."""
+    size = idx.seek(0, os.SEEK_END)
+    n = size // _OFFSET.size
+    if size % _OFFSET.size:
+        idx.truncate(n * _OFFSET.size)  # torn entry
+    if not os.path.exists(path):
+        return n
+    with open(path, "rb") as f:
+        pos = 0
+        if n:
+            idx.seek((n - 1) * _OFFSET.size)
+            f.seek(_OFFSET.unpack(idx.read(_OFFSET.size))[0])
+            f.readline()
+            pos = f.tell()
+        if pos >= os.fstat(f.fileno()).st_size:
+            return n
+        f.seek(pos)
+        new: List[bytes] = []
+        for line in iter(f.readline, b""):
+            if line.strip() and line.endswith(b"\n"):  # no half-written tail
+                new.append(_OFFSET.pack(pos))
+            pos += len(line)
+    idx.seek(0, os.SEEK_END)
+    idx.write(b"".join(new))
+    return n + len(new)
+
+
+def append_lines(path: str, lines: List[str], restore: Optional[Callable[[str], Any]] = None) -> int:
+    """
+    Appends JSONL lines (each ending in a newline) and indexes them; returns the first one's record number.
+    Creates the parent directory. `restore(path)` runs under the append lock when the file is missing,
+    to bring back an earlier copy (e.g. from the archive) before it is extended.
+    """
+    data = [line.encode("utf-8") for line in lines]
+    with _locked_index(path, create_dir=True) as idx:
+        if not os.path.exists(path):
+            idx.truncate(0)  # offsets into a file that was deleted (e.g. archived) are stale
+            if restore is not None:
+                restore(path)
+        first = _catch_up(path, idx)
+        with open(path, "ab") as f:
+            pos = f.seek(0, os.SEEK_END)
+            f.write(b"".join(data))
+        offsets = []
+        for line in data:
+            offsets.append(_OFFSET.pack(pos))
+            pos += len(line)
+        idx.seek(0, os.SEEK_END)
+        idx.write(b"".join(offsets))
+    return first
+
+
+def count(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with _locked_index(path) as idx:
+        return _catch_up(path, idx)
+
+
+def iter_lines(path: str, start: int = 0, limit: int = -1) -> Iterator[bytes]:
+    """Raw record lines from record `start` on (all indexed ones if limit < 0); one line in memory at a time."""
+    total = count(path)
+    if start >= total:
+        return
+    n = total - start if limit < 0 else min(limit, total - start)
+    with open(index_path(path), "rb") as idx:
+        idx.seek(start * _OFFSET.size)
+        first = _OFFSET.unpack(idx.read(_OFFSET.size))[0]
+    with open(path, "rb") as f:
+        f.seek(first)
+        while n > 0:
+            line = f.readline()
+            if not line:
+                return
+            if line.strip():
+                n -= 1
+                yield line
+
+
+def read_page(path: str, start: int, limit: int) -> Tuple[List[Dict[str, Any]], int]:
+    """(records start..start+limit, total record count); unparsable lines are skipped."""
+    total = count(path)
+    out: List[Dict[str, Any]] = []
+    for line in iter_lines(path, start, limit):
+        try:
+            out.append(json.loads(line))
+        except ValueError:
+            continue
+    return out, total
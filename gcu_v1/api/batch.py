@@ -0,0 +1,199 @@
+﻿from __future__ import annotations
+
+import argparse
+import glob
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, TextIO
+
+from gcu_v1.pipeline._utils import load_json_cached, new_run_id, sha256_file, utc_now_iso
+
+# Batch mode for nightly backfills: directory/glob -> process pool -> JSONL stream.
+# Memory stays bounded: files are enumerated lazily, at most `jobs * WINDOW_PER_JOB`
+# documents are in flight, and the resume ledger lives in SQLite instead of a set.
+# With a ledger, a worker claims a document's sha256 (in_flight, tagged with this batch)
+# before processing it, so identical files within one run are processed once; each
+# result is committed as it is emitted, so a crash re-processes only in-flight documents.
+
+WINDOW_PER_JOB = 4
+
+_worker_ledger: Optional[sqlite3.Connection] = None
+_worker_batch_id: Optional[str] = None
+
+
+def iter_batch_files(input_dir: Optional[str], pattern: Optional[str]) -> Iterator[Path]:
+    root = Path(input_dir).resolve() if input_dir else Path.cwd()
+    for rel in glob.iglob(pattern or "*", root_dir=str(root), recursive=True):
+        p = root / rel
+        if p.is_file():
+            yield p
+
+
+def open_ledger(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # per-document commits without an fsync each
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS processed (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        status TEXT NOT NULL,
+        run_id TEXT,
+        ts TEXT NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS in_flight (
+        sha256 TEXT PRIMARY KEY,
+        batch_id TEXT NOT NULL,   -- claims of other (crashed) batches are stale
+        path TEXT NOT NULL
+    )
+    """)
+    conn.commit()
+    return conn
+
+
+def _init_worker(manifest_path: str, policy_path: str, ledger_path: Optional[str], batch_id: str) -> None:
+    # Parse manifest/policy once per worker; _execute then hits load_json_cached
+    global _worker_ledger, _worker_batch_id
+    load_json_cached(Path(manifest_path))
+    load_json_cached(Path(policy_path))
+    _worker_ledger = None
+    if ledger_path:
+        _worker_ledger = sqlite3.connect(ledger_path, timeout=30, isolation_level=None)
+        _worker_ledger.execute("PRAGMA synchronous=NORMAL")
+    _worker_batch_id = batch_id
+
+
+def _claim(sha: str, path: str) -> Optional[Dict[str, Any]]:
+    """None if this worker may process the document, else the record to emit instead."""
+    c = _worker_ledger
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        row = c.execute("SELECT status, run_id FROM processed WHERE sha256 = ?", (sha,)).fetchone()
+        if row:
+            return {"path": path, "sha256": sha, "skipped": True, "status": row[0], "run_id": row[1]}
+        row = c.execute("SELECT batch_id, path FROM in_flight WHERE sha256 = ?", (sha,)).fetchone()
+        if row and row[0] == _worker_batch_id:
+            return {"path": path, "sha256": sha, "skipped": True, "status": None, "run_id": None,
+                    "duplicate_of": row[1]}
+        c.execute(
+            "INSERT OR REPLACE INTO in_flight (sha256, batch_id, path) VALUES (?, ?, ?)",
+            (sha, _worker_batch_id, path),
+        )
+        return None
+    finally:
+        c.execute("COMMIT")
+
+
+def _process_one(
+    path: str,
+    manifest_path: str,
+    policy_path: str,
+    outputs: str,
+    write_metadata_flag: bool,
+    approval_id: Optional[str],
+) -> Dict[str, Any]:
+    from gcu_v1.api.run import _execute
+
+    input_path = Path(path)
+    sha, size = sha256_file(input_path)
+    if _worker_ledger is not None:
+        skip = _claim(sha, path)
+        if skip is not None:
+            return skip
+
+    try:
+        res = _execute(
+            input_path=input_path,
+            manifest_path=Path(manifest_path),
+            policy_path=Path(policy_path),
+            outputs_dir=Path(outputs),
+            write_metadata_flag=write_metadata_flag,
+            approval_id=approval_id,
+            run_id=new_run_id(),
+            digest=(sha, size),
+        )
+    except Exception as e:
+        res = {"status": "error", "run_id": None, "error": f"{type(e).__name__}: {e}"}
+    return {"path": path, "sha256": sha, **res}
+
+
+def run_batch(args: argparse.Namespace, out: Optional[TextIO] = None) -> int:
+    jobs = max(1, int(args.jobs or 1))
+    manifest_path = str(Path(args.manifest).resolve())
+    policy_path = str(Path(args.policy).resolve())
+    outputs = str(Path(args.outputs).resolve())
+    ledger_path = str(Path(args.ledger).resolve()) if args.ledger else None
+
+    ledger = open_ledger(Path(ledger_path)) if ledger_path else None
+    batch_id = new_run_id()
+    sink = out or (open(args.jsonl_out, "a", encoding="utf-8") if args.jsonl_out else sys.stdout)
+
+    counts = {"files": 0, "processed": 0, "skipped": 0, "ok": 0, "not_ok": 0}
+    t0 = time.perf_counter()
+
+    def _emit(rec: Dict[str, Any]) -> None:
+        if rec.get("skipped"):
+            counts["skipped"] += 1
+        else:
+            counts["processed"] += 1
+            counts["ok" if rec.get("status") == "ok" else "not_ok"] += 1
+            if ledger is not None:
+                if rec.get("status") != "error":
+                    ledger.execute(
+                        "INSERT OR IGNORE INTO processed (sha256, path, status, run_id, ts) VALUES (?, ?, ?, ?, ?)",
+                        (rec["sha256"], rec["path"], str(rec.get("status")), rec.get("run_id"), utc_now_iso()),
+                    )
+                ledger.execute("DELETE FROM in_flight WHERE sha256 = ?", (rec["sha256"],))
+                ledger.commit()
+        sink.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    common = (manifest_path, policy_path, outputs, bool(args.write_metadata), args.approval_id)
+
+    try:
+        if jobs == 1:
+            _init_worker(manifest_path, policy_path, ledger_path, batch_id)
+            for p in iter_batch_files(args.input_dir, args.glob):
+                counts["files"] += 1
+                _emit(_process_one(str(p), *common))
+        else:
+            window = jobs * WINDOW_PER_JOB
+            pending: Set[Future] = set()
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=_init_worker,
+                initargs=(manifest_path, policy_path, ledger_path, batch_id),
+            ) as pool:
+                for p in iter_batch_files(args.input_dir, args.glob):
+                    counts["files"] += 1
+                    pending.add(pool.submit(_process_one, str(p), *common))
+                    if len(pending) >= window:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for f in done:
+                            _emit(f.result())
+                for f in wait(pending).done:
+                    _emit(f.result())
+    finally:
+        if ledger is not None:
+            ledger.execute("DELETE FROM in_flight WHERE batch_id = ?", (batch_id,))
+            ledger.commit()
+            ledger.close()
+        sink.flush()
+        if sink is not sys.stdout and out is None:
+            sink.close()
+
+    elapsed = time.perf_counter() - t0
+    summary = {
+        **counts,
+        "jobs": jobs,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(counts["processed"] / elapsed, 2) if elapsed > 0 else None,
+    }
+    print(json.dumps({"batch_summary": summary}), file=sys.stderr)
+    return 0 if counts["not_ok"] == 0 else 1
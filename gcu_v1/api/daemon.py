@@ -0,0 +1,139 @@
+﻿from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict
+
+from gcu_v1.api.run import build_parser, dispatch, exit_code_for
+from gcu_v1.logsetup import configure_logging
+from gcu_v1.pipeline._utils import env_truthy
+
+# Long-lived CLI daemon: keeps the interpreter, imports and parsed manifest/policy warm
+# so per-document invocations of gcu_v1.api.run only pay a socket round-trip.
+#
+# Protocol (one request per connection, newline-delimited JSON):
+#   -> {"args": {<argparse namespace of run.py>}, "cwd": "<client cwd>", "kill": <client GCU_KILL>}
+#   <- {"exit_code": 0|1|2, "result": {...}}  or  {"exit_code": n, "error": "..."}
+
+DEFAULT_SOCKET = "/tmp/gcu_v1_run.sock"
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def handle_request(req: Dict[str, Any]) -> Dict[str, Any]:
+    defaults = vars(build_parser().parse_args([]))
+    args = argparse.Namespace(**{**defaults, **(req.get("args") or {})})
+    args.daemon_socket = None
+    cwd = Path(req.get("cwd") or os.getcwd())
+
+    try:
+        # The kill switch fires if either side has it set: a client exporting GCU_KILL
+        # must not get past it just because the daemon was started without it
+        res = dispatch(args, cwd=cwd, kill=bool(req.get("kill")))
+        return {"exit_code": exit_code_for(res), "result": res}
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            return {"exit_code": e.code, "error": None}
+        return {"exit_code": 1, "error": str(e.code)}
+    except Exception as e:
+        return {"exit_code": 1, "error": f"{type(e).__name__}: {e}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline(MAX_REQUEST_BYTES)
+        try:
+            req = json.loads(line.decode("utf-8"))
+        except Exception as e:
+            resp = {"exit_code": 2, "error": f"Malformed request: {e}"}
+        else:
+            resp = handle_request(req)
+        self.wfile.write((json.dumps(resp, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _require_unix_sockets() -> None:
+    if not hasattr(socket, "AF_UNIX") or not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        raise SystemExit("Unix domain sockets are not supported on this platform")
+
+
+def make_server(socket_path: str) -> socketserver.BaseServer:
+    _require_unix_sockets()
+    path = Path(socket_path)
+    if path.exists():
+        # Stale socket from a crashed daemon; refuse to steal a live one
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+            raise SystemExit(f"Daemon already listening on {path}")
+        except (ConnectionRefusedError, FileNotFoundError):
+            path.unlink()
+        finally:
+            probe.close()
+
+    # Owner-only from the moment bind() creates the socket file (no chmod window)
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(path), _Handler)
+    finally:
+        os.umask(old_umask)
+    server.daemon_threads = True
+    return server
+
+
+def serve(socket_path: str) -> int:
+    server = make_server(socket_path)
+
+    def _stop(*_: Any) -> None:
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    print(f"gcu_v1 daemon listening on {socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    return 0
+
+
+def forward(socket_path: str, args: argparse.Namespace) -> int:
+    """Thin client: same stdout/stderr/exit-code semantics as run.main()."""
+    _require_unix_sockets()
+    payload = {k: v for k, v in vars(args).items() if k != "daemon_socket"}
+    req = {"args": payload, "cwd": os.getcwd(), "kill": env_truthy("GCU_KILL")}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+        s.shutdown(socket.SHUT_WR)
+        with s.makefile("rb") as f:
+            resp = json.loads(f.readline().decode("utf-8"))
+
+    if "result" in resp:
+        print(json.dumps(resp["result"], indent=2, ensure_ascii=False))
+    elif resp.get("error"):
+        print(resp["error"], file=sys.stderr)
+    return int(resp.get("exit_code", 1))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Persistent gcu_v1.api.run daemon (Unix domain socket)")
+    ap.add_argument("--socket", default=os.getenv("GCU_DAEMON_SOCKET") or DEFAULT_SOCKET)
+    args = ap.parse_args()
+    configure_logging()
+    return serve(args.socket)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
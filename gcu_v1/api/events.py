@@ -0,0 +1,233 @@
+﻿from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+# In-process pub/sub of status transitions for reviewer UIs (SSE + WebSocket).
+# NovaPactStatusManager publishes every persisted transition; inside a status_store
+# transaction() delivery waits for the commit, so subscribers never see rolled-back changes.
+# Each subscriber has a bounded queue on its event loop. A subscriber that falls
+# NP_EVENTS_QUEUE_MAX events behind is dropped (its queue is freed) and told so; it
+# reconnects and resyncs via /review/queue or /status/batch.
+# The bus is per process: with several workers a feed only carries that worker's transitions.
+
+EVENTS_PUBLISHED_TOTAL = Counter(
+    "gcu_status_events_published_total",
+    "Status transition events published to the in-process bus",
+)
+
+EVENT_SUBSCRIBERS = Gauge(
+    "gcu_status_event_subscribers",
+    "Connected status feed subscribers",
+    ["transport"],  # sse | ws
+)
+
+EVENT_SUBSCRIBERS_DROPPED_TOTAL = Counter(
+    "gcu_status_event_subscribers_dropped_total",
+    "Status feed subscribers disconnected by the server",
+    ["reason"],  # slow_consumer
+)
+
+DEFAULT_QUEUE_MAX = 256
+DEFAULT_MAX_SUBSCRIBERS = 1000
+DEFAULT_KEEPALIVE_S = 15.0
+
+
+class SlowConsumer(Exception):
+    pass
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+_OVERFLOW = object()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+
+def parse_filter(raw: Optional[str]) -> FrozenSet[str]:
+    """'a,b' -> {'a', 'b'}; empty means no filter."""
+    return frozenset(p.strip() for p in (raw or "").split(",") if p.strip())
+
+
+class Subscription:
+    def __init__(
+        self,
+        bus: "StatusBus",
+        loop: asyncio.AbstractEventLoop,
+        *,
+        statuses: FrozenSet[str],
+        capabilities: FrozenSet[str],
+        max_queue: int,
+        transport: str,
+    ) -> None:
+        self.bus = bus
+        self.loop = loop
+        self.statuses = statuses
+        self.capabilities = capabilities
+        self.transport = transport
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max(1, max_queue))
+        self.overflowed = False
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.statuses and event.get("to") not in self.statuses:
+            return False
+        if self.capabilities and event.get("capability") not in self.capabilities:
+            return False
+        return True
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        # Runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()  # free what it will never read
+            self.queue.put_nowait(_OVERFLOW)
+            self.bus.unsubscribe(self, reason="slow_consumer")
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event; None on timeout (send a keepalive). Raises SlowConsumer once dropped."""
+        try:
+            item = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if item is _OVERFLOW:
+            raise SlowConsumer()
+        return item
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class StatusBus:
+    def __init__(
+        self,
+        resolve_capability: Optional[Callable[[str], Optional[str]]] = None,
+        defer: Optional[Callable[[Callable[[], None]], None]] = None,
+        capability_cache: int = 10_000,
+    ) -> None:
+        self._resolve = resolve_capability
+        self._defer = defer
+        self._subs: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._caps: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._cap_max = capability_cache
+        self.max_queue = _env_int("NP_EVENTS_QUEUE_MAX", DEFAULT_QUEUE_MAX)
+        self.max_subscribers = _env_int("NP_EVENTS_MAX_SUBSCRIBERS", DEFAULT_MAX_SUBSCRIBERS)
+
+    # ---- capability lookup (events from the state machine do not carry it) ----
+
+    def remember_capability(self, run_id: str, capability: Optional[str]) -> None:
+        with self._lock:
+            self._caps[run_id] = capability
+            self._caps.move_to_end(run_id)
+            while len(self._caps) > self._cap_max:
+                self._caps.popitem(last=False)
+
+    def _capability(self, run_id: str) -> Optional[str]:
+        with self._lock:
+            if run_id in self._caps:
+                self._caps.move_to_end(run_id)
+                return self._caps[run_id]
+        cap = self._resolve(run_id) if self._resolve is not None else None
+        self.remember_capability(run_id, cap)
+        return cap
+
+    # ---- subscribers ----
+
+    def subscribe(
+        self,
+        *,
+        statuses: FrozenSet[str] = frozenset(),
+        capabilities: FrozenSet[str] = frozenset(),
+        transport: str = "sse",
+    ) -> Subscription:
+        sub = Subscription(
+            self,
+            asyncio.get_running_loop(),
+            statuses=statuses,
+            capabilities=capabilities,
+            max_queue=self.max_queue,
+            transport=transport,
+        )
+        with self._lock:
+            if len(self._subs) >= self.max_subscribers:
+                raise TooManySubscribers()
+            self._subs.append(sub)
+        EVENT_SUBSCRIBERS.labels(transport=transport).inc()
+        return sub
+
+    def unsubscribe(self, sub: Subscription, reason: Optional[str] = None) -> None:
+        with self._lock:
+            if sub not in self._subs:
+                return
+            self._subs.remove(sub)
+        EVENT_SUBSCRIBERS.labels(transport=sub.transport).dec()
+        if reason:
+            EVENT_SUBSCRIBERS_DROPPED_TOTAL.labels(reason=reason).inc()
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+    # ---- publishing (any thread) ----
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        if self._defer is not None:
+            self._defer(lambda: self._dispatch(event))
+        else:
+            self._dispatch(event)
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subs = list(self._subs)
+        EVENTS_PUBLISHED_TOTAL.inc()
+        if not subs:
+            return
+        event = {**event, "seq": next(self._seq)}
+        if "capability" not in event:
+            event["capability"] = self._capability(event["run_id"])
+        for sub in subs:
+            if not sub.matches(event):
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, event)
+            except RuntimeError:
+                self.unsubscribe(sub)  # loop closed
+
+
+def format_sse(event: Dict[str, Any], name: str = "status") -> str:
+    return f"id: {event.get('seq', '')}\nevent: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def sse_stream(sub: Subscription, keepalive_s: float = DEFAULT_KEEPALIVE_S) -> AsyncIterator[str]:
+    """text/event-stream body for one subscription; unsubscribes when the client goes away."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await sub.get(timeout=keepalive_s)
+            except SlowConsumer:
+                yield format_sse({"reason": "slow_consumer"}, name="overflow")
+                return
+            yield ": keepalive\n\n" if event is None else format_sse(event)
+    finally:
+        sub.close()
@@ -0,0 +1,158 @@
+﻿from __future__ import annotations
+
+import gc
+import os
+import re
+import threading
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Memory diagnostics for long-running workers (/debug/memory).
+# Snapshots are written to disk (tracemalloc.Snapshot.dump) and never kept in
+# memory; only the newest NP_MEMORY_MAX_SNAPSHOTS files are retained.
+
+DEFAULT_DIR = "gcu_v1/outputs/_memory"
+DEFAULT_MAX_SNAPSHOTS = 5
+DEFAULT_FRAMES = 10
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_lock = threading.Lock()
+
+# Allocations made by the diagnostics themselves are noise
+_NOISE = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def snapshot_dir() -> Path:
+    return Path(os.getenv("NP_MEMORY_SNAPSHOT_DIR", DEFAULT_DIR).strip() or DEFAULT_DIR)
+
+
+def _max_snapshots() -> int:
+    try:
+        return max(1, int(os.getenv("NP_MEMORY_MAX_SNAPSHOTS", str(DEFAULT_MAX_SNAPSHOTS))))
+    except ValueError:
+        return DEFAULT_MAX_SNAPSHOTS
+
+
+def _snapshot_path(name: str) -> Path:
+    if not _NAME_RE.match(name or ""):
+        raise SnapshotError("Snapshot name must match [A-Za-z0-9_.-]{1,64}")
+    return snapshot_dir() / f"{name}.tracemalloc"
+
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    d = snapshot_dir()
+    if not d.exists():
+        return []
+    files = sorted(d.glob("*.tracemalloc"), key=lambda p: p.stat().st_mtime)
+    return [{"name": p.stem, "bytes": p.stat().st_size, "mtime": p.stat().st_mtime} for p in files]
+
+
+def start(frames: int = DEFAULT_FRAMES) -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, min(int(frames), 50)))
+    return status()
+
+
+def stop() -> Dict[str, Any]:
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return status()
+
+
+def take_snapshot(name: str) -> Dict[str, Any]:
+    path = _snapshot_path(name)
+    if not tracemalloc.is_tracing():
+        raise SnapshotError("tracemalloc is not running; start it first")
+
+    with _lock:
+        snap = tracemalloc.take_snapshot().filter_traces(_NOISE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        snap.dump(str(path))
+        size = sum(s.size for s in snap.statistics("filename"))
+        del snap
+
+        # Retention: drop oldest beyond the cap
+        existing = list_snapshots()
+        for old in existing[: max(0, len(existing) - _max_snapshots())]:
+            try:
+                (snapshot_dir() / f"{old['name']}.tracemalloc").unlink()
+            except OSError:
+                pass
+
+    return {"name": name, "path": str(path).replace("\\", "/"), "traced_bytes": size}
+
+
+def diff(a: str, b: str, group_by: str = "lineno", top: int = 25) -> Dict[str, Any]:
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise SnapshotError("group_by must be lineno, filename or traceback")
+    pa, pb = _snapshot_path(a), _snapshot_path(b)
+    for p in (pa, pb):
+        if not p.exists():
+            raise FileNotFoundError(p.stem)
+
+    old = tracemalloc.Snapshot.load(str(pa))
+    new = tracemalloc.Snapshot.load(str(pb))
+    stats = new.compare_to(old, group_by)
+    rows = []
+    for st in stats[: max(1, min(int(top), 500))]:
+        frame = st.traceback[0]
+        rows.append({
+            "file": frame.filename.replace("\\", "/"),
+            "line": frame.lineno if group_by != "filename" else None,
+            "size_diff": st.size_diff,
+            "size": st.size,
+            "count_diff": st.count_diff,
+            "count": st.count,
+        })
+    return {
+        "a": a,
+        "b": b,
+        "group_by": group_by,
+        "total_size_diff": sum(s.size_diff for s in stats),
+        "top": rows,
+    }
+
+
+def project_object_counts(prefix: str = "gcu_v1") -> Dict[str, int]:
+    """Live instances of classes defined in the project (StatusStateMachine, TransitionContext, ...)."""
+    counts: Counter = Counter()
+    for o in gc.get_objects():
+        t = type(o)
+        mod = getattr(t, "__module__", "") or ""
+        if mod.startswith(prefix):
+            counts[f"{mod}.{t.__qualname__}"] += 1
+    return dict(counts.most_common())
+
+
+def prometheus_series(top: int = 10) -> List[Dict[str, Any]]:
+    from prometheus_client import REGISTRY
+
+    fams = [(m.name, len(m.samples)) for m in REGISTRY.collect()]
+    fams.sort(key=lambda x: -x[1])
+    return [{"metric": n, "samples": c} for n, c in fams[:top]]
+
+
+def status(extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    cur, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    out: Dict[str, Any] = {
+        "tracing": tracemalloc.is_tracing(),
+        "traced_current_bytes": cur,
+        "traced_peak_bytes": peak,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracemalloc.is_tracing() else 0,
+        "snapshots": list_snapshots(),
+        "max_snapshots": _max_snapshots(),
+    }
+    if extra:
+        out.update(extra)
+    return out
@@ -0,0 +1,397 @@
+﻿from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Pre-fork multi-worker server.
+#
+#   python -m gcu_v1.api.prefork --workers 4 --host 0.0.0.0 --port 8000
+#
+# The master imports the app, builds the config snapshot (validated + compiled bundles),
+# warms up the pipeline and calls gc.freeze() before forking, so the read-only rule memory
+# stays on shared copy-on-write pages in every worker. Workers serve the socket the master
+# bound. State machines live in SQLite (NP_STATE_STORAGE=sqlite), never per-process memory.
+#
+# Signals to the master:
+#   SIGHUP          graceful restart: new workers start on a freshly loaded snapshot and the
+#                   old ones drain once all new ones are ready (a rejected config keeps the
+#                   running workers); also triggered by rule/manifest/policy file changes
+#   SIGTERM/SIGINT  graceful stop (workers drain within --graceful-timeout)
+# Workers that die are respawned, with backoff while they keep crashing at startup; the
+# respawn is scheduled from the main loop, so signals are handled during the backoff.
+# A worker reports ready only if its lifespan succeeded.
+
+logger = logging.getLogger(__name__)
+
+CRASH_WINDOW_S = 5.0
+MAX_BACKOFF_S = 30.0
+
+
+@dataclass
+class PreforkOptions:
+    host: str = "127.0.0.1"
+    port: int = 8000
+    workers: int = 2
+    graceful_timeout_s: float = 30.0
+    ready_timeout_s: float = 60.0
+    log_level: str = "info"
+    watch: bool = True
+
+
+def check_shared_state(workers: int) -> None:
+    """Refuses to run several workers on per-process InMemoryStorage."""
+    import gcu_v1.api.server as srv
+    from gcu_v1.status_machine import InMemoryStorage
+
+    storage = getattr(srv.status_manager, "_storage", None)
+    if workers > 1 and isinstance(storage, InMemoryStorage):
+        raise SystemExit(
+            "InMemoryStorage is per process: with several workers /review and /admin/override "
+            "would miss runs created by another worker. Set NP_STATE_STORAGE=sqlite."
+        )
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """RSS/PSS/private/shared in kB from /proc/<pid>/smaps_rollup (Linux)."""
+    out = {"rss_kb": 0, "pss_kb": 0, "private_kb": 0, "shared_kb": 0}
+    with open(f"/proc/{pid}/smaps_rollup", "r", encoding="ascii") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            parts = rest.split()
+            if not parts or not parts[0].isdigit():
+                continue
+            kb = int(parts[0])
+            if key == "Rss":
+                out["rss_kb"] = kb
+            elif key == "Pss":
+                out["pss_kb"] = kb
+            elif key in ("Private_Clean", "Private_Dirty"):
+                out["private_kb"] += kb
+            elif key in ("Shared_Clean", "Shared_Dirty"):
+                out["shared_kb"] += kb
+    return out
+
+
+def _fingerprint(dirs: Sequence[str]) -> Tuple[Tuple[str, int], ...]:
+    # Cheap change detection for the master (no watcher thread: threads and fork do not mix)
+    files: List[Tuple[str, int]] = []
+    for d in dirs:
+        for p in Path(d).rglob("*.json"):
+            try:
+                files.append((str(p), p.stat().st_mtime_ns))
+            except OSError:
+                continue
+    return tuple(sorted(files))
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _worker_main(sock: socket.socket, opts: PreforkOptions, ready_fd: int) -> int:
+    import uvicorn
+
+    import gcu_v1.api.server as srv
+
+    for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    os.environ["NP_PREFORK_WORKER"] = "1"
+    os.environ["NP_CONFIG_WATCH"] = "0"  # the master watches and restarts workers
+
+    class _Server(uvicorn.Server):
+        async def startup(self, sockets=None) -> None:
+            await super().startup(sockets=sockets)
+            # should_exit: lifespan failed (e.g. init_db) and uvicorn is about to return;
+            # closing without a byte tells the master this worker never became ready
+            if not self.should_exit:
+                os.write(ready_fd, b"r")  # lifespan (warmup) done, accepting connections
+            os.close(ready_fd)
+
+    config = uvicorn.Config(
+        srv.app,
+        log_level=opts.log_level,
+        timeout_graceful_shutdown=int(opts.graceful_timeout_s),
+        log_config=None,  # records go through the gcu_v1.logsetup queue pipeline
+    )
+    server = _Server(config)
+    server.run(sockets=[sock])
+    return 0 if server.started else 1
+
+
+class Master:
+    def __init__(self, opts: PreforkOptions) -> None:
+        self.opts = opts
+        self.sock: Optional[socket.socket] = None
+        self.workers: Dict[int, float] = {}  # pid -> start (monotonic)
+        self.retiring: Dict[int, float] = {}  # pid -> SIGTERM sent (monotonic)
+        self._restart = False
+        self._stop = False
+        self._backoff = 0.0
+        self._respawn_at: List[float] = []  # monotonic times of scheduled respawns
+        self._starting: Dict[int, int] = {}  # ready-pipe fd -> pid of respawned workers
+        self._watch_state: Optional[Tuple[Tuple[str, int], ...]] = None
+
+    # ---- preload (runs before every fork generation) ----
+
+    def preload(self, reason: str) -> Dict[str, float]:
+        from gcu_v1.api.warmup import warmup
+        from gcu_v1.config import reload_config
+        from gcu_v1.persistence.status_store import enable_wal, init_db
+
+        gc.unfreeze()  # let the previous generation's snapshot be collected
+        reload_config(reason)  # ConfigRejected propagates: keep the running workers
+        init_db()
+        enable_wal()
+        phases = warmup()
+        gc.collect()
+        gc.freeze()  # survivors move to the permanent generation: the GC no longer writes to them
+        return phases
+
+    # ---- worker lifecycle ----
+
+    def spawn(self) -> Tuple[int, int]:
+        from gcu_v1.logsetup import configure_logging, shutdown_logging
+
+        assert self.sock is not None
+        r, w = os.pipe()
+        shutdown_logging()  # no listener thread may be running across fork()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            code = 1
+            try:
+                code = _worker_main(self.sock, self.opts, w)
+            except BaseException:
+                logging.getLogger(__name__).error("Worker crashed", exc_info=True)
+            finally:
+                os._exit(code)
+        os.close(w)
+        configure_logging()
+        self.workers[pid] = time.monotonic()
+        return pid, r
+
+    def _wait_ready(self, fds: Dict[int, int]) -> List[int]:
+        # Returns pids whose lifespan completed within ready_timeout_s
+        ready: List[int] = []
+        pending = dict(fds)  # fd -> pid
+        deadline = time.monotonic() + self.opts.ready_timeout_s
+        while pending:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            readable, _, _ = select.select(list(pending), [], [], min(timeout, 0.5))
+            for fd in readable:
+                pid = pending.pop(fd)
+                if os.read(fd, 1):
+                    ready.append(pid)
+                os.close(fd)
+        for fd in pending:
+            os.close(fd)
+        return ready
+
+    def start_workers(self, n: int) -> List[int]:
+        fds = {}
+        for _ in range(n):
+            pid, fd = self.spawn()
+            fds[fd] = pid
+        return self._wait_ready(fds)
+
+    def retire(self, pids: Sequence[int]) -> None:
+        for pid in pids:
+            if self.workers.pop(pid, None) is not None:
+                self.retiring[pid] = time.monotonic()
+                _kill(pid, signal.SIGTERM)
+
+    def rolling_restart(self, reason: str) -> bool:
+        from gcu_v1.config import ConfigRejected
+
+        try:
+            self.preload(reason)
+        except ConfigRejected as e:
+            logger.error("Restart skipped: config rejected", extra={"errors": e.errors})
+            return False
+        old = list(self.workers)
+        ready = self.start_workers(self.opts.workers)
+        if len(ready) < self.opts.workers:
+            logger.error("New workers not ready; keeping the old ones", extra={"ready": len(ready)})
+            self.retire([pid for pid in self.workers if pid not in old])
+            return False
+        self.retire(old)
+        logger.info("Rolling restart done", extra={"reason": reason, "workers": ready})
+        return True
+
+    def reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.retiring.pop(pid, None) is not None:
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None or self._stop:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - started < CRASH_WINDOW_S:
+                self._backoff = min(MAX_BACKOFF_S, max(0.5, self._backoff * 2))
+            else:
+                self._backoff = 0.0
+            logger.warning("Worker exited; respawning", extra={"pid": pid, "exit_code": code, "backoff_s": self._backoff})
+            self._respawn_at.append(time.monotonic() + self._backoff)
+
+    def respawn_due(self) -> None:
+        # Never tops up beyond --workers (a rolling restart may have replaced the dead one)
+        now = time.monotonic()
+        due = sorted(t for t in self._respawn_at if t <= now)
+        self._respawn_at = [t for t in self._respawn_at if t > now]
+        for _ in due:
+            if len(self.workers) >= self.opts.workers:
+                break
+            pid, fd = self.spawn()
+            self._starting[fd] = pid
+
+    def _poll_starting(self) -> None:
+        # Non-blocking: respawned workers report ready (or die) while the loop keeps running
+        if not self._starting:
+            return
+        readable, _, _ = select.select(list(self._starting), [], [], 0)
+        for fd in readable:
+            pid = self._starting.pop(fd)
+            if os.read(fd, 1):
+                logger.info("Respawned worker ready", extra={"pid": pid})
+            os.close(fd)
+
+    def _escalate(self) -> None:
+        # Workers that ignore SIGTERM past the graceful timeout are killed
+        now = time.monotonic()
+        for pid, since in list(self.retiring.items()):
+            if now - since > self.opts.graceful_timeout_s + 5.0:
+                _kill(pid, signal.SIGKILL)
+
+    def _watch_changed(self) -> bool:
+        if not self.opts.watch:
+            return False
+        from gcu_v1.config import WATCH_DIRS
+
+        state = _fingerprint([d for d in WATCH_DIRS if os.path.isdir(d)])
+        changed = self._watch_state is not None and state != self._watch_state
+        self._watch_state = state
+        return changed
+
+    # ---- main loop ----
+
+    def run(self) -> int:
+        from gcu_v1.logsetup import configure_logging, shutdown_logging
+
+        os.environ.setdefault("NP_STATE_STORAGE", "sqlite")
+        configure_logging()
+        check_shared_state(self.opts.workers)
+        phases = self.preload("prefork")
+        self.sock = bind_socket(self.opts.host, self.opts.port)
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "_restart", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "_stop", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "_stop", True))
+
+        ready = self.start_workers(self.opts.workers)
+        logger.info(
+            "Pre-fork master ready",
+            extra={
+                "pid": os.getpid(),
+                "listen": f"{self.opts.host}:{self.opts.port}",
+                "workers": ready,
+                "preload_ms": {k: round(v * 1000.0, 1) for k, v in phases.items()},
+            },
+        )
+        self._watch_changed()
+
+        last_watch = time.monotonic()
+        while not self._stop:
+            time.sleep(0.2)
+            self.reap()
+            self.respawn_due()
+            self._poll_starting()
+            self._escalate()
+            if time.monotonic() - last_watch >= 1.0:
+                last_watch = time.monotonic()
+                if self._watch_changed():
+                    self._restart = True
+            if self._restart and not self._stop:
+                self._restart = False
+                self.rolling_restart("sighup")
+
+        self.shutdown()
+        shutdown_logging()
+        return 0
+
+    def shutdown(self) -> None:
+        self._respawn_at.clear()
+        for fd in self._starting:
+            os.close(fd)
+        self._starting.clear()
+        self.retire(list(self.workers))
+        deadline = time.monotonic() + self.opts.graceful_timeout_s + 5.0
+        while self.retiring and time.monotonic() < deadline:
+            time.sleep(0.1)
+            self.reap()
+        for pid in list(self.retiring):
+            _kill(pid, signal.SIGKILL)
+        self.reap()
+        if self.sock is not None:
+            self.sock.close()
+
+
+def _kill(pid: int, sig: int) -> None:
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if not hasattr(os, "fork"):
+        raise SystemExit("Pre-fork serving needs os.fork (POSIX)")
+    ap = argparse.ArgumentParser(description="Pre-fork multi-worker gcu_v1 API server")
+    ap.add_argument("--host", default=os.environ.get("GCU_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.environ.get("GCU_PORT", "8000")))
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("GCU_WORKERS", str(os.cpu_count() or 2))))
+    ap.add_argument("--graceful-timeout", type=float, default=30.0, help="Seconds a worker may drain on stop/restart")
+    ap.add_argument("--ready-timeout", type=float, default=60.0, help="Seconds a new worker may take to start")
+    from gcu_v1.logsetup import uvicorn_log_level
+
+    ap.add_argument("--log-level", default=uvicorn_log_level(), help="uvicorn log level (default: from NP_LOG_LEVEL)")
+    ap.add_argument("--no-watch", action="store_true", help="Do not restart workers on rule/manifest/policy changes")
+    args = ap.parse_args(argv)
+
+    opts = PreforkOptions(
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers),
+        graceful_timeout_s=args.graceful_timeout,
+        ready_timeout_s=args.ready_timeout,
+        log_level=args.log_level,
+        watch=not args.no_watch and os.getenv("NP_CONFIG_WATCH", "1").strip().lower() not in ("0", "false", "no", "off"),
+    )
+    return Master(opts).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
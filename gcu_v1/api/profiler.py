@@ -0,0 +1,126 @@
+﻿from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+# Wall-clock sampling profiler over all threads via sys._current_frames().
+# Used by /debug/profile where attaching py-spy is not allowed.
+# Guard rails: one profile at a time, hard cap on duration, minimum interval,
+# and the interval backs off when sampling itself costs more than MAX_OVERHEAD.
+
+MAX_SECONDS_DEFAULT = 30.0
+MIN_INTERVAL_S = 0.005
+MAX_DEPTH = 64
+MAX_OVERHEAD = 0.05  # share of wall time the sampler may consume
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def max_seconds() -> float:
+    try:
+        return float(os.getenv("NP_PROFILE_MAX_SECONDS", str(MAX_SECONDS_DEFAULT)))
+    except ValueError:
+        return MAX_SECONDS_DEFAULT
+
+
+def _frame_label(code: Any) -> str:
+    fn = code.co_filename.replace("\\", "/")
+    # Keep the path short but unambiguous: last two components
+    short = "/".join(fn.rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+def _sample(exclude: Set[int], names: Dict[int, str], stacks: Counter) -> None:
+    for ident, frame in sys._current_frames().items():
+        if ident in exclude:
+            continue
+        parts: List[str] = []
+        f = frame
+        while f is not None and len(parts) < MAX_DEPTH:
+            parts.append(_frame_label(f.f_code))
+            f = f.f_back
+        parts.append(names.get(ident, f"thread-{ident}"))
+        stacks[";".join(reversed(parts))] += 1
+
+
+def profile(seconds: float, interval_s: float = 0.01, exclude_idents: Optional[Set[int]] = None) -> Dict[str, Any]:
+    """
+    Samples all threads for `seconds` (capped) on a background thread and
+    returns {"collapsed": {stack: count}, ...}. Raises ProfilerBusy if one is running.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        seconds = max(0.0, min(float(seconds), max_seconds()))
+        interval_s = max(MIN_INTERVAL_S, float(interval_s))
+        stacks: Counter = Counter()
+        stats = {"samples": 0, "sampling_cost_s": 0.0, "interval_s": interval_s}
+        exclude = set(exclude_idents or ())
+
+        def _loop() -> None:
+            exclude.add(threading.get_ident())
+            names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+            interval = interval_s
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                _sample(exclude, names, stacks)
+                cost = time.perf_counter() - t0
+                stats["samples"] += 1
+                stats["sampling_cost_s"] += cost
+                if cost > interval * MAX_OVERHEAD:
+                    interval = min(interval * 2, 1.0)
+                time.sleep(max(0.0, interval - cost))
+            stats["interval_s"] = interval
+
+        t = threading.Thread(target=_loop, name="gcu-profiler", daemon=True)
+        started = time.perf_counter()
+        t.start()
+        t.join(seconds + 5.0)
+        wall = time.perf_counter() - started
+    finally:
+        _busy.release()
+
+    return {
+        "seconds": round(wall, 3),
+        "samples": stats["samples"],
+        "final_interval_ms": round(stats["interval_s"] * 1000.0, 3),
+        "overhead_ratio": round(stats["sampling_cost_s"] / wall, 5) if wall > 0 else 0.0,
+        "collapsed": dict(stacks),
+    }
+
+
+def collapsed_text(collapsed: Dict[str, int]) -> str:
+    # Brendan Gregg's folded format: "root;child;leaf count" (flamegraph.pl, speedscope)
+    return "\n".join(f"{stack} {n}" for stack, n in sorted(collapsed.items(), key=lambda kv: -kv[1])) + "\n"
+
+
+def top_functions(collapsed: Dict[str, int], n: int = 25) -> List[Dict[str, Any]]:
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    grand = sum(collapsed.values()) or 1
+    for stack, count in collapsed.items():
+        frames = stack.split(";")[1:]  # drop thread name
+        if not frames:
+            continue
+        self_counts[frames[-1]] += count
+        for fr in set(frames):
+            total_counts[fr] += count
+    return [
+        {
+            "function": fn,
+            "self": self_counts[fn],
+            "total": total_counts[fn],
+            "self_pct": round(100.0 * self_counts[fn] / grand, 2),
+            "total_pct": round(100.0 * total_counts[fn] / grand, 2),
+        }
+        for fn in sorted(total_counts, key=lambda f: (self_counts[f], total_counts[f]), reverse=True)[:n]
+    ]
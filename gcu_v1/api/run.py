@@ -3,16 +3,20 @@
 import argparse
 import base64
 import json
+import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from gcu_v1.pipeline._utils import load_json, utc_now_iso, new_run_id
+from gcu_v1.pipeline._utils import load_json_cached, utc_now_iso, new_run_id
 from gcu_v1.pipeline.intake import intake
 from gcu_v1.pipeline.governance import decide_governance
 from gcu_v1.pipeline.classify import classify
 from gcu_v1.pipeline.threshold import apply_threshold
 from gcu_v1.pipeline.metadata_write import metadata_write
 from gcu_v1.pipeline.finalize_audit import finalize_audit
+from gcu_v1.pipeline.tracing import current_tracer, start_trace
+from gcu_v1.pipeline.deadline import Deadline, DeadlineExceeded, current_deadline
+from gcu_v1.config import RuntimeConfig, config_for_paths
 
 
 DEFAULT_MANIFEST = "gcu_v1/manifests/gcu_v1.json"
@@ -76,6 +80,7 @@ def build_audit(
         },
         "events": ctx.get("events", []),
         "status": status,
+        "config_version": ctx.get("config_version"),
     }
 
     if result:
@@ -90,6 +95,42 @@ def build_audit(
     return base
 
 
+def _rule_hits(result: Dict[str, Any]) -> int:
+    hits = 0
+    for e in result.get("explainability", []) or []:
+        if isinstance(e, dict):
+            hits += 1 if str(e.get("rule", "")).endswith("_SIGNAL") else 0
+        elif isinstance(e, str):
+            hits += 1 if "signal:" in e else 0
+    return hits
+
+
+def _finalize_traced(outputs_dir: Path, audit: Dict[str, Any], ctx: Dict[str, Any], tracer: Any) -> Path:
+    # Spans up to this point go into the audit; the write itself only into metrics
+    trace = tracer.to_audit()
+    if trace:
+        audit["trace"] = trace
+    with tracer.span("finalize_audit"):
+        path = finalize_audit(outputs_dir, audit, ctx)
+    tracer.finish()
+    return path
+
+
+class _FallbackGovernance:
+    # Stand-in decision when the run ends before governance was decided
+    policy_ok = True
+    blocked_reason = None
+    hitl = "human"
+    approval_required = False
+    approval_provided = False
+    approval_id = None
+    kill_enabled = True
+    kill_triggered = False
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+
+
 def _execute(
     *,
     input_path: Path,
@@ -99,29 +140,52 @@ def _execute(
     write_metadata_flag: bool,
     approval_id: Optional[str],
     run_id: str,
+    tracer: Any = None,
+    deadline: Optional[Deadline] = None,
+    config: Optional[RuntimeConfig] = None,
+    kill: bool = False,
+    digest: Optional[Tuple[str, int]] = None,
 ) -> Dict[str, Any]:
-    manifest = load_json(manifest_path)
-    policy = load_json(policy_path)
-
-    ctx: Dict[str, Any] = {"run_id": run_id, "events": []}
+    # API runs get the pinned snapshot; CLI runs one cached for their paths
+    if config is None:
+        config = config_for_paths(manifest_path, policy_path)
+    tracer = tracer or start_trace(sample_rate=config.trace_sample_rate)
+    check = deadline.check if deadline is not None else (lambda stage: None)
+    scan_check = deadline.checker if deadline is not None else (lambda stage: None)
+
+    with tracer.span("config_load"):
+        manifest = config.manifest if config.manifest is not None else load_json_cached(manifest_path)
+        policy = config.policy if config.policy is not None else load_json_cached(policy_path)
+
+    ctx: Dict[str, Any] = {
+        "run_id": run_id, "events": [], "config_version": config.version,
+        "audit_index_enabled": config.audit_index_enabled,
+    }
 
     try:
         # Intake
-        ctx.update(intake(input_path))
-
-        
-        # Determine capability/payload (robust)
-        try:
-            doc = json.loads(input_path.read_text(encoding="utf-8-sig"))
-            doc_capability = doc.get("capability")
-            doc_payload = doc.get("payload", {})
-        except Exception:
-            doc_capability = None
-            doc_payload = {}# Governance decide
-        gd = decide_governance(manifest, policy, ctx)
+        check("intake")
+        with tracer.span("intake"):
+            ctx.update(intake(input_path, scan_check("intake"), digest))
+            tracer.annotate(doc_bytes=ctx["input"]["bytes"], sha256_prefix=(ctx["input"]["sha256"] or "")[:12])
+
+            # Determine capability/payload (robust)
+            try:
+                doc = json.loads(input_path.read_text(encoding="utf-8-sig"))
+                doc_capability = doc.get("capability")
+                doc_payload = doc.get("payload", {})
+            except Exception:
+                doc_capability = None
+                doc_payload = {}
+        tracer.capability = doc_capability if isinstance(doc_capability, str) and doc_capability else "legacy"
+
+        # Governance decide
+        check("governance")
+        with tracer.span("governance"):
+            gd = decide_governance(manifest, policy, ctx, kill=config.kill or kill)
         if gd.kill_triggered:
             audit = build_audit(manifest, ctx, result=None, gd=gd, status="aborted")
-            audit_path = finalize_audit(outputs_dir, audit, ctx)
+            audit_path = _finalize_traced(outputs_dir, audit, ctx, tracer)
             return {
     "status": "aborted", 
     "run_id": run_id, 
@@ -132,7 +196,7 @@ def _execute(
 
         if not gd.policy_ok:
             audit = build_audit(manifest, ctx, result=None, gd=gd, status="blocked")
-            audit_path = finalize_audit(outputs_dir, audit, ctx)
+            audit_path = _finalize_traced(outputs_dir, audit, ctx, tracer)
             return {
     "status": "blocked", 
     "run_id": run_id, 
@@ -142,13 +206,17 @@ def _execute(
     "approval_provided": False
 }
 
-                # Classification (capability-aware)
+        # Classification (capability-aware)
+        check("classification")
         if doc_capability == "doc_triage":
             # Lazy imports to avoid import-time side effects
             from gcu_v1.agents.loader import load_agent_bundle
             from gcu_v1.pipeline.doc_triage import run_doc_triage
 
-            bundle = load_agent_bundle("doc_triage")
+            with tracer.span("bundle_load"):
+                # Snapshot bundle: a hot reload mid-run does not change the rules of this run
+                bundle = config.bundles.get("doc_triage") or load_agent_bundle("doc_triage")
+                shadow_bundle = config.shadow_bundles.get("doc_triage")
 
             text = ""
             if isinstance(doc_payload, dict):
@@ -156,11 +224,24 @@ def _execute(
             else:
                 text = str(doc_payload)
 
-            result = run_doc_triage(text=text, bundle=bundle)
+            with tracer.span("classification"):
+                result = run_doc_triage(
+                    text=text,
+                    bundle=bundle,
+                    shadow_bundle=shadow_bundle,
+                    shadow_sample_rate=config.shadow_sample_rate,
+                    run_id=run_id,
+                    check=scan_check("classification"),
+                )
         else:
-            result = classify(input_path, ctx)
-# Threshold HITL
-        hitl = apply_threshold(ctx, float(result["confidence"]), float(manifest.get("confidence_threshold", 0.85)))
+            with tracer.span("classification"):
+                result = classify(input_path, ctx)
+
+        tracer.annotate(rule_hits=_rule_hits(result))
+
+        # Threshold HITL
+        with tracer.span("threshold"):
+            hitl = apply_threshold(ctx, float(result["confidence"]), float(manifest.get("confidence_threshold", 0.85)))
         gd.hitl = hitl
 
         
@@ -189,7 +270,9 @@ def _execute(
                     }
                 )
             else:
-                metadata_write(outputs_dir, ctx, metadata, approval_id)
+                check("metadata_write")
+                with tracer.span("metadata_write"):
+                    metadata_write(outputs_dir, ctx, metadata, approval_id)
 
         # Build audit
         gd.approval_required = approval_required
@@ -197,7 +280,7 @@ def _execute(
         gd.approval_id = approval_id
 
         audit = build_audit(manifest, ctx, result=result, gd=gd, status=computed_status)
-        audit_path = finalize_audit(outputs_dir, audit, ctx)
+        audit_path = _finalize_traced(outputs_dir, audit, ctx, tracer)
 
         # Cleanup: remove stray temp executables (Windows artefacts)
         try:
@@ -216,6 +299,31 @@ def _execute(
     "approval_provided": gd.approval_provided
 }
 
+    except DeadlineExceeded as e:
+        # Client budget is gone: stop the work but keep the audit trail complete
+        ctx.setdefault(
+            "input",
+            {"path": str(input_path), "ext": None, "sha256": None, "bytes": None},
+        )
+        ctx["events"].append({
+            "ts": utc_now_iso(),
+            "type": "aborted",
+            "detail": f"deadline: stage={e.stage} overrun_ms={e.overrun_s * 1000.0:.1f}",
+        })
+        if "gd" not in locals():
+            gd = _FallbackGovernance(float(manifest.get("confidence_threshold", 0.85)))
+        audit = build_audit(manifest, ctx, result=None, gd=gd, status="aborted")
+        audit_path = _finalize_traced(outputs_dir, audit, ctx, tracer)
+        return {
+    "status": "aborted",
+    "run_id": run_id,
+    "hitl": "human",
+    "audit": str(audit_path),
+    "reason": "deadline",
+    "stage": e.stage,
+    "approval_provided": False
+}
+
     except Exception as e:
         ctx.setdefault("events", [])
         ctx.setdefault(
@@ -224,22 +332,13 @@ def _execute(
         )
         ctx["events"].append({"ts": utc_now_iso(), "type": "runtime_error", "detail": repr(e)})
 
-        class _GD:
-            policy_ok = True
-            blocked_reason = None
-            hitl = "human"
-            threshold = float(manifest.get("confidence_threshold", 0.85)) if "manifest" in locals() else 0.85
-            approval_required = False
-            approval_provided = False
-            approval_id = None
-            kill_enabled = True
-            kill_triggered = False
-
-        gd = _GD()
+        gd = _FallbackGovernance(
+            float(manifest.get("confidence_threshold", 0.85)) if "manifest" in locals() else 0.85
+        )
         # manifest may not be loaded if failure happened early:
         mf = manifest if "manifest" in locals() else {"unit": "GCU", "version": "0.0.0"}
         audit = build_audit(mf, ctx, result=None, gd=gd, status="error")
-        audit_path = finalize_audit(outputs_dir, audit, ctx)
+        audit_path = _finalize_traced(outputs_dir, audit, ctx, tracer)
         return {
     "status": "error", 
     "run_id": run_id, 
@@ -259,19 +358,26 @@ def run_capability(
     outputs: str = DEFAULT_OUTPUTS,
     write_metadata_flag: bool = False,
     approval_id: Optional[str] = None,
+    kill: bool = False,
 ) -> Dict[str, Any]:
     """
     FastAPI entry point.
     Writes a legacy-compatible input.json under outputs/<run_id>/ and runs the pipeline.
+    `kill` triggers the kill switch in addition to the snapshot's GCU_KILL.
     """
     run_id = new_run_id()
-    outputs_dir = Path(outputs).resolve()
-    run_dir = outputs_dir / run_id
-    run_dir.mkdir(parents=True, exist_ok=True)
+    config = config_for_paths(Path(manifest).resolve(), Path(policy).resolve())
+    tracer = current_tracer() or start_trace(capability, config.trace_sample_rate)
+    deadline = current_deadline()
 
-    input_path = (run_dir / "input.json").resolve()
-    doc = {"capability": capability, "payload": payload}
-    input_path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    with tracer.span("input_write"):
+        outputs_dir = Path(outputs).resolve()
+        run_dir = outputs_dir / run_id
+        run_dir.mkdir(parents=True, exist_ok=True)
+
+        input_path = (run_dir / "input.json").resolve()
+        doc = {"capability": capability, "payload": payload}
+        input_path.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
 
     return _execute(
         input_path=input_path,
@@ -281,10 +387,14 @@ def run_capability(
         write_metadata_flag=write_metadata_flag,
         approval_id=approval_id,
         run_id=run_id,
+        tracer=tracer,
+        deadline=deadline,
+        config=config,
+        kill=kill,
     )
 
 
-def main() -> int:
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=False, help="Path to input document (legacy mode)")
 
@@ -298,28 +408,58 @@ def main() -> int:
     ap.add_argument("--write-metadata", action="store_true")
     ap.add_argument("--approval-id", default=None)
 
-    args = ap.parse_args()
+    # Batch mode (directory/glob -> JSONL)
+    ap.add_argument("--input-dir", default=None, help="Process every file in this directory (batch mode)")
+    ap.add_argument("--glob", default=None, help="File pattern for batch mode, e.g. '**/*.txt' (recursive)")
+    ap.add_argument("--jobs", type=int, default=1, help="Worker processes for batch mode")
+    ap.add_argument("--jsonl-out", default=None, help="Append batch results as JSONL here (default: stdout)")
+    ap.add_argument("--ledger", default=None, help="SQLite ledger of processed sha256s; enables resume")
+
+    ap.add_argument(
+        "--daemon-socket",
+        default=os.getenv("GCU_DAEMON_SOCKET") or None,
+        help="Forward this invocation to a running gcu_v1.api.daemon (env: GCU_DAEMON_SOCKET)",
+    )
+    return ap
+
+
+def _resolve(p: str, cwd: Optional[Path]) -> Path:
+    path = Path(p)
+    if cwd is not None and not path.is_absolute():
+        path = cwd / path
+    return path.resolve()
+
+
+def exit_code_for(res: Dict[str, Any]) -> int:
+    return 0 if res.get("status") == "ok" else 1
+
 
-    outputs_dir = Path(args.outputs).resolve()
+def dispatch(args: argparse.Namespace, *, cwd: Optional[Path] = None, kill: bool = False) -> Dict[str, Any]:
+    """
+    Executes one CLI invocation and returns the result dict.
+    Relative paths resolve against `cwd` and `kill` carries GCU_KILL (the caller's
+    directory and environment when run via the daemon).
+    Usage errors raise SystemExit exactly like the plain CLI.
+    """
+    outputs_dir = _resolve(args.outputs, cwd)
     run_id = new_run_id()
 
     # Legacy mode
     if args.input:
-        input_path = Path(args.input).resolve()
+        input_path = _resolve(args.input, cwd)
         if not input_path.exists():
             raise SystemExit(f"Input not found: {input_path}")
 
-        res = _execute(
+        return _execute(
             input_path=input_path,
-            manifest_path=Path(args.manifest).resolve(),
-            policy_path=Path(args.policy).resolve(),
+            manifest_path=_resolve(args.manifest, cwd),
+            policy_path=_resolve(args.policy, cwd),
             outputs_dir=outputs_dir,
             write_metadata_flag=bool(args.write_metadata),
             approval_id=args.approval_id,
             run_id=run_id,
+            kill=kill,
         )
-        print(json.dumps(res, indent=2, ensure_ascii=False))
-        return 0 if res.get("status") == "ok" else 1
 
     # New mode
     if not args.capability or (not args.payload_json and not args.payload_json_b64):
@@ -336,19 +476,36 @@ def main() -> int:
 
     payload_obj = json.loads(raw)
 
-    res = run_capability(
+    return run_capability(
         args.capability,
         payload_obj,
-        manifest=args.manifest,
-        policy=args.policy,
+        manifest=str(_resolve(args.manifest, cwd)),
+        policy=str(_resolve(args.policy, cwd)),
         outputs=str(outputs_dir),
         write_metadata_flag=bool(args.write_metadata),
         approval_id=args.approval_id,
+        kill=kill,
     )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.input_dir or args.glob:
+        from gcu_v1.api.batch import run_batch
+
+        return run_batch(args)
+
+    # Thin client mode: the daemon holds imports and parsed manifest/policy warm
+    if args.daemon_socket:
+        from gcu_v1.api.daemon import forward
+
+        return forward(args.daemon_socket, args)
+
+    res = dispatch(args)
     print(json.dumps(res, indent=2, ensure_ascii=False))
-    return 0 if res.get("status") == "ok" else 1
+    return exit_code_for(res)
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
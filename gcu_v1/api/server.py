@@ -1,14 +1,21 @@
 ﻿from __future__ import annotations
 
 import os
+import sys
 import json
 import time
+import base64
+import gzip
+import hashlib
+import asyncio
 import logging
-from datetime import datetime
-from typing import Any, Dict, Optional, List
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, Optional, List
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 
 from prometheus_client import (
@@ -18,10 +25,46 @@ from prometheus_client import (
     generate_latest,
     CONTENT_TYPE_LATEST,
 )
-from starlette.responses import Response
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from gcu_v1.persistence.status_store import init_db, load_run_state, persist_run_state
+from gcu_v1.persistence.status_store import (
+    SQLiteMachineStorage,
+    SQLiteReviewLeases,
+    STATS_DIMENSIONS,
+    active_lease,
+    after_commit,
+    capability_of,
+    claim_next,
+    claim_run,
+    init_db,
+    load_run_state,
+    load_run_states,
+    persist_run_state,
+    query_review_queue,
+    query_status_stats,
+    reap_expired_leases,
+    release_lease,
+    transaction,
+    update_run_statuses,
+)
+from gcu_v1.pipeline._utils import env_truthy
+from gcu_v1.pipeline.tracing import bind_tracer, start_trace
+from gcu_v1.pipeline.deadline import DEADLINE_EXCEEDED_TOTAL, bind_deadline, parse_deadline
+from gcu_v1.api.slowlog import SlowRequestLog
+from gcu_v1.api.admission import AdmissionMiddleware, default_pools, ensure_thread_capacity
+from gcu_v1.api.warmup import mark_first_run, warmup
+from gcu_v1.api import auditlog
+from gcu_v1.api.events import SlowConsumer, StatusBus, TooManySubscribers, parse_filter, sse_stream
+from gcu_v1.logsetup import configure_logging, shutdown_logging
+from gcu_v1.config import (
+    ConfigRejected,
+    ConfigWatcher,
+    bind_config,
+    current_config,
+    install_sighup_handler,
+    reload_config,
+)
 
 from gcu_v1.status_machine import (
     NovaPactStatusManager,
@@ -29,97 +72,135 @@ from gcu_v1.status_machine import (
     SystemStatus,
     StatusTransitionError,
     AdminOverrideError,
+    ReviewLeaseError,
 )
 
 # ==================== FASTAPI APP ====================
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_logging()
+    ensure_thread_capacity(admission_pools)
+    # Pre-fork workers inherit the master's snapshot; rebuilding it would unshare those pages
+    if not env_truthy("NP_PREFORK_WORKER"):
+        try:
+            reload_config("startup")
+        except ConfigRejected:
+            pass  # recorded; keeps the snapshot that is already active
+    install_sighup_handler()
     try:
         init_db()
         DB_INIT_SUCCESS.set(1)
     except Exception:
         DB_INIT_SUCCESS.set(0)
         raise
+    if _env_on("NP_WARMUP"):
+        phases = warmup()
+        logger.info("Warmup done", extra={"phases_ms": {k: round(v * 1000.0, 1) for k, v in phases.items()}})
+    watcher = ConfigWatcher().start() if _env_on("NP_CONFIG_WATCH") else None
+    reaper = asyncio.create_task(_reap_leases_forever(_env_float("NP_LEASE_REAP_INTERVAL_S", 60.0)))
     yield
+    reaper.cancel()
+    # Optional subsystems are only shut down if something imported them
+    shadow = sys.modules.get("gcu_v1.pipeline.shadow")
+    if shadow is not None:
+        shadow.shutdown_shadow(wait=False)
+    audit_index = sys.modules.get("gcu_v1.persistence.audit_index")
+    if audit_index is not None:
+        audit_index.shutdown_audit_index(wait=True)  # queued docs are small; write them
+    if watcher is not None:
+        watcher.stop()
+    shutdown_logging()
 app = FastAPI(title="NovaPact GCU API", version="1.0.0", lifespan=lifespan)
 
-logging.basicConfig(level=logging.DEBUG)
+# Logging pipeline is installed in lifespan, not at import (keeps worker boot lean)
 logger = logging.getLogger(__name__)
 
-status_manager = NovaPactStatusManager()
+def _status_storage():
+    # NP_STATE_STORAGE=sqlite shares state machines across worker processes (prefork sets it)
+    if os.getenv("NP_STATE_STORAGE", "memory").strip().lower() == "sqlite":
+        return SQLiteMachineStorage()
+    return None  # NovaPactStatusManager default: InMemoryStorage
 
-# ==================== CONFIG (update-safe) ====================
 
-DEFAULT_CAPABILITY = "np_document_triage"
-DEFAULT_THRESHOLD = 0.75  # fallback only
-DEFAULT_MANIFEST_PATH = "gcu_v1/agents/agent_01_doc_triage/manifest.json"
+# Status feed for reviewer UIs (/events/status, /ws/status); published after commit
+status_bus = StatusBus(resolve_capability=capability_of, defer=after_commit)
 
+status_manager = NovaPactStatusManager(
+    _status_storage(),
+    leases=SQLiteReviewLeases(),
+    require_lease=env_truthy("NP_REVIEW_REQUIRE_LEASE"),
+    publish=status_bus.publish,
+    defer=after_commit,  # InMemoryStorage bulk saves wait for the run_status commit
+)
+
+slow_log = SlowRequestLog.from_env()
 
-def _env(key: str, default: str = "") -> str:
-    v = os.getenv(key, default)
-    return v.strip() if isinstance(v, str) else default
+admission_pools = default_pools()
 
+# ==================== CONFIG (update-safe) ====================
 
-def _get_capability() -> str:
-    return _env("NP_CAPABILITY", DEFAULT_CAPABILITY)
+def _env_on(key: str, default: str = "1") -> bool:
+    # Default-on switches: only an explicit 0/false/no/off disables
+    return os.getenv(key, default).strip().lower() not in ("0", "false", "no", "off")
 
 
-def _get_threshold() -> float:
-    raw = _env("NP_CONFIDENCE_THRESHOLD", str(DEFAULT_THRESHOLD))
+def _env_float(key: str, default: float) -> float:
     try:
-        return float(raw)
+        return float(os.getenv(key, str(default)).strip())
     except ValueError:
-        logger.warning("Invalid NP_CONFIDENCE_THRESHOLD=%r; using %s", raw, DEFAULT_THRESHOLD)
-        return DEFAULT_THRESHOLD
-
-
-def _get_manifest_path() -> str:
-    mp = _env("NP_MANIFEST_PATH", DEFAULT_MANIFEST_PATH)
-    mp = mp.replace("\\", "/").strip()
-    if not os.path.isabs(mp):
-        mp = os.path.abspath(mp).replace("\\", "/")
-    return mp
+        return default
 
+# Env + manifest are read into an immutable snapshot (gcu_v1.config) at startup and on
+# reload; handlers only dereference current_config().
 
 # ==================== GOVERNANCE AUDIT (persistent, per-run) ====================
 
-def _run_output_dir(run_id: str) -> str:
+def _run_output_dir(run_id: str, create: bool = True) -> str:
     base = os.path.join("gcu_v1", "outputs", run_id)
-    os.makedirs(base, exist_ok=True)
+    if create:
+        os.makedirs(base, exist_ok=True)
     return base
 
 
-def _governance_audit_path(run_id: str) -> str:
-    return os.path.join(_run_output_dir(run_id), "governance_audit.jsonl")
+def _governance_audit_path(run_id: str, create: bool = True) -> str:
+    return os.path.join(_run_output_dir(run_id, create), "governance_audit.jsonl")
+
+
+def _archived_governance_audit(run_id: str) -> Optional[bytes]:
+    # Cold tier (gcu_v1.persistence.archive); None if the run was never archived
+    from gcu_v1.persistence import archive
+    return archive.read_member(run_id, "governance_audit.jsonl")
 
 
 def _append_governance_audit(run_id: str, event: str, payload: Dict[str, Any]) -> None:
-    rec = {
-        "ts": datetime.utcnow().isoformat() + "Z",
-        "run_id": run_id,
-        "event": event,
-        "payload": payload,
-    }
-    path = _governance_audit_path(run_id)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-
-def _read_jsonl(path: str) -> List[Dict[str, Any]]:
-    if not os.path.exists(path):
-        return []
-    out: List[Dict[str, Any]] = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                out.append(json.loads(line))
-            except Exception:
-                continue
-    return out
+    _append_governance_audit_many(run_id, [(event, payload)])
+
+
+def _restore_archived_trail(run_id: str, path: str) -> None:
+    # Called under the append lock, so the archive job cannot delete the run in between.
+    # Archiving removes a run's files together: a directory with other artifacts in it is hot.
+    run_dir = os.path.dirname(path)
+    if any(not n.endswith(".idx") for n in os.listdir(run_dir)):
+        return
+    from gcu_v1.persistence import archive
+    archive.restore_member(run_id, "governance_audit.jsonl", path)
+
+
+def _append_governance_audit_many(run_id: str, events: List[tuple]) -> None:
+    # One open + write for all (event, payload) pairs of a run
+    ts = datetime.utcnow().isoformat() + "Z"
+    version = current_config().version
+    lines = [
+        json.dumps({"ts": ts, "run_id": run_id, "event": event, "config_version": version, "payload": payload},
+                   ensure_ascii=False) + "\n"
+        for event, payload in events
+    ]
+    path = _governance_audit_path(run_id, create=False)
+    first = auditlog.append_lines(path, lines, restore=lambda p: _restore_archived_trail(run_id, p))
+    if current_config().audit_index_enabled:
+        from gcu_v1.persistence.audit_index import submit_governance
+        submit_governance(run_id, first, [json.loads(line) for line in lines])
 
 
 # ==================== PROMETHEUS METRICS ====================
@@ -190,6 +271,8 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
         method = request.method
         start = time.perf_counter()
         response = None
+        # Arrival time; handlers use it to derive threadpool queue wait
+        request.state.gcu_t0 = start
 
         # ---- stable path label (route template) ----
         path = request.url.path
@@ -218,6 +301,8 @@ class PrometheusMiddleware(BaseHTTPMiddleware):
             HTTP_REQUESTS_TOTAL.labels(method=method, path=path, status_code=status_code).inc()
 
 
+# Added first so PrometheusMiddleware wraps it: shed requests still show up in HTTP metrics
+app.add_middleware(AdmissionMiddleware, pools=admission_pools)
 app.add_middleware(PrometheusMiddleware)
 
 
@@ -253,6 +338,55 @@ class AdminOverrideRequest(BaseModel):
     reason: str
 
 
+class ClaimRequest(BaseModel):
+    actor: str
+    ttl_s: Optional[float] = None  # default NP_REVIEW_LEASE_TTL_S
+
+
+class ClaimNextRequest(BaseModel):
+    actor: str
+    n: int = 10
+    ttl_s: Optional[float] = None
+    capability: Optional[str] = None
+
+
+class ReleaseRequest(BaseModel):
+    actor: str
+
+
+class BulkReviewItem(BaseModel):
+    run_id: str
+    action: str  # "approve" | "reject"
+    reason: Optional[str] = None
+
+
+class BulkReviewRequest(BaseModel):
+    actor: str
+    role: str
+    auth_type: str
+    items: List[BulkReviewItem]
+
+
+class BulkOverrideItem(BaseModel):
+    run_id: str
+    target_status: str
+    reason: str
+
+
+class BulkOverrideRequest(BaseModel):
+    actor: str
+    role: str
+    auth_type: str
+    items: List[BulkOverrideItem]
+
+
+BULK_MAX_ITEMS = 5000
+
+
+class StatusBatchRequest(BaseModel):
+    run_ids: List[str]
+
+
 # ==================== ENDPOINTS ====================
 
 @app.get("/health")
@@ -262,27 +396,81 @@ def health() -> Dict[str, str]:
 
 @app.get("/debug/config")
 def debug_config() -> Dict[str, Any]:
+    return current_config().summary()
+
+
+@app.post("/admin/config/reload")
+def admin_config_reload() -> Dict[str, Any]:
+    try:
+        old, new = reload_config("admin")
+    except ConfigRejected as e:
+        raise HTTPException(
+            status_code=422,
+            detail={"error": "Config rejected; previous snapshot stays active", "errors": e.errors},
+        )
     return {
-        "NP_CAPABILITY": _get_capability(),
-        "NP_CONFIDENCE_THRESHOLD": _get_threshold(),
-        "NP_MANIFEST_PATH": _get_manifest_path(),
+        "previous_version": old.version if old else None,
+        "version": new.version,
+        "changed": old is None or old.version != new.version,
+        "config": new.summary(),
     }
 
 
 @app.post("/run")
-def run(req: RunRequest) -> Dict[str, Any]:
+def run(req: RunRequest, request: Request) -> Dict[str, Any]:
     """
     NP â€“ Document Triage v1.0
     Governance-first execution endpoint.
     """
-    capability_expected = _get_capability()
-    threshold = _get_threshold()
-    manifest_path = _get_manifest_path()
+    t_handler = time.perf_counter()
+    t_arrival = getattr(request.state, "gcu_t0", t_handler)
+    cfg = current_config()
+    # Unsampled runs get a StageTimer (per-stage totals only) while the slow log is on
+    tracer = start_trace(req.capability, cfg.trace_sample_rate, force=cfg.slow_request_ms > 0)
+    deadline = parse_deadline(
+        request.headers.get("x-request-timeout-ms"),
+        request.headers.get("x-request-deadline"),
+        arrival=t_arrival,
+        default_ms=cfg.default_timeout_ms,
+        max_ms=cfg.max_timeout_ms,
+    )
+    result: Optional[Dict[str, Any]] = None
+    try:
+        if deadline is not None and deadline.expired():
+            # Budget already spent waiting for admission/threadpool: do not start the run
+            DEADLINE_EXCEEDED_TOTAL.labels(stage="queued").inc()
+            raise HTTPException(status_code=504, detail="Request deadline exceeded before start")
+        with bind_tracer(tracer), bind_deadline(deadline), bind_config(cfg):
+            result = _run_governed(req, tracer, cfg)
+        if result.get("reason") == "deadline":
+            raise HTTPException(
+                status_code=504,
+                detail={"error": "Request deadline exceeded", "run_id": result.get("run_id"), "stage": result.get("stage")},
+            )
+        mark_first_run()
+        return result
+    finally:
+        tracer.finish()
+        slow_log.maybe_record(
+            total_s=time.perf_counter() - t_arrival,
+            queue_wait_s=t_handler - t_arrival,
+            path="/run",
+            status=str(result.get("status")) if result else "error",
+            run_id=result.get("run_id") if result else None,
+            tracer=tracer,
+            threshold_ms=cfg.slow_request_ms,
+        )
+
+
+def _run_governed(req: RunRequest, tracer: Any, cfg: Any) -> Dict[str, Any]:
+    capability_expected = cfg.capability
+    threshold = cfg.threshold
+    manifest_path = cfg.manifest_path
 
     if req.capability != capability_expected:
         raise HTTPException(status_code=400, detail=f"Invalid capability. Expected '{capability_expected}'.")
 
-    if not os.path.exists(manifest_path):
+    if cfg.manifest is None and (cfg.manifest_error or "").startswith("not found"):
         raise HTTPException(status_code=500, detail=f"Manifest not found: {manifest_path}")
 
     try:
@@ -291,12 +479,16 @@ def run(req: RunRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail="run_capability not found")
 
     try:
-        logger.debug("=== RUN START ===")
+        # sample_key keeps all debug lines of one request together under NP_LOG_DEBUG_SAMPLE_RATE
+        sample_key = id(req)
         logger.debug(
-            "CONFIG: capability_expected=%s threshold=%s manifest=%s",
-            capability_expected,
-            threshold,
-            manifest_path,
+            "run start",
+            extra={
+                "sample_key": sample_key,
+                "capability_expected": capability_expected,
+                "threshold": threshold,
+                "manifest": manifest_path,
+            },
         )
 
         # 1) Execute pipeline
@@ -308,9 +500,11 @@ def run(req: RunRequest) -> Dict[str, Any]:
         )
         RUN_PIPELINE_DURATION_SECONDS.observe(time.perf_counter() - t0)
 
-        logger.debug("PIPELINE RESULT:")
-        for k, v in pipeline_result.items():
-            logger.debug("  %s: %s", k, v)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "pipeline result",
+                extra={"sample_key": sample_key, "pipeline_result": dict(pipeline_result)},
+            )
 
         pipeline_status = pipeline_result.get("status", "error")
         if pipeline_status not in ["ok", "needs_review"]:
@@ -320,11 +514,12 @@ def run(req: RunRequest) -> Dict[str, Any]:
         run_id = pipeline_result.get("run_id", "unknown")
 
         # Governance audit: config snapshot
-        _append_governance_audit(run_id, "GOV_CONFIG", {
-            "capability_expected": capability_expected,
-            "threshold": threshold,
-            "manifest_path": manifest_path,
-        })
+        with tracer.span("gov_audit_io"):
+            _append_governance_audit(run_id, "GOV_CONFIG", {
+                "capability_expected": capability_expected,
+                "threshold": threshold,
+                "manifest_path": manifest_path,
+            })
 
         # 2) GOVERNANCE (DB-backed Source of Truth)
         g0 = time.perf_counter()
@@ -343,49 +538,57 @@ def run(req: RunRequest) -> Dict[str, Any]:
             error_occurred=False,
         )
 
-        status = status_manager.process_classification(
-            request_id=run_id,
-            classification_result=classification_result,
-            actor=req.actor,
-            role=req.role,
-            auth_type=req.auth_type,
-        )
-
-        _append_governance_audit(run_id, "GOV_STATUS_COMPUTED", {
-            "status": str(status),
-            "confidence": confidence,
-            "hitl_required": human_required,
-            "approval_provided": approval_provided,
-            "actor": req.actor,
-            "role": req.role,
-            "auth_type": req.auth_type,
-        })
+        status_bus.remember_capability(run_id, req.capability)
+        with tracer.span("gov_status_machine"):
+            status = status_manager.process_classification(
+                request_id=run_id,
+                classification_result=classification_result,
+                actor=req.actor,
+                role=req.role,
+                auth_type=req.auth_type,
+            )
+
+        with tracer.span("gov_audit_io"):
+            _append_governance_audit(run_id, "GOV_STATUS_COMPUTED", {
+                "status": str(status),
+                "confidence": confidence,
+                "hitl_required": human_required,
+                "approval_provided": approval_provided,
+                "actor": req.actor,
+                "role": req.role,
+                "auth_type": req.auth_type,
+            })
 
         # HARD RULE: HITL required + no approval => needs_review (never ok)
         if human_required and (not approval_provided):
             status = SystemStatus.NEEDS_REVIEW
-            _append_governance_audit(run_id, "GOV_HARD_RULE_APPLIED", {
-                "rule": "hitl_required_and_no_approval => needs_review",
-                "status": "needs_review",
-            })
+            with tracer.span("gov_audit_io"):
+                _append_governance_audit(run_id, "GOV_HARD_RULE_APPLIED", {
+                    "rule": "hitl_required_and_no_approval => needs_review",
+                    "status": "needs_review",
+                })
 
         pipeline_result["status"] = str(status)
         pipeline_result["needs_review"] = (status == SystemStatus.NEEDS_REVIEW)
 
-        persist_run_state(
-            run_id=run_id,
-            status=str(status),
-            hitl_required=human_required,
-            approval_required=True,
-            approval_provided=approval_provided,
-        )
-
-        _append_governance_audit(run_id, "GOV_DB_PERSISTED", {
-            "status": str(status),
-            "hitl_required": human_required,
-            "approval_required": True,
-            "approval_provided": approval_provided,
-        })
+        with tracer.span("gov_db"):
+            persist_run_state(
+                run_id=run_id,
+                status=str(status),
+                hitl_required=human_required,
+                approval_required=True,
+                approval_provided=approval_provided,
+                capability=req.capability,
+                confidence=confidence,
+            )
+
+        with tracer.span("gov_audit_io"):
+            _append_governance_audit(run_id, "GOV_DB_PERSISTED", {
+                "status": str(status),
+                "hitl_required": human_required,
+                "approval_required": True,
+                "approval_provided": approval_provided,
+            })
 
         RUN_GOVERNANCE_DURATION_SECONDS.observe(time.perf_counter() - g0)
 
@@ -395,8 +598,10 @@ def run(req: RunRequest) -> Dict[str, Any]:
 
         pipeline_result["governance_audit"] = _governance_audit_path(run_id).replace("\\", "/")
 
-        logger.debug("FINAL STATUS: %s", pipeline_result["status"])
-        logger.debug("=== RUN END ===")
+        logger.debug(
+            "run end",
+            extra={"sample_key": sample_key, "run_id": run_id, "status": pipeline_result["status"]},
+        )
         return pipeline_result
 
     except Exception as e:
@@ -405,6 +610,181 @@ def run(req: RunRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _encode_cursor(updated_at: str, run_id: str) -> str:
+    raw = json.dumps([updated_at, run_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, run_id = json.loads(raw)
+        if not isinstance(updated_at, str) or not isinstance(run_id, str):
+            raise ValueError
+        return updated_at, run_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/review/queue")
+def review_queue(
+    status: str = "needs_review",
+    capability: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    min_age_s: Optional[float] = None,
+    max_age_s: Optional[float] = None,
+    unclaimed: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Dict[str, Any]:
+    """
+    Pending review work, oldest first (SLA order).
+    Pass `next_cursor` of a page as `cursor` to get the next one; filters must stay the same.
+    unclaimed=true hides runs with a live reviewer lease.
+    """
+    try:
+        SystemStatus(status)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid status")
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+
+    now = datetime.utcnow()
+    items = query_review_queue(
+        status,
+        capability=capability,
+        min_confidence=min_confidence,
+        max_confidence=max_confidence,
+        updated_before=(now - timedelta(seconds=min_age_s)).isoformat() if min_age_s is not None else None,
+        updated_after=(now - timedelta(seconds=max_age_s)).isoformat() if max_age_s is not None else None,
+        after=_decode_cursor(cursor) if cursor else None,
+        unleased_at=time.time() if unclaimed else None,
+        limit=limit,
+    )
+    for it in items:
+        it["age_s"] = round((now - datetime.fromisoformat(it["updated_at"])).total_seconds(), 3)
+    last = items[-1] if len(items) == limit else None
+    return {
+        "items": items,
+        "count": len(items),
+        "next_cursor": _encode_cursor(last["updated_at"], last["run_id"]) if last else None,
+    }
+
+
+def _lease_ttl(ttl_s: Optional[float]) -> float:
+    cfg = current_config()
+    ttl = cfg.lease_ttl_s if ttl_s is None else ttl_s
+    if ttl <= 0:
+        raise HTTPException(status_code=400, detail="ttl_s must be positive")
+    return min(ttl, cfg.lease_max_ttl_s)
+
+
+def _lease_out(lease: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **lease,
+        "expires_at": datetime.utcfromtimestamp(lease["expires_at"]).isoformat() + "Z",
+        "claimed_at": datetime.utcfromtimestamp(lease["claimed_at"]).isoformat() + "Z",
+        "ttl_s": round(lease["expires_at"] - time.time(), 3),
+    }
+
+
+async def _reap_leases_forever(interval_s: float) -> None:
+    # Expired leases are already ignored by claims and checks; this only keeps the table small
+    from starlette.concurrency import run_in_threadpool
+
+    while True:
+        await asyncio.sleep(max(1.0, interval_s))
+        try:
+            n = await run_in_threadpool(reap_expired_leases)
+            if n:
+                logger.info("Expired review leases reaped", extra={"count": n})
+        except Exception:
+            logger.warning("Lease reaper failed", exc_info=True)
+
+
+@app.post("/review/claim-next")
+def review_claim_next(req: ClaimNextRequest) -> Dict[str, Any]:
+    """Leases up to n of the oldest unclaimed needs_review runs to req.actor."""
+    if not 1 <= req.n <= 100:
+        raise HTTPException(status_code=400, detail="n must be between 1 and 100")
+    leases = claim_next(req.actor, req.n, _lease_ttl(req.ttl_s), capability=req.capability)
+    return {"items": [_lease_out(l) for l in leases], "count": len(leases)}
+
+
+@app.post("/review/{run_id}/claim")
+def review_claim(run_id: str, req: ClaimRequest) -> Dict[str, Any]:
+    """Leases one run; re-claiming by the holder extends the lease."""
+    lease = claim_run(run_id, req.actor, _lease_ttl(req.ttl_s))
+    if lease is not None:
+        return _lease_out(lease)
+    row = load_run_state(run_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if row["status"] != str(SystemStatus.NEEDS_REVIEW):
+        raise HTTPException(status_code=409, detail={"error": "Run is not awaiting review", "status": row["status"]})
+    held = active_lease(run_id)
+    raise HTTPException(
+        status_code=409,
+        detail={"error": "Run is claimed by another reviewer", "lease": _lease_out(held) if held else None},
+    )
+
+
+@app.post("/review/{run_id}/release")
+def review_release(run_id: str, req: ReleaseRequest) -> Dict[str, Any]:
+    return {"run_id": run_id, "released": release_lease(run_id, req.actor)}
+
+
+def _bulk_outcomes(outcomes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    items = [
+        {"run_id": o["request_id"], "ok": True, "status": str(o["status"])} if "status" in o else
+        {"run_id": o["request_id"], "ok": False, "error_type": o["error_type"], "error": o["error"],
+         **({"holder": o["holder"]} if o.get("holder") else {})}
+        for o in outcomes
+    ]
+    applied = sum(1 for it in items if it["ok"])
+    return {"applied": applied, "failed": len(items) - applied, "items": items}
+
+
+def _check_bulk_size(n: int) -> None:
+    if not 1 <= n <= BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"items must contain 1..{BULK_MAX_ITEMS} entries")
+
+
+@app.post("/review/bulk")
+def review_bulk(req: BulkReviewRequest) -> Dict[str, Any]:
+    """
+    Many review actions in one call. Every transition is validated; all valid ones are
+    persisted in one status_store transaction. Invalid items are reported, not applied.
+    """
+    _check_bulk_size(len(req.items))
+    with transaction():
+        outcomes = status_manager.bulk_review_actions(
+            [(it.run_id, it.action, it.reason) for it in req.items],
+            actor=req.actor,
+            role=req.role,
+            auth_type=req.auth_type,
+        )
+        done = [(it, o) for it, o in zip(req.items, outcomes) if "status" in o]
+        update_run_statuses([(it.run_id, str(o["status"]), it.action == "approve") for it, o in done])
+
+    # After commit: audit only what was persisted
+    for it, o in done:
+        _append_governance_audit_many(it.run_id, [("GOV_REVIEW_ACTION", {
+            "action": it.action,
+            "new_status": str(o["status"]),
+            "actor": req.actor,
+            "role": req.role,
+            "auth_type": req.auth_type,
+            "reason": it.reason,
+            "approval_provided": it.action == "approve",
+            "bulk": True,
+        })])
+        GOV_REVIEW_ACTION_TOTAL.labels(action=it.action).inc()
+        GOV_OUTCOME_TOTAL.labels(outcome=str(o["status"])).inc()
+    return _bulk_outcomes(outcomes)
+
+
 @app.post("/review/{run_id}")
 def review(run_id: str, review_req: ReviewRequest) -> Dict[str, Any]:
     try:
@@ -457,6 +837,8 @@ def review(run_id: str, review_req: ReviewRequest) -> Dict[str, Any]:
 
     except KeyError:
         raise HTTPException(status_code=404, detail="Run not found")
+    except ReviewLeaseError as e:
+        raise HTTPException(status_code=409, detail={"error": str(e), "holder": e.holder})
     except StatusTransitionError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -464,6 +846,44 @@ def review(run_id: str, review_req: ReviewRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/admin/override/bulk")
+def admin_override_bulk(req: BulkOverrideRequest) -> Dict[str, Any]:
+    """Bulk admin override; same validation, transaction and outcome format as /review/bulk."""
+    _check_bulk_size(len(req.items))
+    parsed: List[tuple] = []
+    invalid: Dict[int, Dict[str, Any]] = {}
+    for i, it in enumerate(req.items):
+        try:
+            parsed.append((it.run_id, SystemStatus(it.target_status), it.reason))
+        except ValueError:
+            invalid[i] = {"request_id": it.run_id, "error": "Invalid target_status", "error_type": "invalid_target"}
+
+    try:
+        with transaction():
+            planned = iter(status_manager.bulk_admin_override(
+                parsed, actor=req.actor, role=req.role, auth_type=req.auth_type,
+            ))
+            outcomes = [invalid[i] if i in invalid else next(planned) for i in range(len(req.items))]
+            done = [(it, o) for it, o in zip(req.items, outcomes) if "status" in o]
+            update_run_statuses([(it.run_id, str(o["status"]), None) for it, o in done])
+    except AdminOverrideError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    for it, o in done:
+        _append_governance_audit_many(it.run_id, [("GOV_ADMIN_OVERRIDE", {
+            "target_status": it.target_status,
+            "new_status": str(o["status"]),
+            "actor": req.actor,
+            "role": req.role,
+            "auth_type": req.auth_type,
+            "reason": it.reason,
+            "bulk": True,
+        })])
+        GOV_ADMIN_OVERRIDE_TOTAL.labels(target_status=it.target_status).inc()
+        GOV_OUTCOME_TOTAL.labels(outcome=str(o["status"])).inc()
+    return _bulk_outcomes(outcomes)
+
+
 @app.post("/admin/override/{run_id}")
 def admin_override(run_id: str, override_req: AdminOverrideRequest) -> Dict[str, Any]:
     try:
@@ -524,6 +944,73 @@ def admin_override(run_id: str, override_req: AdminOverrideRequest) -> Dict[str,
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ==================== STATUS FEED (SSE / WebSocket) ====================
+
+@app.get("/events/status")
+async def events_status(status: Optional[str] = None, capability: Optional[str] = None) -> StreamingResponse:
+    """
+    Server-Sent Events of status transitions. Filters are comma-separated lists,
+    e.g. ?status=needs_review,approved&capability=np_document_triage.
+    """
+    try:
+        sub = status_bus.subscribe(
+            statuses=parse_filter(status), capabilities=parse_filter(capability), transport="sse",
+        )
+    except TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many status feed subscribers")
+    return StreamingResponse(
+        sse_stream(sub, keepalive_s=_env_float("NP_EVENTS_KEEPALIVE_S", 15.0)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/status")
+async def ws_status(websocket: WebSocket, status: Optional[str] = None, capability: Optional[str] = None) -> None:
+    """Same feed as /events/status as JSON messages: {"type": "status" | "ping" | "overflow", ...}."""
+    keepalive_s = _env_float("NP_EVENTS_KEEPALIVE_S", 15.0)
+    try:
+        sub = status_bus.subscribe(
+            statuses=parse_filter(status), capabilities=parse_filter(capability), transport="ws",
+        )
+    except TooManySubscribers:
+        await websocket.close(code=1013, reason="too many subscribers")
+        return
+    await websocket.accept()
+
+    async def _until_disconnect() -> None:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    reader = asyncio.create_task(_until_disconnect())
+    try:
+        while True:
+            getter = asyncio.ensure_future(sub.get(timeout=keepalive_s))
+            done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                getter.cancel()
+                break
+            try:
+                event = getter.result()
+            except SlowConsumer:
+                await websocket.send_json({"type": "overflow", "reason": "slow_consumer"})
+                await websocket.close(code=1013, reason="slow consumer")
+                break
+            msg = {"type": "ping"} if event is None else {"type": "status", **event}
+            try:
+                # A client that stops reading must not pin this task on a full socket buffer
+                await asyncio.wait_for(websocket.send_json(msg), timeout=keepalive_s)
+            except asyncio.TimeoutError:
+                status_bus.unsubscribe(sub, reason="slow_consumer")
+                await websocket.close(code=1013, reason="slow consumer")
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        sub.close()
+
+
 @app.get("/debug/status/{run_id}")
 def debug_status(run_id: str) -> Dict[str, Any]:
     row = load_run_state(run_id)
@@ -535,33 +1022,331 @@ def debug_status(run_id: str) -> Dict[str, Any]:
     }
 
 
-@app.get("/debug/audit/{run_id}")
-def debug_audit(run_id: str) -> Dict[str, Any]:
-    gov_path = _governance_audit_path(run_id)
-    gov = _read_jsonl(gov_path)
+def _parse_hour(value: Optional[str], default: datetime, name: str) -> str:
+    if value is None:
+        return default.strftime("%Y-%m-%dT%H")
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected ISO 8601 (UTC)")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)  # buckets are UTC hours; naive values are taken as UTC
+    return dt.strftime("%Y-%m-%dT%H")
+
+
+@app.get("/stats")
+def stats(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    group_by: str = "status",
+    capability: Optional[str] = None,
+    status: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run counts by current status, bucketed by the hour of their last update (default: last 24h).
+    group_by: comma list of hour, capability, status, hitl_required (empty for a plain total).
+    Served from run_status_rollup; hour granularity, partial hours at the edges count in full.
+    """
+    now = datetime.utcnow()
+    from_hour = _parse_hour(since, now - timedelta(hours=24), "since")
+    to_hour = _parse_hour(until, now, "until")
+    dims = tuple(parse_filter(group_by))
+    try:
+        items = query_status_stats(from_hour, to_hour, group_by=dims, capability=capability, status=status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "from_hour": from_hour,
+        "to_hour": to_hour,
+        "group_by": [d for d in STATS_DIMENSIONS if d in dims],
+        "total": sum(it["count"] for it in items),
+        "items": items,
+    }
 
-    mem = status_manager.get_audit_trail(run_id) or []
 
-    combined: List[Dict[str, Any]] = []
-    if gov:
-        combined.extend(gov)
-    if mem:
-        combined.extend(mem)
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison (RFC 9110 13.1.2): W/"x" matches "x"
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+@app.post("/status/batch")
+def status_batch(req: StatusBatchRequest, request: Request) -> Response:
+    """
+    Status of many runs in one call (same fields as /debug/status, plus the run_status flags).
+    Responses carry an ETag; send it back as If-None-Match to get 304 while nothing changed.
+    """
+    limit = int(_env_float("NP_STATUS_BATCH_MAX", 1000))
+    if not 1 <= len(req.run_ids) <= limit:
+        raise HTTPException(status_code=400, detail=f"run_ids must contain 1..{limit} entries")
+
+    states = load_run_states(req.run_ids)
+    items: List[Dict[str, Any]] = []
+    for run_id in req.run_ids:
+        row = states[run_id]
+        if row is None:
+            items.append({"run_id": run_id, "status": "NOT_FOUND", "exists": False})
+        else:
+            items.append({**row, "status": str(row["status"]), "exists": True})
+    body = json.dumps({"items": items}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+AUDIT_PAGE_MAX = 1000
+AUDIT_GZIP_MIN_BYTES = 1024
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
 
-    if not combined:
+def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # Sync-flush per chunk so a streaming client can decode what it has received so far
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+    yield z.flush()
+
+
+def _audit_stream(gov_path: str, gov_cold: Optional[List[bytes]], mem: List[Dict[str, Any]], start: int,
+                  gov_total: int) -> Iterator[bytes]:
+    if gov_cold is not None:
+        lines: Iterator[bytes] = iter(gov_cold[start:])
+    else:
+        lines = auditlog.iter_lines(gov_path, start, gov_total - start if start < gov_total else 0)
+    for line in lines:
+        yield line if line.endswith(b"\n") else line + b"\n"
+    for entry in mem[max(0, start - gov_total):]:
+        yield json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+@app.get("/debug/audit/{run_id}")
+def debug_audit(
+    run_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    stream: bool = False,
+) -> Response:
+    """
+    Governance audit records, then the state-machine transitions, in pages of `limit`;
+    pass `next_cursor` back as `cursor`. Pages are read by seeking via the audit's offset index.
+    stream=true returns everything from `cursor` on as NDJSON without buffering the trail.
+    gzip-encoded when the client accepts it. Archived runs are read from their segment (tier=archive).
+    """
+    try:
+        start = int(cursor) if cursor else 0
+        if start < 0:
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not 1 <= limit <= AUDIT_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {AUDIT_PAGE_MAX}")
+
+    gov_path = _governance_audit_path(run_id, create=False)
+    gov_cold: Optional[List[bytes]] = None  # archived trail, when the run is no longer in outputs/
+    if os.path.exists(gov_path):
+        gov_total = auditlog.count(gov_path)
+    else:
+        data = _archived_governance_audit(run_id)
+        if data is not None:
+            gov_cold = [ln for ln in data.splitlines(keepends=True) if ln.strip()]
+        gov_total = len(gov_cold or [])
+    mem = status_manager.get_audit_trail(run_id) or []
+    total = gov_total + len(mem)
+    if not total:
         raise HTTPException(status_code=404, detail="No audit trail")
 
-    return {
+    use_gzip = _accepts_gzip(request)
+    headers = {"Vary": "Accept-Encoding", "X-Audit-Total": str(total)}
+
+    if stream:
+        chunks = _audit_stream(gov_path, gov_cold, mem, start, gov_total)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(
+            _gzip_chunks(chunks) if use_gzip else chunks,
+            media_type="application/x-ndjson",
+            headers=headers,
+        )
+
+    page: List[Dict[str, Any]] = []
+    if start < gov_total and gov_cold is not None:
+        for line in gov_cold[start:start + limit]:
+            try:
+                page.append(json.loads(line))
+            except ValueError:
+                continue
+    elif start < gov_total:
+        page, _ = auditlog.read_page(gov_path, start, limit)
+    if len(page) < limit:
+        offset = max(0, start - gov_total)
+        page.extend(mem[offset:offset + limit - len(page)])
+    end = start + limit
+    body = json.dumps({
         "run_id": run_id,
         "governance_audit_path": gov_path.replace("\\", "/"),
-        "audit_trail": combined,
-        "count": len(combined),
+        "tier": "archive" if gov_cold is not None else "hot",
+        "audit_trail": page,
+        "count": len(page),
+        "total": total,
+        "next_cursor": str(end) if end < total else None,
+    }, ensure_ascii=False).encode("utf-8")
+    if use_gzip and len(body) >= AUDIT_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/audit/search")
+def audit_search(
+    q: Optional[str] = None,
+    signal: Optional[str] = None,
+    reason: Optional[str] = None,
+    event: Optional[str] = None,
+    classification: Optional[str] = None,
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Dict[str, Any]:
+    """
+    Full-text search over run audits and review decisions (NP_AUDIT_INDEX=1), newest first.
+    q is an FTS5 query, e.g. `signals:geldwäsche AND NOT status:ok`; the other filters are ANDed.
+    """
+    if not current_config().audit_index_enabled:
+        raise HTTPException(status_code=404, detail="Disabled (set NP_AUDIT_INDEX=1)")
+    from gcu_v1.persistence import audit_index
+
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    for name, value in (("since", since), ("until", until)):
+        if value is not None:
+            try:
+                datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid {name}: expected ISO 8601")
+    try:
+        before_id = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        items, next_id = audit_index.search(
+            q, signal=signal, reason=reason, event=event, classification=classification,
+            status=status, kind=kind, since=since, until=until, before_id=before_id, limit=limit,
+        )
+    except audit_index.SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "count": len(items), "next_cursor": str(next_id) if next_id is not None else None}
+
+
+# ==================== DEBUG: PROFILER (opt-in) ====================
+
+def _require_debug(flag: str) -> None:
+    if not env_truthy(flag):
+        raise HTTPException(status_code=404, detail=f"Disabled (set {flag}=1)")
+
+
+@app.get("/debug/profile")
+def debug_profile(seconds: float = 5.0, interval_ms: float = 10.0, top: int = 25, format: str = "json"):
+    """
+    Wall-clock sampling profile over all threads (NP_DEBUG_PROFILE=1).
+    format=collapsed returns flamegraph-compatible folded stacks as text.
+    """
+    _require_debug("NP_DEBUG_PROFILE")
+
+    from gcu_v1.api import profiler
+
+    try:
+        prof = profiler.profile(seconds, interval_ms / 1000.0, exclude_idents={threading.get_ident()})
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    collapsed = profiler.collapsed_text(prof["collapsed"])
+    if format == "collapsed":
+        return PlainTextResponse(collapsed)
+
+    return {
+        "seconds": prof["seconds"],
+        "samples": prof["samples"],
+        "final_interval_ms": prof["final_interval_ms"],
+        "overhead_ratio": prof["overhead_ratio"],
+        "top": profiler.top_functions(prof["collapsed"], top),
+        "collapsed": collapsed,
     }
 
 
+# ==================== DEBUG: MEMORY (opt-in) ====================
+
+@app.get("/debug/memory")
+def debug_memory(objects: bool = True) -> Dict[str, Any]:
+    _require_debug("NP_DEBUG_MEMORY")
+    from gcu_v1.api import memdiag
+
+    storage = getattr(status_manager, "_storage", None)
+    extra: Dict[str, Any] = {
+        "status_manager_runs": len(getattr(storage, "_storage", {}) or {}),
+        "prometheus_series": memdiag.prometheus_series(),
+    }
+    if objects:
+        extra["project_objects"] = memdiag.project_object_counts()
+    return memdiag.status(extra)
+
+
+@app.post("/debug/memory/start")
+def debug_memory_start(frames: int = 10) -> Dict[str, Any]:
+    _require_debug("NP_DEBUG_MEMORY")
+    from gcu_v1.api import memdiag
+
+    return memdiag.start(frames)
+
+
+@app.post("/debug/memory/stop")
+def debug_memory_stop() -> Dict[str, Any]:
+    _require_debug("NP_DEBUG_MEMORY")
+    from gcu_v1.api import memdiag
+
+    return memdiag.stop()
+
+
+@app.post("/debug/memory/snapshot/{name}")
+def debug_memory_snapshot(name: str) -> Dict[str, Any]:
+    _require_debug("NP_DEBUG_MEMORY")
+    from gcu_v1.api import memdiag
+
+    try:
+        return memdiag.take_snapshot(name)
+    except memdiag.SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/debug/memory/diff")
+def debug_memory_diff(a: str, b: str, group_by: str = "lineno", top: int = 25) -> Dict[str, Any]:
+    _require_debug("NP_DEBUG_MEMORY")
+    from gcu_v1.api import memdiag
+
+    try:
+        return memdiag.diff(a, b, group_by=group_by, top=top)
+    except memdiag.SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Snapshot not found: {e}")
+
+
 if __name__ == "__main__":
     import uvicorn
 
+    from gcu_v1.logsetup import uvicorn_log_level
+
     host = os.environ.get("GCU_HOST", "127.0.0.1")
     port = int(os.environ.get("GCU_PORT", "8000"))
 
@@ -570,5 +1355,5 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=False,
-        log_level="debug",
+        log_level=uvicorn_log_level(),
     )
@@ -0,0 +1,137 @@
+﻿from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Optional
+
+# Slow-request log: requests above NP_SLOW_REQUEST_MS get one structured JSONL record
+# (stage breakdown, sizes, fingerprints - never payload content) in a dedicated
+# rotating file. Records are rate-limited per minute so a latency incident
+# does not turn into an I/O incident; suppressed records are counted instead.
+# The server passes the threshold from the config snapshot (NP_SLOW_REQUEST_MS), so
+# nothing here reads the environment per request.
+
+DEFAULT_THRESHOLD_MS = 1000.0
+DEFAULT_PATH = "gcu_v1/outputs/_slow/slow_requests.jsonl"
+DEFAULT_MAX_PER_MIN = 60
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Stages that are dominated by file I/O resp. SQLite
+_FILE_IO_STAGES = ("input_write", "intake", "metadata_write", "finalize_audit", "gov_audit_io")
+_DB_STAGES = ("gov_db",)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+
+class SlowRequestLog:
+    def __init__(
+        self,
+        *,
+        threshold_ms: float,
+        path: str,
+        max_per_min: int = DEFAULT_MAX_PER_MIN,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backups: int = DEFAULT_BACKUPS,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.max_per_min = max_per_min
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+        self._suppressed = 0
+        self._logger: Optional[logging.Logger] = None
+
+    @classmethod
+    def from_env(cls) -> "SlowRequestLog":
+        return cls(
+            threshold_ms=_env_float("NP_SLOW_REQUEST_MS", DEFAULT_THRESHOLD_MS),
+            path=os.getenv("NP_SLOW_LOG_PATH", DEFAULT_PATH).strip() or DEFAULT_PATH,
+            max_per_min=int(_env_float("NP_SLOW_LOG_MAX_PER_MIN", DEFAULT_MAX_PER_MIN)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def _get_logger(self) -> logging.Logger:
+        if self._logger is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            lg = logging.getLogger(f"gcu_v1.slowlog.{id(self)}")
+            lg.propagate = False
+            lg.setLevel(logging.INFO)
+            h = RotatingFileHandler(self.path, maxBytes=self._max_bytes, backupCount=self._backups, encoding="utf-8")
+            h.setFormatter(logging.Formatter("%(message)s"))
+            lg.addHandler(h)
+            self._logger = lg
+        return self._logger
+
+    def _admit(self) -> Optional[int]:
+        """Returns the number of records suppressed since the last one, or None if rate-limited."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= 60.0:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.max_per_min:
+                self._suppressed += 1
+                return None
+            self._window_count += 1
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def maybe_record(
+        self,
+        *,
+        total_s: float,
+        queue_wait_s: float,
+        path: str,
+        status: str,
+        run_id: Optional[str],
+        tracer: Any,
+        threshold_ms: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        threshold = self.threshold_ms if threshold_ms is None else threshold_ms
+        total_ms = total_s * 1000.0
+        if threshold <= 0 or total_ms < threshold:
+            return None
+        suppressed = self._admit()
+        if suppressed is None:
+            return None
+
+        stages = tracer.stage_ms() if tracer is not None else {}
+        attrs = getattr(tracer, "attrs", {}) or {}
+        rec = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "path": path,
+            "run_id": run_id,
+            "status": status,
+            "total_ms": round(total_ms, 3),
+            "threshold_ms": threshold,
+            "queue_wait_ms": round(queue_wait_s * 1000.0, 3),
+            "stages_ms": stages,
+            "file_io_ms": round(sum(stages.get(s, 0.0) for s in _FILE_IO_STAGES), 3),
+            "db_ms": round(sum(stages.get(s, 0.0) for s in _DB_STAGES), 3),
+            "doc_bytes": attrs.get("doc_bytes"),
+            "sha256_prefix": attrs.get("sha256_prefix"),
+            "rule_hits": attrs.get("rule_hits"),
+            "suppressed_since_last": suppressed,
+        }
+        try:
+            self._get_logger().info(json.dumps(rec, ensure_ascii=False))
+        except Exception:
+            logging.getLogger(__name__).warning("Slow-request log write failed", exc_info=True)
+        return rec
@@ -0,0 +1 @@
+﻿# gcu_v1.bench package
@@ -0,0 +1,25 @@
+﻿from __future__ import annotations
+import math
+from typing import Any, Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    # Nearest-rank percentile on pre-sorted data
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return float(sorted_values[k])
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    s = sorted(samples)
+    n = len(s)
+    return {
+        "count": n,
+        "mean": (sum(s) / n) if n else 0.0,
+        "min": s[0] if n else 0.0,
+        "p50": percentile(s, 50),
+        "p95": percentile(s, 95),
+        "p99": percentile(s, 99),
+        "max": s[-1] if n else 0.0,
+    }
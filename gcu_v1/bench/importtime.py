@@ -0,0 +1,143 @@
+﻿from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# Import-time report for worker boot (python -X importtime in a fresh interpreter).
+#
+#   python -m gcu_v1.bench.importtime                                   # gcu_v1.api.server
+#   python -m gcu_v1.bench.importtime -m gcu_v1.api.run --prefix gcu_v1 --top 15
+#   python -m gcu_v1.bench.importtime --out importtime.json
+#   python -m gcu_v1.bench.importtime --compare importtime.json --tolerance 0.25
+#
+# Per module the minimum over --repeats runs is kept (noise is one-sided).
+
+DEFAULT_MODULES = ["gcu_v1.api.server"]
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parses `import time: self [us] | cumulative | imported package` lines."""
+    rows: List[Dict[str, Any]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append({"module": name.strip(), "self_us": self_us, "cumulative_us": cum_us, "depth": depth})
+    return rows
+
+
+def _run_once(module: str) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPROFILEIMPORTTIME": ""},
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return {"wall_s": wall, "rows": parse_importtime(proc.stderr)}
+
+
+def measure(module: str, repeats: int = 3) -> Dict[str, Any]:
+    runs = [_run_once(module) for _ in range(max(1, repeats))]
+    best: Dict[str, Dict[str, Any]] = {}
+    for run in runs:
+        for r in run["rows"]:
+            cur = best.get(r["module"])
+            if cur is None or r["cumulative_us"] < cur["cumulative_us"]:
+                best[r["module"]] = r
+    top = best.get(module)
+    return {
+        "module": module,
+        "total_us": top["cumulative_us"] if top else sum(r["self_us"] for r in best.values()),
+        "interpreter_wall_s": min(r["wall_s"] for r in runs),
+        "modules": sorted(best.values(), key=lambda r: -r["cumulative_us"]),
+    }
+
+
+def run_report(modules: List[str], repeats: int = 3) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": {m: measure(m, repeats) for m in modules},
+    }
+
+
+def format_table(result: Dict[str, Any], top: int = 25, prefix: Optional[str] = None) -> str:
+    rows = [r for r in result["modules"] if not prefix or r["module"].startswith(prefix)]
+    lines = [
+        f"{result['module']}: {result['total_us'] / 1000.0:.1f} ms import, "
+        f"{result['interpreter_wall_s'] * 1000.0:.1f} ms interpreter wall",
+        f"{'cumulative ms':>14} {'self ms':>9}  module",
+    ]
+    for r in rows[:top]:
+        lines.append(f"{r['cumulative_us'] / 1000.0:>14.1f} {r['self_us'] / 1000.0:>9.1f}  {'  ' * r['depth']}{r['module']}")
+    return "\n".join(lines)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for module, cur in current["results"].items():
+        base = baseline.get("results", {}).get(module)
+        if not base or not base.get("total_us"):
+            continue
+        ratio = cur["total_us"] / base["total_us"]
+        rows.append({
+            "module": module,
+            "baseline_ms": base["total_us"] / 1000.0,
+            "current_ms": cur["total_us"] / 1000.0,
+            "ratio": ratio,
+            "regression": ratio > 1.0 + tolerance,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Import-time report (python -X importtime)")
+    ap.add_argument("-m", "--module", action="append", default=None, help="Module to import (repeatable)")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--top", type=int, default=25)
+    ap.add_argument("--prefix", default=None, help="Only list modules starting with this (e.g. gcu_v1)")
+    ap.add_argument("--out", default=None, help="Write JSON report (baseline) here")
+    ap.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    report = run_report(args.module or DEFAULT_MODULES, repeats=args.repeats)
+    for res in report["results"].values():
+        print(format_table(res, top=args.top, prefix=args.prefix), file=sys.stderr)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(report, baseline, args.tolerance)
+        print(json.dumps({"compared": len(rows), "rows": rows}, indent=2))
+        return 1 if any(r["regression"] for r in rows) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,237 @@
+﻿from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from gcu_v1.bench._stats import summarize
+
+# Replay/load generator for the GCU API.
+#
+# Corpus: JSONL, one request per line. Either an explicit request
+#   {"method": "GET", "path": "/health"}
+#   {"method": "POST", "path": "/review/r1", "json": {...}, "name": "POST /review/{run_id}"}
+# or a bare RunRequest body (like req.json), which is sent as POST /run.
+#
+# Closed loop (default): `concurrency` workers send back-to-back.
+# Open loop (--rate): arrivals on a fixed (or --poisson) schedule; latency is measured
+# from the scheduled start so queueing delay is not hidden (no coordinated omission).
+
+DEFAULT_APP = "gcu_v1.api.server:app"
+
+
+def load_corpus(path: Path) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    with path.open("r", encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if "path" in obj and "method" in obj:
+                req = {"method": obj["method"].upper(), "path": obj["path"], "json": obj.get("json")}
+            else:
+                req = {"method": "POST", "path": "/run", "json": obj}
+            req["name"] = obj.get("name") or f"{req['method']} {req['path']}"
+            out.append(req)
+    if not out:
+        raise SystemExit(f"Empty corpus: {path}")
+    return out
+
+
+def _import_app(spec: str) -> Any:
+    mod_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(mod_name), attr or "app")
+
+
+@asynccontextmanager
+async def make_client(*, url: Optional[str], app_spec: str, timeout: float) -> AsyncIterator[httpx.AsyncClient]:
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as c:
+            yield c
+        return
+
+    app = _import_app(app_spec)
+    # ASGITransport does not run lifespan; do it here so startup (init_db, ...) happens
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as c:
+            yield c
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, latency: float, status: Optional[int]) -> None:
+        self.latencies[name].append(latency)
+        self.status_codes[name][str(status) if status is not None else "exception"] += 1
+        if status is None or status >= 400:
+            self.errors[name] += 1
+
+
+async def _send(client: httpx.AsyncClient, req: Dict[str, Any], rec: Optional[_Recorder], started: float) -> None:
+    status: Optional[int] = None
+    try:
+        r = await client.request(req["method"], req["path"], json=req.get("json"))
+        status = r.status_code
+    except Exception:
+        status = None
+    if rec is not None:
+        rec.record(req["name"], time.perf_counter() - started, status)
+
+
+async def _closed_loop(client, corpus, rec, *, total: int, concurrency: int) -> None:
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        for i in counter:
+            t0 = time.perf_counter()
+            await _send(client, corpus[i % len(corpus)], rec, t0)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def _open_loop(client, corpus, rec, *, total: int, rate: float, poisson: bool, max_inflight: int) -> None:
+    sem = asyncio.Semaphore(max_inflight)
+    tasks = []
+    t_next = time.perf_counter()
+
+    async def one(req, scheduled) -> None:
+        async with sem:
+            await _send(client, req, rec, scheduled)
+
+    for i in range(total):
+        delay = t_next - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(corpus[i % len(corpus)], t_next)))
+        t_next += random.expovariate(rate) if poisson else 1.0 / rate
+
+    await asyncio.gather(*tasks)
+
+
+async def run_load(
+    corpus: List[Dict[str, Any]],
+    *,
+    requests: int,
+    concurrency: int = 8,
+    rate: Optional[float] = None,
+    poisson: bool = False,
+    warmup: int = 0,
+    url: Optional[str] = None,
+    app_spec: str = DEFAULT_APP,
+    timeout: float = 30.0,
+    max_inflight: int = 1000,
+) -> Dict[str, Any]:
+    async with make_client(url=url, app_spec=app_spec, timeout=timeout) as client:
+        if warmup:
+            await _closed_loop(client, corpus, None, total=warmup, concurrency=concurrency)
+
+        rec = _Recorder()
+        t0 = time.perf_counter()
+        if rate:
+            await _open_loop(client, corpus, rec, total=requests, rate=rate, poisson=poisson, max_inflight=max_inflight)
+        else:
+            await _closed_loop(client, corpus, rec, total=requests, concurrency=concurrency)
+        elapsed = time.perf_counter() - t0
+
+    endpoints: Dict[str, Any] = {}
+    for name, lat in sorted(rec.latencies.items()):
+        n = len(lat)
+        endpoints[name] = {
+            "latency_s": summarize(lat),
+            "rps": n / elapsed if elapsed > 0 else 0.0,
+            "errors": rec.errors[name],
+            "error_rate": rec.errors[name] / n if n else 0.0,
+            "status_codes": dict(rec.status_codes[name]),
+        }
+
+    all_lat = [x for lat in rec.latencies.values() for x in lat]
+    total_errors = sum(rec.errors.values())
+    return {
+        "config": {
+            "target": url or app_spec,
+            "mode": "open" if rate else "closed",
+            "requests": requests,
+            "concurrency": concurrency,
+            "rate": rate,
+            "poisson": poisson,
+            "warmup": warmup,
+        },
+        "env": {"python": platform.python_version(), "platform": platform.platform()},
+        "elapsed_s": elapsed,
+        "overall": {
+            "latency_s": summarize(all_lat),
+            "rps": len(all_lat) / elapsed if elapsed > 0 else 0.0,
+            "errors": total_errors,
+            "error_rate": total_errors / len(all_lat) if all_lat else 0.0,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'endpoint':<36} {'n':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7}"]
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["overall"])]
+    for name, e in rows:
+        lat = e["latency_s"]
+        lines.append(
+            f"{name:<36} {lat['count']:>7} {e['rps']:>9.1f} {lat['p50'] * 1e3:>9.2f} "
+            f"{lat['p95'] * 1e3:>9.2f} {lat['p99'] * 1e3:>9.2f} {e['error_rate'] * 100:>7.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay a JSONL corpus against the GCU API")
+    ap.add_argument("corpus", help="JSONL corpus (explicit requests or RunRequest bodies, e.g. req.json)")
+    ap.add_argument("--url", default=None, help="Target a running server (e.g. http://127.0.0.1:8000)")
+    ap.add_argument("--app", default=DEFAULT_APP, help="ASGI app for in-process mode")
+    ap.add_argument("-n", "--requests", type=int, default=1000)
+    ap.add_argument("-c", "--concurrency", type=int, default=8)
+    ap.add_argument("--rate", type=float, default=None, help="Open loop: arrivals per second")
+    ap.add_argument("--poisson", action="store_true", help="Open loop: exponential inter-arrival times")
+    ap.add_argument("--max-inflight", type=int, default=1000, help="Open loop: cap on outstanding requests")
+    ap.add_argument("--warmup", type=int, default=50, help="Requests sent before measuring")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--out", default=None, help="Write JSON report here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    report = asyncio.run(run_load(
+        load_corpus(Path(args.corpus)),
+        requests=args.requests,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        poisson=args.poisson,
+        warmup=args.warmup,
+        url=args.url,
+        app_spec=args.app,
+        timeout=args.timeout,
+        max_inflight=args.max_inflight,
+    ))
+
+    print(format_report(report), file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 0 if report["overall"]["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
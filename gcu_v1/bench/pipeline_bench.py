@@ -0,0 +1,309 @@
+﻿from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Micro-benchmarks for pipeline stages, persistence and the status machine.
+#
+#   python -m gcu_v1.bench.pipeline_bench --out baseline.json
+#   python -m gcu_v1.bench.pipeline_bench --compare baseline.json --tolerance 0.15
+#
+# Each case is parametrized (document size, rule count, history length); per-op
+# timings are the median over repeats of an auto-calibrated loop.
+
+Factory = Callable[[Path], Callable[[], Any]]
+
+CASES: List[Tuple[str, Factory]] = []
+
+KB = 1024
+MB = 1024 * 1024
+
+
+def case(name: str, **grid: List[Any]) -> Callable[[Callable[..., Callable[[], Any]]], Callable[..., Callable[[], Any]]]:
+    """Registers one benchmark per combination of the given parameter grid."""
+    def deco(fn: Callable[..., Callable[[], Any]]) -> Callable[..., Callable[[], Any]]:
+        keys = list(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            params = dict(zip(keys, values))
+            label = name + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else "")
+            CASES.append((label, lambda tmp, _p=params: fn(tmp, **_p)))
+        return fn
+    return deco
+
+
+def _text(size: int) -> str:
+    chunk = "Vertrag über Kreditwürdigkeit, gdpr audit, newsletter und sonstiger Text. "
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+
+def _keywords(rules: int) -> Dict[str, Any]:
+    per = max(1, rules // 3)
+    mk = lambda prefix, w: [{"signal": f"{prefix}{i}", "weight": w} for i in range(per)]
+    return {
+        "high_risk_signals": mk("hrisk", 0.3),
+        "potential_risk_signals": mk("prisk", 0.1),
+        "safe_signals": mk("safe", -0.05),
+    }
+
+
+# ==================== CASES ====================
+
+@case("classify", doc_bytes=[1 * KB, 100 * KB, 1 * MB])
+def _classify(tmp: Path, doc_bytes: int):
+    from gcu_v1.pipeline.classify import classify
+
+    p = tmp / f"classify_{doc_bytes}.txt"
+    p.write_text(_text(doc_bytes), encoding="utf-8")
+    return lambda: classify(p, {"events": []})
+
+
+@case("run_doc_triage", doc_bytes=[1 * KB, 100 * KB], rules=[30, 300, 3000])
+def _doc_triage(tmp: Path, doc_bytes: int, rules: int):
+    from gcu_v1.pipeline.doc_triage import run_doc_triage
+
+    text = _text(doc_bytes)
+    bundle = {"capability": "doc_triage", "keywords": _keywords(rules)}
+    return lambda: run_doc_triage(text=text, bundle=bundle)
+
+
+@case("intake", doc_bytes=[1 * KB, 1 * MB, 16 * MB])
+def _intake(tmp: Path, doc_bytes: int):
+    from gcu_v1.pipeline.intake import intake
+
+    p = tmp / f"intake_{doc_bytes}.bin"
+    p.write_bytes(b"x" * doc_bytes)
+    return lambda: intake(p)
+
+
+@case("sha256_file", doc_bytes=[1 * KB, 1 * MB, 16 * MB])
+def _sha(tmp: Path, doc_bytes: int):
+    from gcu_v1.pipeline._utils import sha256_file
+
+    p = tmp / f"sha_{doc_bytes}.bin"
+    p.write_bytes(b"x" * doc_bytes)
+    return lambda: sha256_file(p)
+
+
+@case("write_json", events=[10, 1000])
+def _write_json(tmp: Path, events: int):
+    from gcu_v1.pipeline._utils import write_json
+
+    obj = {"events": [{"ts": "2026-01-01T00:00:00+00:00", "type": "e", "detail": "x" * 40}] * events}
+    p = tmp / f"write_{events}.json"
+    return lambda: write_json(p, obj)
+
+
+@case("finalize_audit", events=[10, 1000])
+def _finalize(tmp: Path, events: int):
+    from gcu_v1.pipeline.finalize_audit import finalize_audit
+
+    audit = {"run_id": "bench", "events": [{"ts": "t", "type": "e", "detail": "x" * 40}] * events}
+
+    def run() -> None:
+        ctx = {"run_id": "bench", "events": []}
+        finalize_audit(tmp, audit, ctx)
+    return run
+
+
+@case("persist_run_state")
+def _persist(tmp: Path):
+    from gcu_v1.persistence import status_store
+
+    status_store.DB_PATH = tmp / "bench.db"
+    status_store.init_db()
+    ids = itertools.count()
+    return lambda: status_store.persist_run_state(f"run-{next(ids)}", "needs_review", True, True, False)
+
+
+@case("load_run_state")
+def _load(tmp: Path):
+    from gcu_v1.persistence import status_store
+
+    status_store.DB_PATH = tmp / "bench.db"
+    status_store.init_db()
+    status_store.persist_run_state("run-load", "needs_review", True, True, False)
+    return lambda: status_store.load_run_state("run-load")
+
+
+@case("review_queue_page", rows=[10_000, 1_000_000])
+def _review_queue(tmp: Path, rows: int):
+    from gcu_v1.persistence import status_store
+
+    status_store.DB_PATH = tmp / f"queue_{rows}.db"
+    status_store.init_db()
+    statuses = ["ok", "ok", "needs_review", "approved"]
+    with status_store.get_conn() as c:
+        c.executemany(
+            "INSERT OR IGNORE INTO run_status (run_id, status, hitl_required, approval_required, approval_provided, "
+            "updated_at, capability, confidence) VALUES (?, ?, 1, 1, 0, ?, 'doc_triage', ?)",
+            ((f"run-{i:08d}", statuses[i % 4], f"2026-01-01T{i:012d}", (i % 100) / 100) for i in range(rows)),
+        )
+    # Deep page with a confidence band: still one index range scan
+    after = (f"2026-01-01T{rows // 2:012d}", "")
+    return lambda: status_store.query_review_queue(after=after, min_confidence=0.2, max_confidence=0.5, limit=50)
+
+
+def _machine_dict(history: int) -> Dict[str, Any]:
+    entry = {
+        "from": "ok",
+        "to": "needs_review",
+        "context": {
+            "actor": "bench",
+            "role": "auto",
+            "auth_type": "api_key",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "reason": "bench",
+            "metadata": {"confidence": 0.5},
+        },
+    }
+    return {"current_status": "needs_review", "transition_history": [entry] * history}
+
+
+@case("StatusStateMachine.to_dict", history=[1, 100, 1000])
+def _to_dict(tmp: Path, history: int):
+    from gcu_v1.status_machine import StatusStateMachine
+
+    m = StatusStateMachine.from_dict(_machine_dict(history))
+    return m.to_dict
+
+
+@case("StatusStateMachine.from_dict", history=[1, 100, 1000])
+def _from_dict(tmp: Path, history: int):
+    from gcu_v1.status_machine import StatusStateMachine
+
+    data = _machine_dict(history)
+    return lambda: StatusStateMachine.from_dict(data)
+
+
+@case("NovaPactStatusManager.process_classification", hitl=[False, True])
+def _process(tmp: Path, hitl: bool):
+    from gcu_v1.status_machine import ClassificationResult, NovaPactStatusManager
+
+    mgr = NovaPactStatusManager()
+    res = ClassificationResult(confidence=0.5, hitl_required=hitl, approval=False)
+    ids = itertools.count()
+    return lambda: mgr.process_classification(f"req-{next(ids)}", res, "bench", "auto", "api_key")
+
+
+# ==================== RUNNER ====================
+
+def _calibrate(fn: Callable[[], Any], min_time: float) -> int:
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= min_time or loops >= 1_000_000:
+            return loops
+        loops *= 2
+
+
+def run_suite(
+    *,
+    select: Optional[str] = None,
+    repeats: int = 5,
+    min_time: float = 0.1,
+) -> Dict[str, Any]:
+    from gcu_v1.persistence import status_store
+
+    results: Dict[str, Any] = {}
+    db_path = status_store.DB_PATH
+    try:
+        with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as d:
+            for name, factory in CASES:
+                if select and select not in name:
+                    continue
+                fn = factory(Path(d))
+                loops = _calibrate(fn, min_time)
+                per_op: List[float] = []
+                for _ in range(repeats):
+                    t0 = time.perf_counter()
+                    for _ in range(loops):
+                        fn()
+                    per_op.append((time.perf_counter() - t0) / loops)
+                results[name] = {
+                    "median_s": statistics.median(per_op),
+                    "min_s": min(per_op),
+                    "loops": loops,
+                    "repeats": repeats,
+                }
+    finally:
+        status_store.DB_PATH = db_path
+
+    return {
+        "meta": {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Returns one row per case present in both runs; `regression` is set beyond tolerance."""
+    rows: List[Dict[str, Any]] = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = cur["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        rows.append({
+            "case": name,
+            "baseline_s": base["median_s"],
+            "current_s": cur["median_s"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + tolerance,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="GCU pipeline micro-benchmarks")
+    ap.add_argument("-k", "--select", default=None, help="Only run cases whose name contains this")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.1, help="Seconds per repeat (loop calibration)")
+    ap.add_argument("--out", default=None, help="Write JSON results (baseline) here")
+    ap.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging (0.15 = 15%%)")
+    ap.add_argument("--list", action="store_true", help="List cases and exit")
+    args = ap.parse_args(argv)
+
+    if args.list:
+        for name, _ in CASES:
+            print(name)
+        return 0
+
+    report = run_suite(select=args.select, repeats=args.repeats, min_time=args.min_time)
+    for name, r in report["results"].items():
+        print(f"{name:<60} {r['median_s'] * 1e6:>12.2f} us/op", file=sys.stderr)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(report, baseline, args.tolerance)
+        regressions = [r for r in rows if r["regression"]]
+        for r in rows:
+            flag = "REGRESSION" if r["regression"] else ""
+            print(f"{r['case']:<60} x{r['ratio']:>6.2f} {flag}", file=sys.stderr)
+        print(json.dumps({"compared": len(rows), "regressions": regressions}, indent=2))
+        return 1 if regressions else 0
+
+    if not args.out:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
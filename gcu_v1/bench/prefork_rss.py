@@ -0,0 +1,179 @@
+﻿from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from gcu_v1.api.prefork import read_memory
+
+# Per-worker memory: pre-fork master vs. N independent server processes (Linux).
+#
+#   python -m gcu_v1.bench.prefork_rss --workers 4
+#   python -m gcu_v1.bench.prefork_rss --workers 8 --requests 200 --out rss.json
+#
+# PSS splits shared pages between the processes mapping them, so sum(PSS) is the real
+# footprint. Naive processes share little beyond libc/.so text; pre-forked workers share
+# the master's interpreter heap (imports, compiled bundles, config snapshot) until written.
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r", encoding="ascii") as f:
+            return [int(x) for x in f.read().split()]
+    except OSError:
+        return []
+
+
+def _wait_healthy(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} not healthy after {timeout}s")
+
+
+def _exercise(port: int, requests: int) -> None:
+    # Touch the request path so per-worker steady-state allocations are included
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5.0) as c:
+        for _ in range(requests):
+            c.get("/health")
+            c.get("/debug/config")
+
+
+def _env(cwd: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(PROJECT_ROOT), env.get("PYTHONPATH", "")) if p)
+    env.setdefault("NP_LOG_LEVEL", "WARNING")
+    env["NP_STATE_STORAGE"] = "sqlite"
+    env["NP_CONFIG_WATCH"] = "0"
+    return env
+
+
+def _summarize(mem: List[Dict[str, int]]) -> Dict[str, Any]:
+    n = max(1, len(mem))
+    return {
+        "processes": len(mem),
+        "total_pss_kb": sum(m["pss_kb"] for m in mem),
+        "mean_pss_kb": sum(m["pss_kb"] for m in mem) / n,
+        "mean_rss_kb": sum(m["rss_kb"] for m in mem) / n,
+        "mean_private_kb": sum(m["private_kb"] for m in mem) / n,
+        "mean_shared_kb": sum(m["shared_kb"] for m in mem) / n,
+    }
+
+
+def measure_prefork(workers: int, requests: int, timeout: float) -> Dict[str, Any]:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gcu_v1.api.prefork", "--workers", str(workers), "--port", str(port), "--no-watch"],
+            cwd=cwd, env=_env(cwd), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_healthy(port, timeout)
+            deadline = time.monotonic() + timeout
+            while len(_children(proc.pid)) < workers and time.monotonic() < deadline:
+                time.sleep(0.2)
+            _exercise(port, requests)
+            master = read_memory(proc.pid)
+            mem = [read_memory(pid) for pid in _children(proc.pid)]
+        finally:
+            proc.terminate()
+            proc.wait(timeout=60)
+    return {**_summarize(mem), "master": master}
+
+
+def measure_naive(workers: int, requests: int, timeout: float) -> Dict[str, Any]:
+    procs: List[subprocess.Popen] = []
+    ports = [_free_port() for _ in range(workers)]
+    code = "import sys, uvicorn; uvicorn.run('gcu_v1.api.server:app', port=int(sys.argv[1]), log_level='warning')"
+    with tempfile.TemporaryDirectory() as cwd:
+        try:
+            for port in ports:
+                procs.append(subprocess.Popen(
+                    [sys.executable, "-c", code, str(port)],
+                    cwd=cwd, env=_env(cwd), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                ))
+            for port in ports:
+                _wait_healthy(port, timeout)
+                _exercise(port, requests)
+            mem = [read_memory(p.pid) for p in procs]
+        finally:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.wait(timeout=60)
+    return _summarize(mem)
+
+
+def run_report(workers: int, requests: int = 50, timeout: float = 60.0) -> Dict[str, Any]:
+    prefork = measure_prefork(workers, requests, timeout)
+    naive = measure_naive(workers, requests, timeout)
+    saved = naive["mean_pss_kb"] - prefork["mean_pss_kb"]
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "workers": workers},
+        "prefork": prefork,
+        "naive": naive,
+        "saving_per_worker_kb": saved,
+        "saving_per_worker_pct": 100.0 * saved / naive["mean_pss_kb"] if naive["mean_pss_kb"] else 0.0,
+        # Master is paid once; break-even is where the per-worker saving covers it
+        "total_saving_kb": naive["total_pss_kb"] - prefork["total_pss_kb"] - prefork["master"]["pss_kb"],
+    }
+
+
+def format_report(r: Dict[str, Any]) -> str:
+    p, n = r["prefork"], r["naive"]
+    return "\n".join([
+        f"workers={r['meta']['workers']}  (kB, mean per worker)",
+        f"{'':10}{'PSS':>10}{'RSS':>10}{'private':>10}{'shared':>10}",
+        f"{'naive':10}{n['mean_pss_kb']:>10.0f}{n['mean_rss_kb']:>10.0f}{n['mean_private_kb']:>10.0f}{n['mean_shared_kb']:>10.0f}",
+        f"{'prefork':10}{p['mean_pss_kb']:>10.0f}{p['mean_rss_kb']:>10.0f}{p['mean_private_kb']:>10.0f}{p['mean_shared_kb']:>10.0f}",
+        f"prefork master PSS: {p['master']['pss_kb']} kB",
+        f"saving per worker: {r['saving_per_worker_kb']:.0f} kB ({r['saving_per_worker_pct']:.1f}%), "
+        f"total incl. master: {r['total_saving_kb']:.0f} kB",
+    ])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise SystemExit("Needs Linux /proc/<pid>/smaps_rollup")
+    ap = argparse.ArgumentParser(description="Per-worker memory: pre-fork vs. independent processes")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--requests", type=int, default=50, help="Requests per worker port before measuring")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--out", default=None, help="Write JSON report here (default: stdout)")
+    args = ap.parse_args(argv)
+
+    report = run_report(args.workers, requests=args.requests, timeout=args.timeout)
+    print(format_report(report), file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,449 @@
+﻿from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Runtime configuration snapshot.
+# Built once (startup) from env + manifest/policy files and swapped as a whole on
+# reload (SIGHUP or POST /admin/config/reload). The hot path only dereferences
+# current_config(); it never touches os.environ or the filesystem for config.
+# `version` is a content hash, stamped into every audit record as config_version.
+# Agent bundles (keywords, agent manifest/policy) and the optional shadow bundle are
+# compiled into the snapshot as well; ConfigWatcher reloads on file changes under
+# agents/, manifests/ and policies/. A reload that fails validation keeps the previous
+# snapshot.
+# Only explicit loads (server startup, reloads) are recorded in the governance trail; a
+# process that just calls current_config() (CLI, batch, daemon) builds its snapshot
+# silently, and runs for other manifest/policy files get a snapshot cached per file pair.
+
+DEFAULT_CAPABILITY = "np_document_triage"
+DEFAULT_THRESHOLD = 0.75
+DEFAULT_MANIFEST_PATH = "gcu_v1/agents/agent_01_doc_triage/manifest.json"
+DEFAULT_POLICY_PATH = "gcu_v1/policies/classification_policy.json"
+# Reloads go into a governance audit trail of their own (same format as the per-run
+# trails; readable at /debug/audit/_governance, indexed like review decisions)
+CONFIG_AUDIT_RUN_ID = "_governance"
+DEFAULT_EVENTS_PATH = f"gcu_v1/outputs/{CONFIG_AUDIT_RUN_ID}/governance_audit.jsonl"
+# Share of doc_triage runs also evaluated against the shadow bundle (when one is configured)
+DEFAULT_SHADOW_SAMPLE_RATE = 0.1
+WATCH_DIRS = ("gcu_v1/agents", "gcu_v1/manifests", "gcu_v1/policies")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    version: str
+    generation: int
+    loaded_at: str
+    capability: str
+    threshold: float
+    manifest_path: str
+    policy_path: str
+    # Parsed JSON, shared by all requests of this generation: treat as read-only
+    manifest: Optional[Dict[str, Any]] = field(repr=False, compare=False)
+    policy: Optional[Dict[str, Any]] = field(repr=False, compare=False)
+    manifest_error: Optional[str]
+    # capability -> validated bundle incl. compiled_signals
+    bundles: Dict[str, Dict[str, Any]] = field(repr=False, compare=False)
+    bundle_errors: Tuple[str, ...]
+    kill: bool
+    default_timeout_ms: float
+    max_timeout_ms: float
+    lease_ttl_s: float
+    lease_max_ttl_s: float
+    shadow_bundle_dir: str
+    # capability -> compiled shadow bundle from shadow_bundle_dir (loadable ones only)
+    shadow_bundles: Dict[str, Dict[str, Any]] = field(repr=False, compare=False)
+    shadow_sample_rate: float
+    trace_sample_rate: float
+    slow_request_ms: float
+    audit_index_enabled: bool
+    audit_index_max_pending: int
+    audit_index_batch: int
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "generation": self.generation,
+            "loaded_at": self.loaded_at,
+            "NP_CAPABILITY": self.capability,
+            "NP_CONFIDENCE_THRESHOLD": self.threshold,
+            "NP_MANIFEST_PATH": self.manifest_path,
+            "policy_path": self.policy_path,
+            "manifest_error": self.manifest_error,
+            "bundles": sorted(self.bundles),
+            "bundle_errors": list(self.bundle_errors),
+            "GCU_KILL": self.kill,
+            "NP_RUN_DEFAULT_TIMEOUT_MS": self.default_timeout_ms,
+            "NP_RUN_MAX_TIMEOUT_MS": self.max_timeout_ms,
+            "NP_REVIEW_LEASE_TTL_S": self.lease_ttl_s,
+            "NP_REVIEW_LEASE_MAX_TTL_S": self.lease_max_ttl_s,
+            "NP_SHADOW_BUNDLE_DIR": self.shadow_bundle_dir,
+            "shadow_bundles": sorted(self.shadow_bundles),
+            "NP_SHADOW_SAMPLE_RATE": self.shadow_sample_rate,
+            "NP_TRACE_SAMPLE_RATE": self.trace_sample_rate,
+            "NP_SLOW_REQUEST_MS": self.slow_request_ms,
+            "NP_AUDIT_INDEX": self.audit_index_enabled,
+            "NP_AUDIT_INDEX_MAX_PENDING": self.audit_index_max_pending,
+            "NP_AUDIT_INDEX_BATCH": self.audit_index_batch,
+        }
+
+
+class ConfigRejected(ValueError):
+    def __init__(self, errors: Sequence[str]) -> None:
+        super().__init__("; ".join(errors))
+        self.errors = list(errors)
+
+
+_lock = threading.Lock()
+_active: Optional[RuntimeConfig] = None
+_generation = 0
+# Version last written to the governance trail; implicit snapshots do not count
+_recorded_version: Optional[str] = None
+# (manifest_path, policy_path) -> (file stamp, snapshot) for config_for_paths
+_PATH_SNAPSHOTS: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], RuntimeConfig]] = {}
+_PATH_SNAPSHOTS_MAX = 16
+# Snapshot pinned for the current request, so a reload mid-run does not mix generations
+_BOUND: ContextVar[Optional[RuntimeConfig]] = ContextVar("gcu_config", default=None)
+
+
+def _env(key: str, default: str = "") -> str:
+    v = os.getenv(key, default)
+    return v.strip() if isinstance(v, str) else default
+
+
+def _env_float(key: str, default: float) -> float:
+    raw = _env(key, str(default))
+    try:
+        return float(raw)
+    except ValueError:
+        logger.warning("Invalid %s=%r; using %s", key, raw, default)
+        return default
+
+
+def _env_int(key: str, default: int) -> int:
+    raw = _env(key, str(default))
+    try:
+        return int(raw)
+    except ValueError:
+        logger.warning("Invalid %s=%r; using %s", key, raw, default)
+        return default
+
+
+def _abs(p: str) -> str:
+    p = p.replace("\\", "/").strip()
+    return p if os.path.isabs(p) else os.path.abspath(p).replace("\\", "/")
+
+
+def _load(path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    from gcu_v1.pipeline._utils import load_json_cached
+
+    if not os.path.exists(path):
+        return None, f"not found: {path}"
+    try:
+        return load_json_cached(Path(path)), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _load_bundles() -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    from gcu_v1.agents.loader import capabilities, compile_bundle, load_agent_bundle, validate_bundle
+
+    bundles: Dict[str, Dict[str, Any]] = {}
+    errors: List[str] = []
+    for cap in capabilities():
+        try:
+            bundle = load_agent_bundle(cap)
+        except Exception as e:
+            errors.append(f"{cap}: {type(e).__name__}: {e}")
+            continue
+        problems = validate_bundle(bundle)
+        if problems:
+            errors.extend(f"{cap}: {p}" for p in problems)
+            continue
+        bundles[cap] = compile_bundle(bundle)
+    return bundles, errors
+
+
+def _load_shadow_bundles(shadow_dir: str) -> Dict[str, Dict[str, Any]]:
+    from gcu_v1.agents.loader import capabilities, load_shadow_bundle
+
+    if not shadow_dir:
+        return {}
+    loaded = {cap: load_shadow_bundle(cap, shadow_dir) for cap in capabilities()}
+    return {cap: b for cap, b in loaded.items() if b is not None}
+
+
+def build_config(
+    *,
+    manifest_path: Optional[str] = None,
+    policy_path: Optional[str] = None,
+    generation: int = 0,
+) -> RuntimeConfig:
+    from gcu_v1.api.slowlog import DEFAULT_THRESHOLD_MS
+    from gcu_v1.persistence.audit_index import DEFAULT_BATCH as INDEX_BATCH, DEFAULT_MAX_PENDING as INDEX_MAX_PENDING
+
+    from gcu_v1.pipeline._utils import env_truthy
+    from gcu_v1.pipeline.tracing import DEFAULT_SAMPLE_RATE
+
+    mp = _abs(manifest_path or _env("NP_MANIFEST_PATH", DEFAULT_MANIFEST_PATH))
+    pp = _abs(policy_path or DEFAULT_POLICY_PATH)
+    manifest, manifest_error = _load(mp)
+    policy, _ = _load(pp)
+    bundles, bundle_errors = _load_bundles()
+    shadow_dir = _env("NP_SHADOW_BUNDLE_DIR")
+    shadow_bundles = _load_shadow_bundles(shadow_dir)
+
+    fields = {
+        "capability": _env("NP_CAPABILITY", DEFAULT_CAPABILITY),
+        "threshold": _env_float("NP_CONFIDENCE_THRESHOLD", DEFAULT_THRESHOLD),
+        "manifest_path": mp,
+        "policy_path": pp,
+        "manifest_error": manifest_error,
+        "bundle_errors": tuple(bundle_errors),
+        "kill": env_truthy("GCU_KILL"),
+        "default_timeout_ms": max(0.0, _env_float("NP_RUN_DEFAULT_TIMEOUT_MS", 0.0)),
+        "max_timeout_ms": max(0.0, _env_float("NP_RUN_MAX_TIMEOUT_MS", 0.0)),
+        "lease_ttl_s": max(1.0, _env_float("NP_REVIEW_LEASE_TTL_S", 900.0)),
+        "lease_max_ttl_s": max(1.0, _env_float("NP_REVIEW_LEASE_MAX_TTL_S", 3600.0)),
+        "shadow_bundle_dir": shadow_dir,
+        "shadow_sample_rate": min(1.0, max(0.0, _env_float("NP_SHADOW_SAMPLE_RATE", DEFAULT_SHADOW_SAMPLE_RATE))),
+        "trace_sample_rate": min(1.0, max(0.0, _env_float("NP_TRACE_SAMPLE_RATE", DEFAULT_SAMPLE_RATE))),
+        "slow_request_ms": max(0.0, _env_float("NP_SLOW_REQUEST_MS", DEFAULT_THRESHOLD_MS)),
+        "audit_index_enabled": env_truthy("NP_AUDIT_INDEX"),
+        "audit_index_max_pending": max(1, _env_int("NP_AUDIT_INDEX_MAX_PENDING", INDEX_MAX_PENDING)),
+        "audit_index_batch": max(1, _env_int("NP_AUDIT_INDEX_BATCH", INDEX_BATCH)),
+    }
+    digest = hashlib.sha256(
+        json.dumps(
+            {
+                **fields,
+                "manifest": manifest,
+                "policy": policy,
+                "bundles": {c: {k: b.get(k) for k in ("manifest", "policy", "keywords")} for c, b in bundles.items()},
+                "shadow_bundles": {c: b.get("keywords") for c, b in shadow_bundles.items()},
+            },
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    ).hexdigest()[:12]
+
+    return RuntimeConfig(
+        version=digest,
+        generation=generation,
+        loaded_at=datetime.now(timezone.utc).isoformat(),
+        manifest=manifest,
+        policy=policy,
+        bundles=bundles,
+        shadow_bundles=shadow_bundles,
+        **fields,
+    )
+
+
+def current_config() -> RuntimeConfig:
+    cfg = _BOUND.get() or _active
+    if cfg is None:
+        return _activate_implicit()
+    return cfg
+
+
+def _activate_implicit() -> RuntimeConfig:
+    # First use outside the server: no governance event, nothing was (re)loaded on purpose
+    global _active, _generation
+    with _lock:
+        if _active is None:
+            _active = build_config(generation=_generation + 1)
+            _generation += 1
+        return _active
+
+
+@contextmanager
+def bind_config(cfg: RuntimeConfig) -> Iterator[RuntimeConfig]:
+    token = _BOUND.set(cfg)
+    try:
+        yield cfg
+    finally:
+        _BOUND.reset(token)
+
+
+def _stamp(paths: Sequence[Any]) -> Tuple[Any, ...]:
+    out: List[Any] = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+def config_for_paths(manifest_path: Any, policy_path: Any) -> RuntimeConfig:
+    """
+    The bound/active snapshot if it was built for these files, else one cached per file
+    pair (CLI, batch and daemon runs). The cached one is rebuilt after a reload or when
+    the manifest, policy or an agent bundle file changes; it is never recorded as a
+    governance event.
+    """
+    from gcu_v1.agents.loader import bundle_files
+
+    mp, pp = _abs(str(manifest_path)), _abs(str(policy_path))
+    cfg = _BOUND.get() or _active
+    if cfg is not None and cfg.manifest_path == mp and cfg.policy_path == pp:
+        return cfg
+    stamp = (_generation, _stamp([mp, pp, *bundle_files()]))
+    hit = _PATH_SNAPSHOTS.get((mp, pp))
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    cfg = build_config(manifest_path=mp, policy_path=pp, generation=_generation)
+    if len(_PATH_SNAPSHOTS) >= _PATH_SNAPSHOTS_MAX:
+        _PATH_SNAPSHOTS.clear()
+    _PATH_SNAPSHOTS[(mp, pp)] = (stamp, cfg)
+    return cfg
+
+
+def _record_event(event: str, payload: Dict[str, Any], cfg: RuntimeConfig) -> None:
+    # Governance trail for config changes, stamped with the version active after the event;
+    # per-run audits reference config_version
+    from gcu_v1.api import auditlog
+
+    path = os.getenv("NP_CONFIG_EVENTS_PATH", DEFAULT_EVENTS_PATH).strip() or DEFAULT_EVENTS_PATH
+    rec = {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "run_id": CONFIG_AUDIT_RUN_ID,
+        "event": event,
+        "config_version": cfg.version,
+        "payload": payload,
+    }
+    try:
+        first = auditlog.append_lines(path, [json.dumps(rec, ensure_ascii=False) + "\n"])
+    except OSError:
+        logger.warning("Config event not recorded: %s", event, exc_info=True)
+        return
+    if cfg.audit_index_enabled:
+        # Written inline (reloads are rare): a pre-fork master must not start the index writer thread
+        from gcu_v1.persistence import audit_index
+
+        try:
+            conn = audit_index.connect()
+            try:
+                with conn:
+                    audit_index.index_docs(conn, audit_index.docs_from_governance(CONFIG_AUDIT_RUN_ID, first, [rec]))
+            finally:
+                conn.close()
+        except Exception:
+            logger.warning("Config event not indexed: %s; backfill will retry", event, exc_info=True)
+
+
+def reload_config(
+    reason: str = "manual",
+    changed: Sequence[str] = (),
+) -> Tuple[Optional[RuntimeConfig], RuntimeConfig]:
+    """
+    Builds a new snapshot and swaps it in; requests already running keep the old one.
+    Raises ConfigRejected (and keeps the old snapshot) if bundles fail validation.
+    """
+    global _active, _generation, _recorded_version
+    with _lock:
+        old = _active
+        new = build_config(generation=_generation + 1)
+        if old is not None and new.bundle_errors:
+            _record_event("GOV_CONFIG_RELOAD_REJECTED", {
+                "reason": reason,
+                "changed": list(changed),
+                "active_version": old.version,
+                "rejected_version": new.version,
+                "errors": list(new.bundle_errors),
+            }, old)
+            logger.error("Config reload rejected", extra={"reason": reason, "errors": list(new.bundle_errors)})
+            raise ConfigRejected(new.bundle_errors)
+        _generation += 1
+        _active = new
+        record = new.version != _recorded_version
+        _recorded_version = new.version
+    if record:
+        _record_event("GOV_CONFIG_RELOAD", {
+            "reason": reason,
+            "changed": list(changed),
+            "previous_version": old.version if old else None,
+            "version": new.version,
+            "generation": new.generation,
+            "bundle_errors": list(new.bundle_errors),
+        }, new)
+        logger.info(
+            "Config snapshot loaded",
+            extra={"config_version": new.version, "generation": new.generation, "reason": reason,
+                   "previous_version": old.version if old else None},
+        )
+    return old, new
+
+
+def _safe_reload(reason: str, changed: Sequence[str] = ()) -> None:
+    try:
+        reload_config(reason, changed)
+    except ConfigRejected:
+        pass  # already recorded; old snapshot stays active
+    except Exception:
+        logger.error("Config reload failed", exc_info=True)
+
+
+def install_sighup_handler() -> bool:
+    # Only possible from the main thread and on platforms with SIGHUP
+    if not hasattr(signal, "SIGHUP") or threading.current_thread() is not threading.main_thread():
+        return False
+    # Reload off the signal frame: the interrupted thread may hold _lock
+    signal.signal(
+        signal.SIGHUP,
+        lambda *_: threading.Thread(target=_safe_reload, args=("sighup",), daemon=True).start(),
+    )
+    return True
+
+
+class ConfigWatcher:
+    """
+    Background thread reloading the snapshot when JSON files under `dirs` change.
+    Uses watchfiles (inotify/FSEvents, or polling with NP_CONFIG_WATCH_POLL=1).
+    """
+
+    def __init__(self, dirs: Sequence[str] = WATCH_DIRS, debounce_ms: int = 500) -> None:
+        self.dirs = [d for d in dirs if os.path.isdir(d)]
+        self.debounce_ms = debounce_ms
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ConfigWatcher":
+        if self._thread is None and self.dirs:
+            self._thread = threading.Thread(target=self._run, name="gcu-config-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        from gcu_v1.pipeline._utils import env_truthy
+        from watchfiles import watch
+
+        for changes in watch(
+            *self.dirs,
+            watch_filter=lambda _change, path: path.endswith(".json"),
+            debounce=self.debounce_ms,
+            stop_event=self._stop,
+            force_polling=env_truthy("NP_CONFIG_WATCH_POLL") or None,
+            yield_on_timeout=False,
+        ):
+            changed = sorted({p.replace("\\", "/") for _, p in changes})
+            _safe_reload("watch", changed)
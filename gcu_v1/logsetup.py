@@ -0,0 +1,235 @@
+﻿from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Optional
+
+from prometheus_client import Counter
+
+# Logging for the API and workers.
+# Request threads only enqueue records (QueueHandler); formatting and handler I/O
+# run on a single QueueListener thread. The queue is bounded - when it is full,
+# records are dropped and counted instead of blocking the request.
+#
+#   NP_LOG_LEVEL=INFO                                   root level
+#   NP_LOG_LEVELS=gcu_v1.api.server=DEBUG,uvicorn=WARNING
+#   NP_LOG_FORMAT=json | text
+#   NP_LOG_DEBUG_SAMPLE_RATE=0.01                       share of DEBUG records kept
+#   NP_LOG_QUEUE_SIZE=10000
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_QUEUE_SIZE = 10_000
+DEFAULT_DEBUG_SAMPLE_RATE = 1.0
+
+LOG_RECORDS_DROPPED_TOTAL = Counter(
+    "gcu_log_records_dropped_total",
+    "Log records dropped before reaching a handler",
+    ["reason"],  # queue_full | sampled
+)
+
+# Attributes every LogRecord has; everything else came in via `extra=`
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class Lazy:
+    """Deferred `extra` value: computed by the formatter on the listener thread, not by the caller."""
+
+    __slots__ = ("_fn", "_args", "_kwargs")
+
+    def __init__(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        self._fn = fn
+        self._args = args
+        self._kwargs = kwargs
+
+    def resolve(self) -> Any:
+        try:
+            return self._fn(*self._args, **self._kwargs)
+        except Exception as e:  # a broken extra must not lose the record
+            return f"<unavailable: {type(e).__name__}>"
+
+    def __str__(self) -> str:
+        return str(self.resolve())
+
+
+def _resolve(v: Any) -> Any:
+    return v.resolve() if isinstance(v, Lazy) else v
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for k, v in vars(record).items():
+            if k not in _STD_ATTRS and not k.startswith("_"):
+                out[k] = _resolve(v)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            out["exc"] = record.exc_text
+        if record.stack_info:
+            out["stack"] = record.stack_info
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = {k: _resolve(v) for k, v in vars(record).items() if k not in _STD_ATTRS and not k.startswith("_")}
+        if extras:
+            line += " " + json.dumps(extras, ensure_ascii=False, default=str)
+        return line
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a share of DEBUG records; INFO and above always pass. Records carrying a
+    `sample_key` extra (e.g. a run id) are sampled per key, so a run's debug lines
+    are kept or dropped together.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+        self._n = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        key = getattr(record, "sample_key", None)
+        if key is not None:
+            keep = zlib.crc32(str(key).encode("utf-8")) / 2**32 < self.rate
+        else:
+            self._n += 1
+            keep = self.rate > 0.0 and (self._n % max(1, round(1.0 / self.rate))) == 0
+        if not keep:
+            LOG_RECORDS_DROPPED_TOTAL.labels(reason="sampled").inc()
+        return keep
+
+
+class _BoundedQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED_TOTAL.labels(reason="queue_full").inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but without formatting on the caller's thread:
+        # only the message is merged (args may not be picklable/stable) and the
+        # traceback is rendered; Lazy extras stay unresolved.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _StderrHandler(logging.StreamHandler):
+    # Resolves sys.stderr at emit time (test runners and uvicorn --reload swap it)
+    def __init__(self) -> None:
+        super().__init__()
+
+    @property
+    def stream(self) -> Any:  # type: ignore[override]
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value: Any) -> None:
+        pass
+
+
+def _parse_levels(raw: str) -> Dict[str, int]:
+    levels: Dict[str, int] = {}
+    for part in raw.split(","):
+        name, sep, level = part.partition("=")
+        if not sep:
+            continue
+        lv = logging.getLevelName(level.strip().upper())
+        if isinstance(lv, int):
+            levels[name.strip()] = lv
+    return levels
+
+
+def root_level() -> int:
+    return _parse_levels("=" + os.getenv("NP_LOG_LEVEL", DEFAULT_LEVEL)).get("", logging.INFO)
+
+
+def uvicorn_log_level() -> str:
+    """NP_LOG_LEVEL as a uvicorn log_level name, so its own loggers match the root level."""
+    name = logging.getLevelName(root_level()).lower()
+    return name if name in ("critical", "error", "warning", "info", "debug") else "debug"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+
+def configure_logging(handler: Optional[logging.Handler] = None) -> QueueListener:
+    """
+    Installs the queue pipeline on the root logger (idempotent) and (re)starts the
+    listener. `handler` replaces the default stderr handler, e.g. in tests.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        root = logging.getLogger()
+        root.setLevel(root_level())
+        for name, level in _parse_levels(os.getenv("NP_LOG_LEVELS", "")).items():
+            logging.getLogger(name).setLevel(level)
+
+        if _listener is not None:
+            if handler is None and getattr(_listener, "_thread", None) is not None:
+                return _listener
+            if getattr(_listener, "_thread", None) is not None:
+                _listener.stop()
+            root.removeHandler(_queue_handler)
+
+        if handler is None:
+            handler = _StderrHandler()
+            fmt = os.getenv("NP_LOG_FORMAT", "json").strip().lower()
+            handler.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+        size = int(_env_float("NP_LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max(1, size))
+        qh = _BoundedQueueHandler(q)
+        qh.addFilter(DebugSampler(_env_float("NP_LOG_DEBUG_SAMPLE_RATE", DEFAULT_DEBUG_SAMPLE_RATE)))
+        root.addHandler(qh)
+
+        _queue_handler = qh
+        _listener = QueueListener(q, handler, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging() -> None:
+    """Drains the queue and stops the listener thread; logging falls back to enqueue-only."""
+    with _lock:
+        if _listener is not None and getattr(_listener, "_thread", None) is not None:
+            _listener.stop()
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,407 @@
+﻿from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import lzma
+import os
+import sqlite3
+import sys
+import tarfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no guard against two concurrent jobs
+    fcntl = None
+
+# Cold tier for run artifacts. The compaction job packs outputs/<run_id>/ directories whose
+# newest file is older than N days into append-only segment files and deletes the originals:
+#
+#   python -m gcu_v1.persistence.archive --older-than-days 30
+#   python -m gcu_v1.persistence.archive --older-than-days 30 --dry-run
+#
+# Each run becomes one record: an xz-compressed tar of its files (member names
+# "<run_id>/<file>", so segments stay self-describing). archive_index.db maps
+# run_id -> (segment, offset, length, sha256, per-file sha256/size); a read is one seek plus
+# one decompress of a few KB. Originals are deleted only after the record was fsynced, read
+# back from the segment and every file's sha256 matched, and only if the run did not change
+# while it was being packed. Records that never made it into the index (crash mid-batch)
+# are cut off the open segment by the next job.
+#
+# Reads prefer the hot tier; a governance append to an archived run first restores its
+# governance_audit.jsonl, and the next job re-packs the run: the new record carries the
+# archived files that are not hot over from the old one, so the run stays complete.
+
+DEFAULT_DIR = "gcu_v1/outputs/_archive"
+DEFAULT_SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_PRESET = 6
+DEFAULT_BATCH = 200  # runs per fsync + index commit
+INDEX_NAME = "archive_index.db"
+# Derived files (rebuilt on demand) are deleted with the run but not archived
+_SKIP_SUFFIXES = (".idx",)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir() -> Path:
+    return Path(os.getenv("NP_ARCHIVE_DIR", DEFAULT_DIR).strip() or DEFAULT_DIR)
+
+
+def _connect(root: Path) -> sqlite3.Connection:
+    root.mkdir(parents=True, exist_ok=True)
+    c = sqlite3.connect(str(root / INDEX_NAME), timeout=30.0)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS archive_segment (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        bytes INTEGER NOT NULL DEFAULT 0,   -- end of the last indexed record
+        sealed INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    )
+    """)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS archived_run (
+        run_id TEXT PRIMARY KEY,
+        segment_id INTEGER NOT NULL REFERENCES archive_segment (id),
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,               -- of the compressed record
+        members TEXT NOT NULL,              -- {"audit.json": {"size": n, "sha256": "..."}, ...}
+        archived_at TEXT NOT NULL
+    )
+    """)
+    c.commit()
+    return c
+
+
+# ---- reads ----
+
+def _find(c: sqlite3.Connection, run_id: str) -> Optional[Tuple[str, int, int, str]]:
+    return c.execute(
+        "SELECT s.name, r.offset, r.length, r.sha256 FROM archived_run r "
+        "JOIN archive_segment s ON s.id = r.segment_id WHERE r.run_id = ?",
+        (run_id,),
+    ).fetchone()
+
+
+def _lookup(root: Path, run_id: str) -> Optional[Tuple[str, int, int, str]]:
+    path = root / INDEX_NAME
+    if not path.exists():
+        return None
+    # Read-only: lookups come from request paths and must not write to (or create) the index
+    c = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, timeout=30.0)
+    try:
+        return _find(c, run_id)
+    finally:
+        c.close()
+
+
+def _read_record(root: Path, segment: str, offset: int, length: int) -> bytes:
+    with open(root / segment, "rb") as f:
+        f.seek(offset)
+        blob = f.read(length)
+    if len(blob) != length:
+        raise ArchiveError(f"Short read from {segment} at {offset}")
+    return blob
+
+
+def _unpack_entries(blob: bytes) -> Dict[str, Tuple[bytes, int]]:
+    out: Dict[str, Tuple[bytes, int]] = {}
+    with tarfile.open(fileobj=io.BytesIO(lzma.decompress(blob)), mode="r:") as tar:
+        for m in tar.getmembers():
+            if m.isfile():
+                out[m.name.split("/", 1)[-1]] = (tar.extractfile(m).read(), int(m.mtime))
+    return out
+
+
+def _unpack(blob: bytes) -> Dict[str, bytes]:
+    return {name: data for name, (data, _) in _unpack_entries(blob).items()}
+
+
+def _read_checked(root: Path, hit: Tuple[str, int, int, str], run_id: str) -> bytes:
+    segment, offset, length, digest = hit
+    blob = _read_record(root, segment, offset, length)
+    if hashlib.sha256(blob).hexdigest() != digest:
+        raise ArchiveError(f"Checksum mismatch for run {run_id} in {segment}")
+    return blob
+
+
+def read_run(run_id: str, root: Optional[Path] = None) -> Optional[Dict[str, bytes]]:
+    """All archived files of a run (file name -> bytes), or None if it is not archived."""
+    root = root or archive_dir()
+    hit = _lookup(root, run_id)
+    if hit is None:
+        return None
+    return _unpack(_read_checked(root, hit, run_id))
+
+
+def read_member(run_id: str, name: str, root: Optional[Path] = None) -> Optional[bytes]:
+    files = read_run(run_id, root)
+    return None if files is None else files.get(name)
+
+
+def restore_member(run_id: str, name: str, dest: str, root: Optional[Path] = None) -> bool:
+    """Writes an archived file back to `dest` (hot tier) if the run has it; True if restored."""
+    data = read_member(run_id, name, root)
+    if data is None:
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + ".restore"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dest)
+    return True
+
+
+# ---- compaction ----
+
+@contextmanager
+def _job_lock(root: Path) -> Iterator[None]:
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "a+b") as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ArchiveError("Another archive job is running")
+        yield
+
+
+def _snapshot(run_dir: Path) -> Dict[str, Tuple[int, int]]:
+    return {
+        e.name: (e.stat().st_size, e.stat().st_mtime_ns)
+        for e in os.scandir(run_dir) if e.is_file()
+    }
+
+
+def _pack(
+    run_id: str, run_dir: Path, names: List[str], preset: int, carried: Optional[Dict[str, Tuple[bytes, int]]] = None
+) -> Tuple[bytes, Dict[str, Dict[str, Any]]]:
+    # carried: files of the run's previous record that are not hot (name -> (bytes, mtime))
+    entries = dict(carried or {})
+    for name in names:
+        entries[name] = ((run_dir / name).read_bytes(), int((run_dir / name).stat().st_mtime))
+    buf = io.BytesIO()
+    members: Dict[str, Dict[str, Any]] = {}
+    with tarfile.open(fileobj=buf, mode="w:", format=tarfile.PAX_FORMAT) as tar:
+        for name in sorted(entries):
+            data, mtime = entries[name]
+            info = tarfile.TarInfo(f"{run_id}/{name}")
+            info.size = len(data)
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(data))
+            members[name] = {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    return lzma.compress(buf.getvalue(), preset=preset), members
+
+
+def _open_segment(c: sqlite3.Connection, root: Path, max_bytes: int) -> Tuple[int, str, int]:
+    row = c.execute("SELECT id, name, bytes FROM archive_segment WHERE sealed = 0 ORDER BY id DESC LIMIT 1").fetchone()
+    if row is not None and row[2] < max_bytes:
+        seg_id, name, size = row
+        path = root / name
+        # Cut off anything after the last indexed record (crash between append and index)
+        if path.exists() and path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        return seg_id, name, size
+    with c:
+        if row is not None:
+            c.execute("UPDATE archive_segment SET sealed = 1 WHERE id = ?", (row[0],))
+        next_id = (c.execute("SELECT COALESCE(MAX(id), 0) FROM archive_segment").fetchone()[0]) + 1
+        name = f"segment-{next_id:06d}.tar.xz.seg"
+        c.execute(
+            "INSERT INTO archive_segment (id, name, bytes, created_at) VALUES (?, ?, 0, ?)",
+            (next_id, name, datetime.utcnow().isoformat()),
+        )
+    (root / name).touch()
+    return next_id, name, 0
+
+
+def candidates(outputs_dir: Path, older_than_days: float, now: Optional[float] = None) -> List[Path]:
+    """Run directories whose newest file is older than the cutoff (name order)."""
+    cutoff = (now if now is not None else time.time()) - older_than_days * 86400.0
+    out = []
+    for e in sorted(os.scandir(outputs_dir), key=lambda e: e.name):
+        if not e.is_dir() or e.name.startswith("_"):
+            continue
+        mtimes = [f.stat().st_mtime for f in os.scandir(e.path) if f.is_file()]
+        if mtimes and max(mtimes) < cutoff:
+            out.append(Path(e.path))
+    return out
+
+
+def compact(
+    outputs_dir: Path,
+    *,
+    older_than_days: float,
+    root: Optional[Path] = None,
+    segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+    preset: int = DEFAULT_PRESET,
+    batch: int = DEFAULT_BATCH,
+    max_runs: Optional[int] = None,
+    dry_run: bool = False,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    root = root or archive_dir()
+    report: Dict[str, Any] = {
+        "candidates": 0, "archived": 0, "changed": 0, "failed": 0,
+        "bytes_in": 0, "bytes_out": 0, "files_deleted": 0,
+    }
+    runs = candidates(outputs_dir, older_than_days, now)
+    if max_runs is not None:
+        runs = runs[:max_runs]
+    report["candidates"] = len(runs)
+    if dry_run or not runs:
+        return report
+
+    with _job_lock(root):
+        c = _connect(root)
+        try:
+            for i in range(0, len(runs), max(1, batch)):
+                _archive_batch(c, root, runs[i:i + max(1, batch)], segment_max_bytes, preset, report)
+        finally:
+            c.close()
+    return report
+
+
+def _verify(root: Path, segment: str, offset: int, blob: bytes, members: Dict[str, Dict[str, Any]]) -> None:
+    # What is on disk, not what is in memory
+    stored = _read_record(root, segment, offset, len(blob))
+    if hashlib.sha256(stored).hexdigest() != hashlib.sha256(blob).hexdigest():
+        raise ArchiveError("record checksum mismatch")
+    unpacked = _unpack(stored)
+    for name, meta in members.items():
+        if hashlib.sha256(unpacked.get(name, b"")).hexdigest() != meta["sha256"]:
+            raise ArchiveError(f"member checksum mismatch: {name}")
+
+
+def _archive_batch(
+    c: sqlite3.Connection, root: Path, runs: List[Path], segment_max_bytes: int, preset: int, report: Dict[str, Any]
+) -> None:
+    # One fsync and one index commit per batch; a segment rolls over between batches
+    seg_id, segment, end = _open_segment(c, root, segment_max_bytes)
+    packed = []
+    with open(root / segment, "ab") as f:
+        for run_dir in runs:
+            before = _snapshot(run_dir)
+            names = sorted(n for n in before if not n.endswith(_SKIP_SUFFIXES))
+            try:
+                carried = _carried_files(c, root, run_dir.name, names)
+            except (ArchiveError, OSError, lzma.LZMAError, tarfile.TarError) as e:
+                # Replacing the old record would lose what only it holds; leave the run hot
+                report["failed"] += 1
+                report.setdefault("errors", []).append({"run_id": run_dir.name, "error": str(e)})
+                continue
+            blob, members = _pack(run_dir.name, run_dir, names, preset, carried)
+            f.write(blob)
+            packed.append((run_dir, before, names, end, blob, members))
+            end += len(blob)
+        f.flush()
+        os.fsync(f.fileno())
+
+    verified = []
+    rows = []
+    now = datetime.utcnow().isoformat()
+    for run_dir, before, names, offset, blob, members in packed:
+        try:
+            _verify(root, segment, offset, blob, members)
+        except (ArchiveError, lzma.LZMAError, tarfile.TarError) as e:
+            # The record stays as dead bytes in the segment; nothing points to it
+            report["failed"] += 1
+            report.setdefault("errors", []).append({"run_id": run_dir.name, "error": str(e)})
+            continue
+        verified.append((run_dir, before, names))
+        rows.append((run_dir.name, seg_id, offset, len(blob), hashlib.sha256(blob).hexdigest(), json.dumps(members), now))
+        report["archived"] += 1
+        report["bytes_in"] += sum(m["size"] for m in members.values())
+        report["bytes_out"] += len(blob)
+
+    with c:
+        c.executemany(
+            "INSERT OR REPLACE INTO archived_run (run_id, segment_id, offset, length, sha256, members, archived_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        c.execute("UPDATE archive_segment SET bytes = ? WHERE id = ?", (end, seg_id))
+
+    for run_dir, before, names in verified:
+        _delete_originals(run_dir, before, names, report)
+
+
+def _carried_files(c: sqlite3.Connection, root: Path, run_id: str, names: List[str]) -> Dict[str, Tuple[bytes, int]]:
+    # A re-packed run (e.g. review after archiving) is partly hot: keep the rest of its old record
+    hit = _find(c, run_id)
+    if hit is None:
+        return {}
+    old = _unpack_entries(_read_checked(root, hit, run_id))
+    return {name: entry for name, entry in old.items() if name not in names}
+
+
+def _delete_originals(run_dir: Path, before: Dict[str, Tuple[int, int]], names: List[str], report: Dict[str, Any]) -> None:
+    from gcu_v1.api import auditlog
+
+    # Only if nothing was written since packing. The governance audit's append lock keeps a
+    # concurrent review from landing between this check and the delete; an append waiting on
+    # it finds the .idx gone once it gets the lock, retries on a new one and restores the
+    # trail from the record indexed above.
+    with auditlog._locked_index(str(run_dir / "governance_audit.jsonl")):
+        current = {n: v for n, v in _snapshot(run_dir).items() if not n.endswith(_SKIP_SUFFIXES)}
+        if current != {n: before[n] for n in names}:
+            report["changed"] += 1  # stays hot; the next job re-packs it
+            return
+        for name in names:
+            os.unlink(run_dir / name)
+            report["files_deleted"] += 1
+        for extra in os.listdir(run_dir):
+            if extra.endswith(_SKIP_SUFFIXES):
+                try:
+                    os.unlink(run_dir / extra)
+                except OSError:
+                    pass  # Windows: the lock holds it open
+    try:
+        os.rmdir(run_dir)
+    except OSError:
+        pass  # something new appeared; the run stays (partly) hot
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Pack old run directories into compressed archive segments")
+    ap.add_argument("--outputs", default="gcu_v1/outputs")
+    ap.add_argument("--archive-dir", default=None, help=f"Segments + index (default: NP_ARCHIVE_DIR or {DEFAULT_DIR})")
+    ap.add_argument("--older-than-days", type=float, default=float(os.getenv("NP_ARCHIVE_AFTER_DAYS", "30")))
+    ap.add_argument("--segment-max-mb", type=float, default=DEFAULT_SEGMENT_MAX_BYTES / (1024 * 1024))
+    ap.add_argument("--preset", type=int, default=DEFAULT_PRESET, help="xz preset 0-9")
+    ap.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="Runs per fsync / index commit")
+    ap.add_argument("--max-runs", type=int, default=None)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        report = compact(
+            Path(args.outputs),
+            older_than_days=args.older_than_days,
+            root=Path(args.archive_dir) if args.archive_dir else None,
+            segment_max_bytes=int(args.segment_max_mb * 1024 * 1024),
+            preset=args.preset,
+            batch=args.batch,
+            max_runs=args.max_runs,
+            dry_run=args.dry_run,
+        )
+    except ArchiveError as e:
+        raise SystemExit(str(e))
+    report["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    print(json.dumps(report), file=sys.stdout)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
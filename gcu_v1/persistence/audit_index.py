@@ -0,0 +1,469 @@
+﻿from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+
+# Optional full-text index over run audits (NP_AUDIT_INDEX=1, read into the config snapshot
+# with NP_AUDIT_INDEX_MAX_PENDING / NP_AUDIT_INDEX_BATCH) for compliance searches like
+# "runs where signal 'geldwäsche' fired last quarter". It lives in its own SQLite file so
+# index writes never contend with run_status.
+#
+#   audit_doc  one row per indexed record: a run's audit.json (kind=run) or a reviewer /
+#              admin decision from governance_audit.jsonl (kind=governance)
+#   audit_fts  contentless FTS5 over classification, signals, events, reasons, status, kind
+#
+# A doc's id (= FTS rowid) is derived from its timestamp, (ms << 10) + n, so rowid order is
+# time order: a time range is a rowid range and "newest first, LIMIT n" stops after n hits
+# while walking the doclists instead of sorting every match. Query cost follows the page
+# size, not the number of matches or of indexed runs.
+#
+# Live runs are indexed by a background writer (finalize_audit and governance appends only
+# enqueue); when its queue is full docs are dropped and counted, and the next backfill
+# picks them up:
+#   python -m gcu_v1.persistence.audit_index --outputs gcu_v1/outputs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 10_000
+DEFAULT_BATCH = 500
+# Governance records worth searching: human decisions with a reason, and config reloads
+GOVERNANCE_EVENTS = ("GOV_REVIEW_ACTION", "GOV_ADMIN_OVERRIDE", "GOV_CONFIG_RELOAD", "GOV_CONFIG_RELOAD_REJECTED")
+_REASON_EVENTS = ("policy_block", "approval_missing", "aborted", "runtime_error")
+_FTS_COLUMNS = ("classification", "signals", "events", "reasons", "status", "kind")
+
+AUDIT_INDEX_DOCS_TOTAL = Counter(
+    "gcu_audit_index_docs_total",
+    "Audit search index documents by outcome",
+    ["outcome"],  # indexed | duplicate | dropped | error
+)
+
+
+class SearchError(ValueError):
+    pass
+
+
+def enabled() -> bool:
+    from gcu_v1.config import current_config
+    return current_config().audit_index_enabled
+
+
+def index_db_path() -> Path:
+    raw = os.getenv("NP_AUDIT_INDEX_DB", "").strip()
+    if raw:
+        return Path(raw)
+    from gcu_v1.persistence import status_store
+    return status_store.DB_PATH.parent / "audit_index.db"
+
+
+def connect(path: Optional[Path] = None) -> sqlite3.Connection:
+    path = path or index_db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30.0)
+    init_index(conn)
+    return conn
+
+
+def init_index(c: sqlite3.Connection) -> None:
+    c.execute("PRAGMA journal_mode=WAL")  # searches do not block the writer
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS audit_doc (
+        id INTEGER PRIMARY KEY,        -- audit_fts rowid; (ts ms << 10) + n
+        run_id TEXT NOT NULL,
+        kind TEXT NOT NULL,            -- run | governance
+        seq INTEGER NOT NULL,          -- 0 for audit.json, record number in governance_audit.jsonl
+        ts TEXT NOT NULL,
+        status TEXT,
+        classification TEXT,
+        UNIQUE (run_id, kind, seq)
+    )
+    """)
+    c.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS audit_fts USING fts5("
+        + ", ".join(_FTS_COLUMNS)
+        + ", content='', tokenize='unicode61 remove_diacritics 2')"
+    )
+    c.execute("CREATE TABLE IF NOT EXISTS audit_index_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    c.commit()
+
+
+# ---- documents ----
+
+def _ts_ms(ts: Optional[str]) -> int:
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return int(time.time() * 1000)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _signal_text(entry: Any) -> str:
+    if isinstance(entry, dict):
+        return " ".join(str(entry[k]) for k in ("rule", "signal") if entry.get(k))
+    return str(entry)
+
+
+def docs_from_audit(audit: Dict[str, Any]) -> List[Dict[str, Any]]:
+    result = audit.get("result") or {}
+    events = [e for e in audit.get("events") or [] if isinstance(e, dict)]
+    return [{
+        "run_id": audit.get("run_id"),
+        "kind": "run",
+        "seq": 0,
+        "ts": audit.get("timestamp") or "",
+        "status": audit.get("status"),
+        "classification": result.get("classification"),
+        "signals": " ".join(_signal_text(e) for e in result.get("explainability") or []),
+        "events": " ".join(f"{e.get('type', '')} {e.get('detail', '')}" for e in events),
+        "reasons": " ".join(
+            [str(e.get("detail", "")) for e in events if e.get("type") in _REASON_EVENTS]
+            + list((result.get("metadata") or {}).get("flags") or [])
+        ),
+    }]
+
+
+def docs_from_governance(run_id: str, first_seq: int, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    docs = []
+    for seq, rec in enumerate(records, start=first_seq):
+        if rec.get("event") not in GOVERNANCE_EVENTS:
+            continue
+        p = rec.get("payload") or {}
+        docs.append({
+            "run_id": run_id,
+            "kind": "governance",
+            "seq": seq,
+            "ts": rec.get("ts") or "",
+            "status": p.get("new_status") or p.get("status"),
+            "classification": None,
+            "signals": "",
+            "events": " ".join(str(x) for x in (rec.get("event"), p.get("action"), p.get("target_status"),
+                                                  p.get("actor"), p.get("role")) if x),
+            "reasons": str(p.get("reason") or ""),
+        })
+    return docs
+
+
+def index_docs(c: sqlite3.Connection, docs: List[Dict[str, Any]]) -> int:
+    """Adds docs not indexed yet (by run_id, kind, seq); caller commits. Returns the number added."""
+    added = duplicates = 0
+    # Next free id per millisecond bucket: one MAX(id) per bucket and batch, not per doc
+    next_id: Dict[int, int] = {}
+    for d in docs:
+        if not d.get("run_id"):
+            continue
+        base = _ts_ms(d["ts"]) << 10
+        doc_id = next_id.get(base)
+        if doc_id is None:
+            # Up to 1024 docs per millisecond keep exact time order; beyond that they spill into the next ms
+            top = c.execute("SELECT MAX(id) FROM audit_doc WHERE id >= ? AND id < ?", (base, base + 1024)).fetchone()[0]
+            doc_id = base if top is None else top + 1
+        while True:
+            try:
+                cur = c.execute(
+                    "INSERT INTO audit_doc (id, run_id, kind, seq, ts, status, classification) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (run_id, kind, seq) DO NOTHING",
+                    (doc_id, d["run_id"], d["kind"], d["seq"], d["ts"], d.get("status"), d.get("classification")),
+                )
+                break
+            except sqlite3.IntegrityError:
+                doc_id += 1  # id taken by a doc that spilled over from an earlier millisecond
+        if cur.rowcount != 1:
+            next_id[base] = doc_id
+            duplicates += 1
+            continue
+        next_id[base] = doc_id + 1
+        c.execute(
+            "INSERT INTO audit_fts (rowid, " + ", ".join(_FTS_COLUMNS) + ") VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc_id, *(str(d.get(col) or "") for col in _FTS_COLUMNS)),
+        )
+        added += 1
+    AUDIT_INDEX_DOCS_TOTAL.labels(outcome="indexed").inc(added)
+    if duplicates:
+        AUDIT_INDEX_DOCS_TOTAL.labels(outcome="duplicate").inc(duplicates)
+    return added
+
+
+# ---- background writer ----
+
+_STOP = object()
+
+
+class _Indexer:
+    def __init__(self, max_pending: int, batch: int) -> None:
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_pending))
+        self._batch = max(1, batch)
+        self._thread = threading.Thread(target=self._run, name="gcu-audit-index", daemon=True)
+        self._thread.start()
+
+    def submit(self, docs: List[Dict[str, Any]]) -> bool:
+        try:
+            self._q.put_nowait(docs)
+            return True
+        except queue.Full:
+            AUDIT_INDEX_DOCS_TOTAL.labels(outcome="dropped").inc(len(docs))
+            return False
+
+    def _run(self) -> None:
+        while True:
+            items = [self._q.get()]
+            while len(items) < self._batch:
+                try:
+                    items.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(it is _STOP for it in items)
+            docs = [d for it in items if it is not _STOP for d in it]
+            try:
+                if docs:
+                    conn = connect()
+                    try:
+                        with conn:
+                            index_docs(conn, docs)
+                    finally:
+                        conn.close()
+            except Exception:
+                AUDIT_INDEX_DOCS_TOTAL.labels(outcome="error").inc(len(docs))
+                logger.warning("Audit index write failed (%d docs); backfill will retry", len(docs), exc_info=True)
+            finally:
+                for _ in items:
+                    self._q.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        self._q.join()
+
+    def stop(self, wait: bool) -> None:
+        self._q.put(_STOP)
+        if wait:
+            self._thread.join(timeout=30.0)
+
+
+_indexer: Optional[_Indexer] = None
+_init_lock = threading.Lock()
+
+
+def _writer() -> _Indexer:
+    global _indexer
+    if _indexer is None:
+        from gcu_v1.config import current_config
+
+        with _init_lock:
+            if _indexer is None:
+                # Started on first use, so a pre-fork master never owns the thread
+                cfg = current_config()
+                _indexer = _Indexer(cfg.audit_index_max_pending, cfg.audit_index_batch)
+    return _indexer
+
+
+def submit_audit(audit: Dict[str, Any]) -> bool:
+    """Queues a run's audit for indexing; never blocks the run."""
+    return _writer().submit(docs_from_audit(audit))
+
+
+def submit_governance(run_id: str, first_seq: int, records: List[Dict[str, Any]]) -> bool:
+    docs = docs_from_governance(run_id, first_seq, records)
+    return _writer().submit(docs) if docs else True
+
+
+def flush() -> None:
+    if _indexer is not None:
+        _indexer.flush()
+
+
+def shutdown_audit_index(wait: bool = True) -> None:
+    global _indexer
+    with _init_lock:
+        if _indexer is not None:
+            _indexer.stop(wait)
+        _indexer = None
+
+
+# ---- search ----
+
+def _phrase(column: str, value: str) -> str:
+    return f'{column} : "' + value.replace('"', '""') + '"'
+
+
+def search(
+    q: Optional[str] = None,
+    *,
+    signal: Optional[str] = None,
+    reason: Optional[str] = None,
+    event: Optional[str] = None,
+    classification: Optional[str] = None,
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    conn: Optional[sqlite3.Connection] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Newest-first hits. `q` is an FTS5 query (e.g. 'signals:geldwäsche AND NOT status:ok');
+    the other filters are ANDed as column phrases. Returns (items, next before_id).
+    """
+    terms = [f"({q})"] if q and q.strip() else []
+    for column, value in (("signals", signal), ("reasons", reason), ("events", event),
+                          ("classification", classification), ("status", status), ("kind", kind)):
+        if value:
+            terms.append(_phrase(column, value))
+    lo = _ts_ms(since) << 10 if since else 0
+    hi = (_ts_ms(until) + 1) << 10 if until else (1 << 62)
+    if before_id is not None:
+        hi = min(hi, before_id)
+
+    own = conn is None
+    conn = conn or connect()
+    try:
+        if terms:
+            sql = (
+                "SELECT id, run_id, kind, seq, ts, status, classification FROM audit_doc WHERE id IN ("
+                "SELECT rowid FROM audit_fts WHERE audit_fts MATCH ? AND rowid >= ? AND rowid < ? "
+                "ORDER BY rowid DESC LIMIT ?) ORDER BY id DESC"
+            )
+            params: List[Any] = [" AND ".join(terms), lo, hi, limit + 1]
+        else:
+            sql = (
+                "SELECT id, run_id, kind, seq, ts, status, classification FROM audit_doc "
+                "WHERE id >= ? AND id < ? ORDER BY id DESC LIMIT ?"
+            )
+            params = [lo, hi, limit + 1]
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise SearchError(f"Invalid search query: {e}")
+    finally:
+        if own:
+            conn.close()
+    items = [
+        {"id": r[0], "run_id": r[1], "kind": r[2], "seq": r[3], "ts": r[4], "status": r[5], "classification": r[6]}
+        for r in rows[:limit]
+    ]
+    return items, (items[-1]["id"] if len(rows) > limit else None)
+
+
+# ---- backfill (incremental, resumable) ----
+
+def _get_state(c: sqlite3.Connection, name: str) -> Optional[str]:
+    row = c.execute("SELECT value FROM audit_index_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_state(c: sqlite3.Connection, name: str, value: Optional[str]) -> None:
+    if value is None:
+        c.execute("DELETE FROM audit_index_state WHERE name = ?", (name,))
+    else:
+        c.execute("INSERT OR REPLACE INTO audit_index_state (name, value) VALUES (?, ?)", (name, value))
+
+
+def _run_docs(run_dir: Path, since: float) -> List[Dict[str, Any]]:
+    from gcu_v1.api import auditlog
+
+    docs: List[Dict[str, Any]] = []
+    audit_path = run_dir / "audit.json"
+    try:
+        if audit_path.stat().st_mtime >= since:
+            docs += docs_from_audit(json.loads(audit_path.read_text(encoding="utf-8-sig")))
+    except (OSError, ValueError):
+        pass
+    gov_path = run_dir / "governance_audit.jsonl"
+    try:
+        if gov_path.stat().st_mtime >= since:
+            # From the start: decisions dropped from the live queue may precede indexed ones
+            records = []
+            for line in auditlog.iter_lines(str(gov_path)):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    records.append({})
+            docs += docs_from_governance(run_dir.name, 0, records)
+    except OSError:
+        pass
+    return docs
+
+
+def backfill(outputs_dir: Path, *, full: bool = False, batch: int = 1000, conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """
+    Indexes run directories under outputs_dir in name order, committing every `batch` runs
+    together with a checkpoint, so an interrupted pass resumes where it stopped. Runs whose
+    files did not change since the last completed pass are skipped by mtime; full=True
+    re-reads everything (already indexed docs are still not duplicated).
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        started = _get_state(conn, "pass_started")
+        cursor = _get_state(conn, "pass_cursor")
+        since = 0.0 if full else float(_get_state(conn, "completed_since") or 0.0)
+        if started is None or full:
+            started, cursor = str(time.time()), None
+            _set_state(conn, "pass_started", started)
+            _set_state(conn, "pass_cursor", None)
+            conn.commit()
+
+        from gcu_v1.config import CONFIG_AUDIT_RUN_ID
+
+        # Run directories plus the config reload trail; other _* dirs are not runs
+        names = sorted(
+            e.name for e in os.scandir(outputs_dir)
+            if e.is_dir() and (not e.name.startswith("_") or e.name == CONFIG_AUDIT_RUN_ID)
+        )
+        if cursor is not None:
+            names = [n for n in names if n > cursor]
+        runs = added = 0
+        for i in range(0, len(names), batch):
+            chunk = names[i:i + batch]
+            with conn:
+                for name in chunk:
+                    docs = _run_docs(outputs_dir / name, since)
+                    if docs:
+                        added += index_docs(conn, docs)
+                _set_state(conn, "pass_cursor", chunk[-1])
+            runs += len(chunk)
+        with conn:
+            _set_state(conn, "completed_since", started)
+            _set_state(conn, "pass_started", None)
+            _set_state(conn, "pass_cursor", None)
+    finally:
+        if own:
+            conn.close()
+    return {"runs_scanned": runs, "docs_added": added, "resumed_after": cursor}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build or update the audit full-text index from run outputs")
+    ap.add_argument("--outputs", default="gcu_v1/outputs")
+    ap.add_argument("--db", default=None, help="Index file (default: NP_AUDIT_INDEX_DB or next to the status DB)")
+    ap.add_argument("--full", action="store_true", help="Re-read every run, not just changed ones")
+    ap.add_argument("--batch", type=int, default=1000, help="Runs per transaction / checkpoint")
+    args = ap.parse_args(argv)
+
+    conn = connect(Path(args.db) if args.db else None)
+    try:
+        t0 = time.perf_counter()
+        result = backfill(Path(args.outputs), full=args.full, batch=args.batch, conn=conn)
+    finally:
+        conn.close()
+    result["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    print(json.dumps(result), file=sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
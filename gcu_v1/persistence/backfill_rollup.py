@@ -0,0 +1,38 @@
+﻿from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from gcu_v1.persistence import status_store
+
+# Rebuilds run_status_rollup (the /stats source) from run_status.
+#
+#   python -m gcu_v1.persistence.backfill_rollup
+#   python -m gcu_v1.persistence.backfill_rollup --db gcu_v1/state/gcu_state.db
+#
+# Needed once for DBs that had run_status rows before the rollup existed; afterwards the
+# triggers keep it current. Safe to re-run: it recomputes from scratch in one transaction.
+# Writers block for the duration of the scan, so run it off-peak on large tables.
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Rebuild run_status_rollup from run_status")
+    ap.add_argument("--db", default=None, help=f"SQLite file (default: {status_store.DB_PATH})")
+    args = ap.parse_args(argv)
+
+    if args.db:
+        status_store.DB_PATH = Path(args.db)
+    status_store.init_db()
+    t0 = time.perf_counter()
+    result = status_store.rebuild_status_rollup()
+    result["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    print(json.dumps(result), file=sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
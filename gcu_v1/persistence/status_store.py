@@ -1,14 +1,88 @@
 ﻿import os
+import json
+import time
+import logging
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from gcu_v1.status_machine import ReviewLeaseStore, StateMachineStorage, StatusStateMachine
+
+logger = logging.getLogger(__name__)
 
 # DB lives inside repo, deterministic & portable
 DB_PATH = Path("gcu_v1/state/gcu_state.db")
 
+# Connection of the enclosing transaction() on this thread/task, if any
+_TX: ContextVar[Optional[sqlite3.Connection]] = ContextVar("gcu_status_tx", default=None)
+# Callbacks deferred until that transaction commits (dropped on rollback)
+_AFTER_COMMIT: ContextVar[Optional[List[Callable[[], None]]]] = ContextVar("gcu_status_after_commit", default=None)
+
+
+class _Joined:
+    # `with get_conn() as c` inside transaction(): same connection, commit deferred to the outer block
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self._conn
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+
 def get_conn():
+    tx = _TX.get()
+    if tx is not None:
+        return _Joined(tx)
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     return sqlite3.connect(str(DB_PATH))
 
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    All status_store calls inside the block share one connection and commit (or roll
+    back) together. BEGIN IMMEDIATE takes the write lock up front, so a read-then-write
+    batch cannot fail on lock upgrade.
+    """
+    if _TX.get() is not None:
+        raise RuntimeError("status_store.transaction() is not reentrant")
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(DB_PATH))
+    callbacks: List[Callable[[], None]] = []
+    token = _TX.set(conn)
+    cb_token = _AFTER_COMMIT.set(callbacks)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _AFTER_COMMIT.reset(cb_token)
+        _TX.reset(token)
+        conn.close()
+    for fn in callbacks:
+        fn()
+
+
+def after_commit(fn: Callable[[], None]) -> None:
+    """Runs fn once the enclosing transaction() commits, or right away outside one."""
+    callbacks = _AFTER_COMMIT.get()
+    if callbacks is None:
+        fn()
+    else:
+        callbacks.append(fn)
+
 def init_db():
     with get_conn() as c:
         c.execute("""
@@ -21,18 +95,116 @@ def init_db():
             updated_at TEXT NOT NULL
         )
         """)
+        # Added after v1.0; older DBs are migrated in place (NULL for existing rows)
+        cols = {r[1] for r in c.execute("PRAGMA table_info(run_status)")}
+        if "capability" not in cols:
+            c.execute("ALTER TABLE run_status ADD COLUMN capability TEXT")
+        if "confidence" not in cols:
+            c.execute("ALTER TABLE run_status ADD COLUMN confidence REAL")
+        # Review queue: equality on status (+ capability), range/order on (updated_at, run_id);
+        # confidence last so band filters are checked in the index, not per table row
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_run_status_queue "
+            "ON run_status (status, updated_at, run_id, confidence)"
+        )
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_run_status_queue_cap "
+            "ON run_status (status, capability, updated_at, run_id, confidence)"
+        )
+        # Serialized state machines (SQLiteMachineStorage); shared by all worker processes
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS state_machine (
+            request_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """)
+        # Reviewer leases; expires_at is unix time. Expired rows are ignored, then reaped.
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS review_lease (
+            run_id TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            claimed_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_review_lease_expires ON review_lease (expires_at)")
+        _init_rollup(c)
 
-from datetime import datetime
 
-def load_run_state(run_id: str):
+# run_status_rollup is `GROUP BY hour(updated_at), capability, status, hitl_required` over
+# run_status, kept current by triggers: every writer (persist_run_state, update_run_statuses,
+# plain SQL) moves its row between buckets inside its own transaction.
+_ROLLUP_KEY = "hour = substr({r}.updated_at, 1, 13) AND capability = COALESCE({r}.capability, '') " \
+    "AND status = {r}.status AND hitl_required = {r}.hitl_required"
+_ROLLUP_ADD = (
+    "INSERT INTO run_status_rollup (hour, capability, status, hitl_required, n) "
+    "VALUES (substr(NEW.updated_at, 1, 13), COALESCE(NEW.capability, ''), NEW.status, NEW.hitl_required, 1) "
+    "ON CONFLICT(hour, capability, status, hitl_required) DO UPDATE SET n = n + 1;"
+)
+_ROLLUP_SUB = (
+    "UPDATE run_status_rollup SET n = n - 1 WHERE " + _ROLLUP_KEY.format(r="OLD") + ";"
+    "DELETE FROM run_status_rollup WHERE n <= 0 AND " + _ROLLUP_KEY.format(r="OLD") + ";"
+)
+
+
+def _init_rollup(c: sqlite3.Connection) -> None:
+    created = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run_status_rollup'"
+    ).fetchone() is None
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS run_status_rollup (
+        hour TEXT NOT NULL,              -- 'YYYY-MM-DDTHH' of run_status.updated_at (UTC)
+        capability TEXT NOT NULL,        -- '' where run_status.capability is NULL
+        status TEXT NOT NULL,
+        hitl_required INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (hour, capability, status, hitl_required)
+    ) WITHOUT ROWID
+    """)
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_run_status_rollup_ins AFTER INSERT ON run_status BEGIN {_ROLLUP_ADD} END")
+    c.execute(
+        "CREATE TRIGGER IF NOT EXISTS trg_run_status_rollup_upd "
+        "AFTER UPDATE OF status, hitl_required, capability, updated_at ON run_status "
+        "WHEN substr(OLD.updated_at, 1, 13) IS NOT substr(NEW.updated_at, 1, 13) "
+        "OR OLD.status IS NOT NEW.status OR OLD.hitl_required IS NOT NEW.hitl_required "
+        "OR COALESCE(OLD.capability, '') IS NOT COALESCE(NEW.capability, '') "
+        f"BEGIN {_ROLLUP_SUB} {_ROLLUP_ADD} END"
+    )
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_run_status_rollup_del AFTER DELETE ON run_status BEGIN {_ROLLUP_SUB} END")
+    if created and c.execute("SELECT 1 FROM run_status LIMIT 1").fetchone() is not None:
+        logger.warning(
+            "run_status_rollup created on a non-empty run_status; /stats is incomplete until "
+            "`python -m gcu_v1.persistence.backfill_rollup` has run"
+        )
+
+
+def rebuild_status_rollup() -> Dict[str, int]:
+    """
+    Recomputes run_status_rollup from run_status in one transaction (one full scan;
+    writers wait for it, so no trigger update can be lost or counted twice).
+    """
+    with transaction() as c:
+        c.execute("DELETE FROM run_status_rollup")
+        c.execute(
+            "INSERT INTO run_status_rollup (hour, capability, status, hitl_required, n) "
+            "SELECT substr(updated_at, 1, 13), COALESCE(capability, ''), status, hitl_required, COUNT(*) "
+            "FROM run_status GROUP BY 1, 2, 3, 4"
+        )
+        buckets, runs = c.execute("SELECT COUNT(*), COALESCE(SUM(n), 0) FROM run_status_rollup").fetchone()
+    return {"buckets": buckets, "runs": runs}
+
+def enable_wal():
+    # Readers do not block the writer; persistent in the DB file (multi-worker serve)
     with get_conn() as c:
-        row = c.execute(
-            "SELECT status, hitl_required, approval_required, approval_provided, updated_at "
-            "FROM run_status WHERE run_id = ?",
-            (run_id,)
-        ).fetchone()
-    if not row:
-        return None
+        return c.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+
+from datetime import datetime
+
+_RUN_STATE_COLS = "status, hitl_required, approval_required, approval_provided, updated_at"
+
+
+def _run_state(run_id: str, row: Tuple[Any, ...]) -> Dict[str, Any]:
     return {
         "run_id": run_id,
         "status": row[0],
@@ -42,29 +214,442 @@ def load_run_state(run_id: str):
         "updated_at": row[4],
     }
 
+
+def load_run_state(run_id: str):
+    with get_conn() as c:
+        row = c.execute(
+            f"SELECT {_RUN_STATE_COLS} FROM run_status WHERE run_id = ?",
+            (run_id,)
+        ).fetchone()
+    if not row:
+        return None
+    return _run_state(run_id, row)
+
+
+class RunStateCache:
+    """
+    Read-through LRU for load_run_states (run_id -> state dict, or None for unknown ids).
+    Writes in this process invalidate their run_ids; the TTL bounds how long a change
+    made by another worker process can stay invisible.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_s: float = 2.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a read that overlapped one does not fill the cache
+        self.generation = 0
+
+    def get_many(self, run_ids: List[str]) -> Tuple[Dict[str, Optional[Dict[str, Any]]], List[str]]:
+        hits: Dict[str, Optional[Dict[str, Any]]] = {}
+        misses: List[str] = []
+        now = time.monotonic()
+        with self._lock:
+            for run_id in run_ids:
+                entry = self._data.get(run_id)
+                if entry is None or entry[0] <= now:
+                    misses.append(run_id)
+                    continue
+                self._data.move_to_end(run_id)
+                hits[run_id] = entry[1]
+        return hits, misses
+
+    def put_many(self, states: Dict[str, Optional[Dict[str, Any]]], generation: int) -> None:
+        if self.max_entries <= 0:
+            return
+        expires = time.monotonic() + self.ttl_s
+        with self._lock:
+            if generation != self.generation:
+                return
+            for run_id, state in states.items():
+                self._data[run_id] = (expires, state)
+                self._data.move_to_end(run_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, run_ids: List[str]) -> None:
+        with self._lock:
+            self.generation += 1
+            for run_id in run_ids:
+                self._data.pop(run_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+
+def _env_num(key: str, default: float) -> float:
+    try:
+        return float(os.getenv(key, str(default)).strip())
+    except ValueError:
+        return default
+
+
+RUN_STATE_CACHE = RunStateCache(
+    max_entries=int(_env_num("NP_STATUS_CACHE_SIZE", 10_000)),
+    ttl_s=_env_num("NP_STATUS_CACHE_TTL_S", 2.0),
+)
+
+# Stays well below SQLITE_MAX_VARIABLE_NUMBER on old builds (999)
+_IN_CHUNK = 500
+
+
+def _invalidate_run_states(run_ids: List[str]) -> None:
+    # Now, so readers stop serving the old value, and again after commit, so a read of the
+    # still-committed old row that ran during the transaction is not left in the cache
+    RUN_STATE_CACHE.invalidate(run_ids)
+    after_commit(lambda: RUN_STATE_CACHE.invalidate(run_ids))
+
+
+def load_run_states(run_ids: List[str], use_cache: bool = True) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    run_id -> load_run_state() result (None if unknown) for many ids, with one
+    `WHERE run_id IN (...)` query per 500 cache misses.
+    """
+    wanted = list(dict.fromkeys(run_ids))
+    if use_cache:
+        found, misses = RUN_STATE_CACHE.get_many(wanted)
+    else:
+        found, misses = {}, wanted
+    if misses:
+        generation = RUN_STATE_CACHE.generation
+        loaded: Dict[str, Optional[Dict[str, Any]]] = dict.fromkeys(misses)
+        with get_conn() as c:
+            for i in range(0, len(misses), _IN_CHUNK):
+                chunk = misses[i:i + _IN_CHUNK]
+                rows = c.execute(
+                    f"SELECT run_id, {_RUN_STATE_COLS} FROM run_status "
+                    f"WHERE run_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    loaded[row[0]] = _run_state(row[0], row[1:])
+        if use_cache:
+            RUN_STATE_CACHE.put_many(loaded, generation)
+        found.update(loaded)
+    return {run_id: found[run_id] for run_id in wanted}
+
 def persist_run_state(
     run_id: str,
     status: str,
     hitl_required: bool,
     approval_required: bool,
-    approval_provided: bool
+    approval_provided: bool,
+    capability: Optional[str] = None,
+    confidence: Optional[float] = None,
 ):
+    # capability/confidence are set by /run; later updates (review, override) keep them
     with get_conn() as c:
         c.execute(
-            "INSERT INTO run_status (run_id, status, hitl_required, approval_required, approval_provided, updated_at) "
-            "VALUES (?, ?, ?, ?, ?, ?) "
+            "INSERT INTO run_status (run_id, status, hitl_required, approval_required, approval_provided, "
+            "updated_at, capability, confidence) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
             "ON CONFLICT(run_id) DO UPDATE SET "
             "status=excluded.status, "
             "hitl_required=excluded.hitl_required, "
             "approval_required=excluded.approval_required, "
             "approval_provided=excluded.approval_provided, "
-            "updated_at=excluded.updated_at",
+            "updated_at=excluded.updated_at, "
+            "capability=COALESCE(excluded.capability, run_status.capability), "
+            "confidence=COALESCE(excluded.confidence, run_status.confidence)",
             (
                 run_id,
                 status,
                 int(hitl_required),
                 int(approval_required),
                 int(approval_provided),
-                datetime.utcnow().isoformat()
+                datetime.utcnow().isoformat(),
+                capability,
+                confidence,
             )
         )
+    _invalidate_run_states([run_id])
+
+
+def update_run_statuses(updates: List[Tuple[str, str, Optional[bool]]]) -> None:
+    """
+    Bulk status change: [(run_id, status, approval_provided or None to keep)].
+    Missing rows get the same defaults as single /review (hitl + approval required).
+    """
+    now = datetime.utcnow().isoformat()
+    with get_conn() as c:
+        c.executemany(
+            "INSERT OR IGNORE INTO run_status (run_id, status, hitl_required, approval_required, "
+            "approval_provided, updated_at) VALUES (?, ?, 1, 1, 0, ?)",
+            [(run_id, status, now) for run_id, status, _ in updates],
+        )
+        c.executemany(
+            "UPDATE run_status SET status = ?, approval_provided = COALESCE(?, approval_provided), "
+            "updated_at = ? WHERE run_id = ?",
+            [(status, None if ap is None else int(ap), now, run_id) for run_id, status, ap in updates],
+        )
+    _invalidate_run_states([run_id for run_id, _, _ in updates])
+
+
+def review_queue_sql(
+    status: str = "needs_review",
+    *,
+    capability: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    updated_before: Optional[str] = None,
+    updated_after: Optional[str] = None,
+    after: Optional[Tuple[str, str]] = None,
+    unleased_at: Optional[float] = None,
+    limit: int = 50,
+) -> Tuple[str, List[Any]]:
+    where = ["status = ?"]
+    params: List[Any] = [status]
+    if capability is not None:
+        where.append("capability = ?")
+        params.append(capability)
+    if unleased_at is not None:
+        # Only runs without a lease valid at that time (primary-key probe per row)
+        where.append("NOT EXISTS (SELECT 1 FROM review_lease l WHERE l.run_id = run_status.run_id AND l.expires_at > ?)")
+        params.append(unleased_at)
+    if after is not None:
+        where.append("(updated_at, run_id) > (?, ?)")
+        params.extend(after)
+    if updated_after is not None:
+        where.append("updated_at >= ?")
+        params.append(updated_after)
+    if updated_before is not None:
+        where.append("updated_at <= ?")
+        params.append(updated_before)
+    if min_confidence is not None:
+        where.append("confidence >= ?")
+        params.append(min_confidence)
+    if max_confidence is not None:
+        where.append("confidence < ?")
+        params.append(max_confidence)
+    sql = (
+        "SELECT run_id, status, capability, confidence, hitl_required, approval_provided, updated_at "
+        "FROM run_status WHERE " + " AND ".join(where) + " ORDER BY updated_at, run_id LIMIT ?"
+    )
+    params.append(int(limit))
+    return sql, params
+
+
+def capability_of(run_id: str) -> Optional[str]:
+    with get_conn() as c:
+        row = c.execute("SELECT capability FROM run_status WHERE run_id = ?", (run_id,)).fetchone()
+    return row[0] if row else None
+
+
+STATS_DIMENSIONS = ("hour", "capability", "status", "hitl_required")
+
+
+def query_status_stats(
+    from_hour: str,
+    to_hour: str,
+    *,
+    group_by: Tuple[str, ...] = ("status",),
+    capability: Optional[str] = None,
+    status: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run counts from run_status_rollup for buckets from_hour..to_hour (inclusive,
+    'YYYY-MM-DDTHH'). A range scan on the rollup key: cost is the number of buckets,
+    independent of run_status size.
+    """
+    dims = [d for d in STATS_DIMENSIONS if d in group_by]
+    unknown = set(group_by) - set(STATS_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown stats dimension(s): {', '.join(sorted(unknown))}")
+    where = ["hour >= ?", "hour <= ?"]
+    params: List[Any] = [from_hour, to_hour]
+    if capability is not None:
+        where.append("capability = ?")
+        params.append(capability)
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    cols = ", ".join(dims)
+    sql = (
+        f"SELECT {cols + ', ' if dims else ''}SUM(n) FROM run_status_rollup WHERE " + " AND ".join(where)
+        + (f" GROUP BY {cols} ORDER BY {cols}" if dims else "")
+    )
+    with get_conn() as c:
+        rows = c.execute(sql, params).fetchall()
+    out: List[Dict[str, Any]] = []
+    for row in rows:
+        if row[-1] is None:
+            continue  # no buckets in range
+        item: Dict[str, Any] = dict(zip(dims, row[:-1]))
+        if "capability" in item:
+            item["capability"] = item["capability"] or None
+        if "hitl_required" in item:
+            item["hitl_required"] = bool(item["hitl_required"])
+        item["count"] = row[-1]
+        out.append(item)
+    return out
+
+
+def query_review_queue(status: str = "needs_review", **filters: Any) -> List[Dict[str, Any]]:
+    """
+    Oldest-first page of runs in `status` (filters: see review_queue_sql). Keyset
+    pagination: `after` is the (updated_at, run_id) of the last row of the previous page,
+    so every page is an index range scan on idx_run_status_queue(_cap) -- no OFFSET, no sort.
+    Confidence band: min_confidence <= confidence < max_confidence.
+    """
+    sql, params = review_queue_sql(status, **filters)
+    with get_conn() as c:
+        rows = c.execute(sql, params).fetchall()
+    return [
+        {
+            "run_id": r[0],
+            "status": r[1],
+            "capability": r[2],
+            "confidence": r[3],
+            "hitl_required": bool(r[4]),
+            "approval_provided": bool(r[5]),
+            "updated_at": r[6],
+        }
+        for r in rows
+    ]
+
+# ==================== REVIEW LEASES ====================
+# A lease is valid while expires_at > now; claiming over an expired lease just replaces it,
+# so correctness never depends on the reaper. The same holder re-claiming extends it.
+
+_CLAIM_UPSERT = (
+    " ON CONFLICT(run_id) DO UPDATE SET holder=excluded.holder, claimed_at=excluded.claimed_at, "
+    "expires_at=excluded.expires_at WHERE review_lease.expires_at <= ? OR review_lease.holder = excluded.holder"
+)
+
+
+def _lease(run_id: str, holder: str, claimed_at: float, expires_at: float) -> Dict[str, Any]:
+    return {"run_id": run_id, "holder": holder, "claimed_at": claimed_at, "expires_at": expires_at}
+
+
+def claim_run(run_id: str, holder: str, ttl_s: float, status: str = "needs_review") -> Optional[Dict[str, Any]]:
+    """Atomically leases one run in `status`; None if it is missing, not pending or held by someone else."""
+    now = time.time()
+    with get_conn() as c:
+        cur = c.execute(
+            "INSERT INTO review_lease (run_id, holder, claimed_at, expires_at) "
+            "SELECT run_id, ?, ?, ? FROM run_status WHERE run_id = ? AND status = ?" + _CLAIM_UPSERT,
+            (holder, now, now + ttl_s, run_id, status, now),
+        )
+        claimed = cur.rowcount == 1
+    return _lease(run_id, holder, now, now + ttl_s) if claimed else None
+
+
+def claim_next(
+    holder: str,
+    n: int,
+    ttl_s: float,
+    *,
+    status: str = "needs_review",
+    capability: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Leases up to n of the oldest unleased runs in one statement: an index range scan on
+    idx_run_status_queue(_cap) that skips rows with a live lease (primary-key probe).
+    SQLite serializes writers, so concurrent callers never get the same run.
+    """
+    now = time.time()
+    where = ["r.status = ?"]
+    params: List[Any] = [holder, now, now + ttl_s, status]
+    if capability is not None:
+        where.append("r.capability = ?")
+        params.append(capability)
+    params += [now, int(n), now]
+    sql = (
+        "INSERT INTO review_lease (run_id, holder, claimed_at, expires_at) "
+        "SELECT r.run_id, ?, ?, ? FROM run_status r WHERE " + " AND ".join(where) + " "
+        "AND NOT EXISTS (SELECT 1 FROM review_lease l WHERE l.run_id = r.run_id AND l.expires_at > ?) "
+        "ORDER BY r.updated_at, r.run_id LIMIT ?" + _CLAIM_UPSERT + " RETURNING run_id"
+    )
+    with get_conn() as c:
+        ids = [row[0] for row in c.execute(sql, params).fetchall()]
+    return [_lease(rid, holder, now, now + ttl_s) for rid in ids]
+
+
+def active_lease(run_id: str) -> Optional[Dict[str, Any]]:
+    with get_conn() as c:
+        row = c.execute(
+            "SELECT holder, claimed_at, expires_at FROM review_lease WHERE run_id = ? AND expires_at > ?",
+            (run_id, time.time()),
+        ).fetchone()
+    return _lease(run_id, row[0], row[1], row[2]) if row else None
+
+
+def release_lease(run_id: str, holder: str) -> bool:
+    with get_conn() as c:
+        cur = c.execute("DELETE FROM review_lease WHERE run_id = ? AND holder = ?", (run_id, holder))
+        return cur.rowcount == 1
+
+
+def reap_expired_leases(batch: int = 1000, now: Optional[float] = None) -> int:
+    """Deletes expired leases in index-ordered batches (short write locks); returns the count."""
+    cutoff = time.time() if now is None else now
+    total = 0
+    while True:
+        with get_conn() as c:
+            cur = c.execute(
+                "DELETE FROM review_lease WHERE rowid IN "
+                "(SELECT rowid FROM review_lease WHERE expires_at <= ? ORDER BY expires_at LIMIT ?)",
+                (cutoff, int(batch)),
+            )
+            n = cur.rowcount
+        total += n
+        if n < batch:
+            return total
+
+
+class SQLiteReviewLeases(ReviewLeaseStore):
+    def active_holder(self, request_id: str) -> Optional[str]:
+        lease = active_lease(request_id)
+        return lease["holder"] if lease else None
+
+    def release(self, request_id: str, holder: str) -> bool:
+        return release_lease(request_id, holder)
+
+
+class SQLiteMachineStorage(StateMachineStorage):
+    """
+    StateMachineStorage in the state DB. Unlike InMemoryStorage it is visible to every
+    worker process, so /review and /admin/override find runs created by another worker.
+    Writes join an enclosing transaction(), so bulk saves roll back with run_status.
+    """
+
+    transactional = True
+
+    def save(self, request_id: str, state_machine: StatusStateMachine) -> None:
+        data = json.dumps(state_machine.to_dict(), ensure_ascii=False, default=str)
+        with get_conn() as c:
+            c.execute(
+                "INSERT INTO state_machine (request_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(request_id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+                (request_id, data, datetime.utcnow().isoformat()),
+            )
+
+    def save_many(self, state_machines: Dict[str, StatusStateMachine]) -> None:
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (request_id, json.dumps(sm.to_dict(), ensure_ascii=False, default=str), now)
+            for request_id, sm in state_machines.items()
+        ]
+        with get_conn() as c:
+            c.executemany(
+                "INSERT INTO state_machine (request_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(request_id) DO UPDATE SET data=excluded.data, updated_at=excluded.updated_at",
+                rows,
+            )
+
+    def load(self, request_id: str) -> Optional[StatusStateMachine]:
+        with get_conn() as c:
+            row = c.execute("SELECT data FROM state_machine WHERE request_id = ?", (request_id,)).fetchone()
+        return StatusStateMachine.from_dict(json.loads(row[0])) if row else None
+
+    def delete(self, request_id: str) -> None:
+        with get_conn() as c:
+            c.execute("DELETE FROM state_machine WHERE request_id = ?", (request_id,))
+
+    def exists(self, request_id: str) -> bool:
+        with get_conn() as c:
+            row = c.execute("SELECT 1 FROM state_machine WHERE request_id = ?", (request_id,)).fetchone()
+        return row is not None
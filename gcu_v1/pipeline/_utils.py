@@ -5,7 +5,7 @@ import os
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import uuid
 
 
@@ -13,7 +13,8 @@ def utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def sha256_file(path: Path) -> Tuple[str, int]:
+def sha256_file(path: Path, check: Optional[Callable[[], None]] = None) -> Tuple[str, int]:
+    # `check` is called per chunk and may raise to abandon the scan (request deadline)
     h = hashlib.sha256()
     total = 0
     with path.open("rb") as f:
@@ -21,6 +22,8 @@ def sha256_file(path: Path) -> Tuple[str, int]:
             chunk = f.read(1024 * 1024)
             if not chunk:
                 break
+            if check is not None:
+                check()
             total += len(chunk)
             h.update(chunk)
     return h.hexdigest(), total
@@ -41,6 +44,28 @@ def load_json(path: Path) -> Dict[str, Any]:
     return json.loads(path.read_text(encoding="utf-8-sig"))
 
 
+_JSON_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_JSON_CACHE_MAX = 64
+
+
+def load_json_cached(path: Path) -> Dict[str, Any]:
+    """
+    load_json with a (mtime_ns, size) keyed cache for read-only config files
+    (manifest, policy, agent bundles). Callers must not mutate the result.
+    """
+    st = path.stat()
+    key = str(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _JSON_CACHE.get(key)
+    if hit and hit[0] == stamp:
+        return hit[1]
+    obj = load_json(path)
+    if len(_JSON_CACHE) >= _JSON_CACHE_MAX:
+        _JSON_CACHE.clear()
+    _JSON_CACHE[key] = (stamp, obj)
+    return obj
+
+
 def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
@@ -0,0 +1,108 @@
+﻿from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from prometheus_client import Counter
+
+# Request deadlines for _execute.
+# The API derives a Deadline from X-Request-Timeout-Ms / X-Request-Deadline and binds
+# it like the tracer (contextvar), so run_capability's signature stays unchanged.
+# Stages call deadline.check(stage) between steps and long scans call it per
+# chunk; an expired deadline raises DeadlineExceeded and _execute writes an
+# "aborted" audit with reason "deadline" instead of finishing the work.
+
+DEADLINE_EXCEEDED_TOTAL = Counter(
+    "gcu_deadline_exceeded_total",
+    "Runs abandoned because the request deadline expired",
+    ["stage"],
+)
+
+_CURRENT: ContextVar[Optional["Deadline"]] = ContextVar("gcu_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str, overrun_s: float) -> None:
+        super().__init__(f"Deadline exceeded at stage '{stage}' (+{overrun_s * 1000.0:.1f} ms)")
+        self.stage = stage
+        self.overrun_s = overrun_s
+
+
+class Deadline:
+    """Absolute point on the perf_counter clock."""
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: float) -> None:
+        self.at = at
+
+    @classmethod
+    def after(cls, seconds: float, start: Optional[float] = None) -> "Deadline":
+        return cls((time.perf_counter() if start is None else start) + seconds)
+
+    def remaining(self) -> float:
+        return self.at - time.perf_counter()
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.at
+
+    def check(self, stage: str) -> None:
+        left = self.remaining()
+        if left <= 0:
+            DEADLINE_EXCEEDED_TOTAL.labels(stage=stage).inc()
+            raise DeadlineExceeded(stage, -left)
+
+    def checker(self, stage: str) -> Any:
+        """Zero-arg callable for scan loops (sha256_file, keyword scoring)."""
+        return lambda: self.check(stage)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def bind_deadline(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _CURRENT.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _CURRENT.reset(token)
+
+
+def parse_deadline(
+    timeout_ms: Optional[str],
+    deadline_epoch: Optional[str],
+    *,
+    arrival: float,
+    default_ms: float = 0.0,
+    max_ms: float = 0.0,
+) -> Optional[Deadline]:
+    """
+    X-Request-Timeout-Ms is relative to arrival; X-Request-Deadline is an absolute
+    unix timestamp in seconds (as set by a gateway). The earlier one wins; max_ms caps
+    both. Unparsable values are ignored. Returns None when there is no budget at all.
+    """
+    budgets = []
+    try:
+        if timeout_ms is not None and timeout_ms.strip():
+            budgets.append(float(timeout_ms) / 1000.0)
+    except ValueError:
+        pass
+    try:
+        if deadline_epoch is not None and deadline_epoch.strip():
+            # Map wall clock onto perf_counter relative to arrival
+            elapsed = time.perf_counter() - arrival
+            budgets.append(float(deadline_epoch) - time.time() + elapsed)
+    except ValueError:
+        pass
+    if not budgets and default_ms > 0:
+        budgets.append(default_ms / 1000.0)
+    if not budgets:
+        return None
+    budget = min(budgets)
+    if max_ms > 0:
+        budget = min(budget, max_ms / 1000.0)
+    return Deadline.after(budget, start=arrival)
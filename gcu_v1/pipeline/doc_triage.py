@@ -1,30 +1,48 @@
-﻿from typing import Dict, Any, List, Tuple
-
-def _score_text(text: str, keywords: Dict[str, Any]) -> Tuple[float, List[Dict[str, Any]]]:
+﻿from typing import Callable, Dict, Any, List, Optional, Tuple
+
+# Text scanned (characters, summed over signals) between two deadline checks: each
+# signal is a full pass over the document, so a large document is checked after every
+# signal and a short one with few signals not at all
+CHECK_EVERY_CHARS = 1 << 20
+
+_GROUPS = (
+    ("high_risk_signals", "HIGH_RISK_SIGNAL"),
+    ("potential_risk_signals", "POTENTIAL_RISK_SIGNAL"),
+    ("safe_signals", "SAFE_SIGNAL"),
+)
+
+Signal = Tuple[str, str, float]  # (rule, lowercased signal, weight)
+
+
+def compile_signals(keywords: Dict[str, Any]) -> Tuple[Signal, ...]:
+    """Lowercases and converts once per bundle instead of once per request."""
+    out: List[Signal] = []
+    for group, rule in _GROUPS:
+        for item in keywords.get(group, []):
+            sig = (item.get("signal") or "").lower()
+            if sig:
+                out.append((rule, sig, float(item.get("weight", 0.0))))
+    return tuple(out)
+
+
+def _score_text(
+    text: str,
+    signals: Tuple[Signal, ...],
+    check: Optional[Callable[[], None]] = None,
+) -> Tuple[float, List[Dict[str, Any]]]:
     t = (text or "").lower()
     explain: List[Dict[str, Any]] = []
     score = 0.0
-
-    for item in keywords.get("high_risk_signals", []):
-        sig = (item.get("signal") or "").lower()
-        w = float(item.get("weight", 0.0))
-        if sig and sig in t:
-            score += w
-            explain.append({"rule": "HIGH_RISK_SIGNAL", "signal": sig, "weight": w})
-
-    for item in keywords.get("potential_risk_signals", []):
-        sig = (item.get("signal") or "").lower()
-        w = float(item.get("weight", 0.0))
-        if sig and sig in t:
-            score += w
-            explain.append({"rule": "POTENTIAL_RISK_SIGNAL", "signal": sig, "weight": w})
-
-    for item in keywords.get("safe_signals", []):
-        sig = (item.get("signal") or "").lower()
-        w = float(item.get("weight", 0.0))
-        if sig and sig in t:
+    scanned = len(t)  # lower() was one pass already
+
+    for rule, sig, w in signals:
+        if check is not None and scanned >= CHECK_EVERY_CHARS:
+            check()
+            scanned = 0
+        scanned += len(t)
+        if sig in t:
             score += w
-            explain.append({"rule": "SAFE_SIGNAL", "signal": sig, "weight": w})
+            explain.append({"rule": rule, "signal": sig, "weight": w})
 
     score = max(0.0, min(1.0, score))
     return score, explain
@@ -63,10 +81,20 @@ def _apply_policy(score: float, confidence: float) -> Dict[str, Any]:
     }
 
 
-def run_doc_triage(text: str, bundle: Dict[str, Any]) -> Dict[str, Any]:
-    keywords = bundle["keywords"]
+def run_doc_triage(
+    text: str,
+    bundle: Dict[str, Any],
+    *,
+    shadow_bundle: Optional[Dict[str, Any]] = None,
+    shadow_sample_rate: Optional[float] = None,
+    run_id: Optional[str] = None,
+    check: Optional[Callable[[], None]] = None,
+) -> Dict[str, Any]:
+    signals = bundle.get("compiled_signals")
+    if signals is None:
+        signals = compile_signals(bundle["keywords"])
 
-    score, explain = _score_text(text, keywords)
+    score, explain = _score_text(text, signals, check)
 
     # Deterministic confidence v1
     confidence = float(score)
@@ -77,7 +105,7 @@ def run_doc_triage(text: str, bundle: Dict[str, Any]) -> Dict[str, Any]:
     if decision["gate_rule"]:
         explain.append({"rule": "POLICY_GATE", "signal": decision["gate_rule"], "weight": 0.0})
 
-    return {
+    result = {
         "classification": decision["classification"],
         "confidence": confidence,
         "needs_human": decision["needs_human"],
@@ -85,3 +113,11 @@ def run_doc_triage(text: str, bundle: Dict[str, Any]) -> Dict[str, Any]:
         "status": decision["status"],
         "meta": {"score": score, "capability": bundle.get("capability")},
     }
+
+    # Shadow ruleset: evaluated in a background pool, never affects this result
+    if shadow_bundle is not None:
+        from gcu_v1.pipeline.shadow import submit_shadow
+
+        submit_shadow(text, result, shadow_bundle, run_id=run_id, sample_rate=shadow_sample_rate)
+
+    return result
@@ -10,4 +10,13 @@ def finalize_audit(outputs_dir: Path, audit: Dict[str, Any], ctx: Dict[str, Any]
     path = outputs_dir / ctx["run_id"] / "audit.json"
     write_json(path, audit)
     _event(ctx["events"], "audit_written", f"path={path}")
+    # The run's config snapshot decides (run_capability puts it into ctx)
+    enabled = ctx.get("audit_index_enabled")
+    if enabled is None:
+        from gcu_v1.config import current_config
+        enabled = current_config().audit_index_enabled
+    if enabled:
+        # Only enqueues; the search index is written by a background thread
+        from gcu_v1.persistence.audit_index import submit_audit
+        submit_audit(audit)
     return path
@@ -1,6 +1,6 @@
 ﻿from __future__ import annotations
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 from ._utils import GovernanceDecision, env_truthy, utc_now_iso
 
 def _event(events, typ: str, detail: str) -> None:
@@ -21,11 +21,17 @@ def validate_policy(manifest: Dict[str, Any], policy: Dict[str, Any], ctx: Dict[
 
     return True, None
 
-def decide_governance(manifest: Dict[str, Any], policy: Dict[str, Any], ctx: Dict[str, Any]) -> GovernanceDecision:
+def decide_governance(
+    manifest: Dict[str, Any],
+    policy: Dict[str, Any],
+    ctx: Dict[str, Any],
+    kill: Optional[bool] = None,
+) -> GovernanceDecision:
+    # kill: GCU_KILL from the config snapshot; None reads the env (CLI)
     events = ctx["events"]
 
     kill_enabled = bool(manifest.get("kill_switch", True))
-    kill_triggered = kill_enabled and env_truthy("GCU_KILL")
+    kill_triggered = kill_enabled and (env_truthy("GCU_KILL") if kill is None else kill)
     if kill_triggered:
         _event(events, "kill_switch", "Kill-switch triggered via env GCU_KILL")
         return GovernanceDecision(
@@ -1,10 +1,15 @@
 ﻿from __future__ import annotations
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Optional, Tuple
 from ._utils import sha256_file, utc_now_iso
 
-def intake(input_path: Path) -> Dict[str, Any]:
-    sha, size = sha256_file(input_path)
+def intake(
+    input_path: Path,
+    check: Optional[Callable[[], None]] = None,
+    digest: Optional[Tuple[str, int]] = None,
+) -> Dict[str, Any]:
+    # `digest` = (sha256, size) when the caller already hashed the file (batch mode)
+    sha, size = digest or sha256_file(input_path, check)
     return {
         "ts": utc_now_iso(),
         "input": {
@@ -0,0 +1,162 @@
+﻿from __future__ import annotations
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from prometheus_client import Counter, Histogram
+
+from .doc_triage import run_doc_triage
+
+# Shadow evaluation: a candidate ruleset runs next to production on live traffic.
+# The shadow result never influences status; only agreement, score delta and latency are recorded.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 64
+
+SHADOW_EVALUATIONS_TOTAL = Counter(
+    "gcu_shadow_evaluations_total",
+    "Shadow ruleset evaluations by outcome",
+    ["capability", "outcome"],  # agree | disagree | error | dropped
+)
+
+SHADOW_SCORE_DELTA = Histogram(
+    "gcu_shadow_score_delta",
+    "Shadow score minus primary score",
+    ["capability"],
+    buckets=(-1.0, -0.5, -0.25, -0.1, -0.05, -0.01, 0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+SHADOW_DURATION_SECONDS = Histogram(
+    "gcu_shadow_duration_seconds",
+    "Shadow ruleset evaluation duration (background pool)",
+    ["capability"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+SHADOW_SUBMIT_SECONDS = Histogram(
+    "gcu_shadow_submit_seconds",
+    "Time added to the primary request by shadow sampling + submit",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005),
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_init_lock = threading.Lock()
+
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor, _slots
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(_env_int("NP_SHADOW_MAX_PENDING", DEFAULT_MAX_PENDING))
+                _executor = ThreadPoolExecutor(
+                    max_workers=_env_int("NP_SHADOW_WORKERS", DEFAULT_WORKERS),
+                    thread_name_prefix="gcu-shadow",
+                )
+    return _executor
+
+
+def _score(result: Dict[str, Any]) -> float:
+    meta = result.get("meta") or {}
+    return float(meta.get("score", result.get("confidence", 0.0)))
+
+
+def _evaluate(
+    text: str,
+    primary: Dict[str, Any],
+    shadow_bundle: Dict[str, Any],
+    run_id: Optional[str],
+    slots: threading.BoundedSemaphore,
+) -> Dict[str, Any]:
+    capability = str(shadow_bundle.get("capability"))
+    try:
+        t0 = time.perf_counter()
+        shadow = run_doc_triage(text=text, bundle=shadow_bundle)
+        SHADOW_DURATION_SECONDS.labels(capability=capability).observe(time.perf_counter() - t0)
+
+        agree = (
+            shadow["classification"] == primary.get("classification")
+            and shadow["status"] == primary.get("status")
+        )
+        delta = _score(shadow) - _score(primary)
+        SHADOW_EVALUATIONS_TOTAL.labels(capability=capability, outcome="agree" if agree else "disagree").inc()
+        SHADOW_SCORE_DELTA.labels(capability=capability).observe(delta)
+
+        if not agree:
+            logger.info(
+                "Shadow disagreement run_id=%s primary=%s/%s shadow=%s/%s delta=%.4f",
+                run_id,
+                primary.get("classification"),
+                primary.get("status"),
+                shadow["classification"],
+                shadow["status"],
+                delta,
+            )
+        return {"agree": agree, "score_delta": delta, "shadow": shadow}
+    except Exception:
+        SHADOW_EVALUATIONS_TOTAL.labels(capability=capability, outcome="error").inc()
+        logger.warning("Shadow evaluation failed run_id=%s", run_id, exc_info=True)
+        return {"agree": None, "score_delta": None, "shadow": None}
+    finally:
+        slots.release()
+
+
+def submit_shadow(
+    text: str,
+    primary: Dict[str, Any],
+    shadow_bundle: Dict[str, Any],
+    *,
+    run_id: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+) -> Optional[Future]:
+    """
+    Schedule a shadow evaluation off the request's critical path.
+    Cost on the caller is a random draw plus a non-blocking semaphore acquire;
+    when the pool is saturated the sample is dropped instead of queued.
+    sample_rate defaults to the config snapshot's NP_SHADOW_SAMPLE_RATE.
+    """
+    t0 = time.perf_counter()
+    try:
+        if sample_rate is None:
+            from gcu_v1.config import current_config
+            sample_rate = current_config().shadow_sample_rate
+        if sample_rate <= 0.0 or (sample_rate < 1.0 and random.random() >= sample_rate):
+            return None
+
+        pool = _pool()
+        slots = _slots
+        if not slots.acquire(blocking=False):
+            SHADOW_EVALUATIONS_TOTAL.labels(capability=str(shadow_bundle.get("capability")), outcome="dropped").inc()
+            return None
+
+        try:
+            return pool.submit(_evaluate, text, dict(primary), shadow_bundle, run_id, slots)
+        except RuntimeError:
+            slots.release()
+            return None
+    finally:
+        SHADOW_SUBMIT_SECONDS.observe(time.perf_counter() - t0)
+
+
+def shutdown_shadow(wait: bool = True) -> None:
+    global _executor, _slots
+    with _init_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+        _executor = None
+        _slots = None
@@ -0,0 +1,173 @@
+﻿from __future__ import annotations
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from prometheus_client import Histogram
+
+# In-process stage tracer for _execute (no external collector).
+# Sampled runs record spans into the audit ("trace") and the stage histogram;
+# unsampled runs get NULL_TRACER, whose span() is a shared nullcontext.
+# Callers that need timings regardless of sampling (slow-request log) pass force=True
+# and get a StageTimer: per-stage totals only, no span records, nothing exported.
+# NP_TRACE_SAMPLE_RATE is read into the config snapshot, not per run.
+
+STAGE_DURATION_SECONDS = Histogram(
+    "gcu_pipeline_stage_duration_seconds",
+    "Duration of individual pipeline stages in _execute",
+    ["stage", "capability"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5),
+)
+
+DEFAULT_SAMPLE_RATE = 0.01
+
+
+_CURRENT: ContextVar[Optional[Any]] = ContextVar("gcu_tracer", default=None)
+
+
+class Tracer:
+    def __init__(self, capability: str = "unknown", sampled: bool = True) -> None:
+        self.capability = capability
+        self.sampled = sampled
+        self.spans: List[Dict[str, Any]] = []
+        self.attrs: Dict[str, Any] = {}
+        self._t0 = time.perf_counter()
+        self._observed = 0
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append({
+                "stage": stage,
+                "start_ms": round((start - self._t0) * 1000.0, 3),
+                "dur_ms": round((end - start) * 1000.0, 3),
+            })
+
+    def annotate(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def stage_ms(self) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for s in self.spans:
+            out[s["stage"]] = round(out.get(s["stage"], 0.0) + s["dur_ms"], 3)
+        return out
+
+    def to_audit(self) -> Optional[Dict[str, Any]]:
+        if not self.sampled:
+            return None
+        return {
+            "sampled": True,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000.0, 3),
+            "spans": list(self.spans),
+        }
+
+    def finish(self) -> None:
+        # Observed at the end so the capability label is final; spans added
+        # afterwards (e.g. governance in /run) are picked up by a later finish()
+        if not self.sampled:
+            return
+        pending, self._observed = self.spans[self._observed:], len(self.spans)
+        for s in pending:
+            STAGE_DURATION_SECONDS.labels(stage=s["stage"], capability=self.capability).observe(s["dur_ms"] / 1000.0)
+
+
+class _StageSpan:
+    __slots__ = ("_totals", "_stage", "_start")
+
+    def __init__(self, totals: Dict[str, float], stage: str) -> None:
+        self._totals = totals
+        self._stage = stage
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> bool:
+        self._totals[self._stage] = self._totals.get(self._stage, 0.0) + time.perf_counter() - self._start
+        return False
+
+
+class StageTimer:
+    """Unsampled stand-in for Tracer that only sums seconds per stage (for the slow-request log)."""
+
+    sampled = False
+
+    def __init__(self, capability: str = "unknown") -> None:
+        self.capability = capability
+        self.attrs: Dict[str, Any] = {}
+        self._totals: Dict[str, float] = {}
+
+    def span(self, stage: str) -> _StageSpan:
+        return _StageSpan(self._totals, stage)
+
+    def annotate(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def stage_ms(self) -> Dict[str, float]:
+        return {stage: round(s * 1000.0, 3) for stage, s in self._totals.items()}
+
+    def to_audit(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def finish(self) -> None:
+        return None
+
+
+class _NullTracer:
+    sampled = False
+    spans: List[Dict[str, Any]] = []
+    attrs: Dict[str, Any] = {}
+    capability = "unknown"
+
+    _null = nullcontext()
+
+    def span(self, stage: str) -> Any:
+        return self._null
+
+    def annotate(self, **attrs: Any) -> None:
+        return None
+
+    def stage_ms(self) -> Dict[str, float]:
+        return {}
+
+    def to_audit(self) -> Optional[Dict[str, Any]]:
+        return None
+
+    def finish(self) -> None:
+        return None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Shared singleton: ignore per-run assignments such as .capability
+        return None
+
+
+NULL_TRACER = _NullTracer()
+
+
+def start_trace(capability: str = "unknown", sample_rate: Optional[float] = None, force: bool = False) -> Any:
+    if sample_rate is None:
+        from gcu_v1.config import current_config
+
+        sample_rate = current_config().trace_sample_rate
+    if sample_rate <= 0.0 or (sample_rate < 1.0 and random.random() >= sample_rate):
+        return StageTimer(capability) if force else NULL_TRACER
+    return Tracer(capability)
+
+
+def current_tracer() -> Optional[Any]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def bind_tracer(tracer: Any) -> Iterator[Any]:
+    """Makes `tracer` the one run_capability uses for the current request context."""
+    token = _CURRENT.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _CURRENT.reset(token)
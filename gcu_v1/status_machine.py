@@ -1,11 +1,11 @@
-# status_machine.py
+﻿# status_machine.py
 """
 Single Source of Truth für Status-Logik in NovaPact GCU.
 Enterprise-taugliche Status-Maschine für AI-Governance mit HITL-Support.
 """
 
 from enum import Enum
-from typing import Dict, Set, Optional, List, Any, Tuple
+from typing import Callable, Dict, Set, Optional, List, Any, Tuple
 from dataclasses import dataclass, field, asdict
 from datetime import datetime, timezone
 import logging
@@ -13,6 +13,8 @@ import threading
 from abc import ABC, abstractmethod
 import json
 
+from gcu_v1.logsetup import Lazy
+
 # ==================== STATUS DEFINITION ====================
 
 class SystemStatus(str, Enum):
@@ -42,6 +44,13 @@ class AdminOverrideError(Exception):
         self.actor = actor
         self.role = role
 
+class ReviewLeaseError(Exception):
+    """Exception wenn ein anderer Reviewer den Run per Lease hält (oder Lease fehlt)"""
+    def __init__(self, message: str, request_id: str, holder: Optional[str]):
+        super().__init__(message)
+        self.request_id = request_id
+        self.holder = holder
+
 @dataclass(frozen=True)
 class TransitionContext:
     """Kontext für Status-Übergänge (Auditierbar)"""
@@ -178,6 +187,8 @@ class StatusStateMachine:
         is_admin_override: bool
     ):
         """Structured logging für Audit-Trail"""
+        if not self._logger.isEnabledFor(logging.INFO):
+            return
         self._logger.info(
             "Status transition",
             extra={
@@ -190,7 +201,8 @@ class StatusStateMachine:
                 "admin_override": is_admin_override,
                 "reason": context.reason,
                 "component": "StatusStateMachine",
-                "metadata": json.dumps(context.metadata, default=str)
+                # Serialisierung erst im Log-Listener-Thread
+                "metadata": Lazy(json.dumps, dict(context.metadata), default=str)
             }
         )
     
@@ -267,6 +279,15 @@ class StateMachineStorage(ABC):
     def exists(self, request_id: str) -> bool:
         """Prüft, ob Request existiert"""
         pass
+    
+    # True, wenn save/save_many an der Transaktion des Aufrufers teilnehmen (z.B. SQLite
+    # im status_store); sonst verschiebt der Manager Bulk-Saves bis nach dem Commit
+    transactional = False
+    
+    def save_many(self, state_machines: Dict[str, StatusStateMachine]) -> None:
+        """Speichert mehrere State-Machines (Bulk); Implementationen können batchen"""
+        for request_id, state_machine in state_machines.items():
+            self.save(request_id, state_machine)
 
 class InMemoryStorage(StateMachineStorage):
     """
@@ -298,6 +319,19 @@ class InMemoryStorage(StateMachineStorage):
         with self._lock:
             return request_id in self._storage
 
+class ReviewLeaseStore(ABC):
+    """Reviewer-Leases (Claim mit Ablaufzeit) für horizontal skalierte HITL-Teams"""
+
+    @abstractmethod
+    def active_holder(self, request_id: str) -> Optional[str]:
+        """Inhaber des gültigen (nicht abgelaufenen) Leases, sonst None"""
+        pass
+
+    @abstractmethod
+    def release(self, request_id: str, holder: str) -> bool:
+        """Gibt Lease frei, falls `holder` ihn hält"""
+        pass
+
 # ==================== STATUS RESOLVER ====================
 
 @dataclass
@@ -363,16 +397,58 @@ class NovaPactStatusManager:
     Diese Klasse ist thread-safe für konkurrierende Requests.
     """
     
-    def __init__(self, storage: Optional[StateMachineStorage] = None):
+    def __init__(
+        self,
+        storage: Optional[StateMachineStorage] = None,
+        leases: Optional[ReviewLeaseStore] = None,
+        require_lease: bool = False,
+        publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+        defer: Optional[Callable[[Callable[[], None]], None]] = None,
+    ):
         """
         Initialisiert mit optionalem Storage.
         
         Standard: InMemoryStorage (NUR für Entwicklung).
         Produktion: Datenbank/Redis-basierte Implementation erforderlich.
+        
+        leases: Review-Aktionen nur durch den Lease-Inhaber (oder ohne fremden Lease);
+        require_lease=True verlangt zusätzlich einen eigenen gültigen Lease.
+        publish: erhält jede gespeicherte Transition als Event (z.B. Status-Feed für Review-UIs).
+        defer: führt einen Callback nach dem Commit der umgebenden Transaktion aus (z.B.
+        status_store.after_commit); Bulk-Saves in nicht-transaktionalen Storage laufen darüber,
+        damit ein Rollback keine State-Machines zurücklässt, die schon umgeschaltet haben.
         """
         self._storage = storage or InMemoryStorage()
+        self._leases = leases
+        self._require_lease = require_lease
+        self._publish = publish
+        self._defer = defer
         self._logger = logging.getLogger(__name__)
     
+    def _emit(
+        self,
+        request_id: str,
+        from_status: Optional[SystemStatus],
+        to_status: SystemStatus,
+        context: TransitionContext
+    ) -> None:
+        """Meldet eine gespeicherte Transition; Fehler im Subscriber stören den Request nicht"""
+        if self._publish is None:
+            return
+        try:
+            self._publish({
+                "run_id": request_id,
+                "from": str(from_status) if from_status is not None else None,
+                "to": str(to_status),
+                "actor": context.actor,
+                "role": context.role,
+                "reason": context.reason,
+                "admin_override": bool(context.metadata.get("admin_override", False)),
+                "ts": context.timestamp.isoformat(),
+            })
+        except Exception:
+            self._logger.warning("Status-Event nicht publiziert", exc_info=True)
+    
     def process_classification(
         self,
         request_id: str,
@@ -417,6 +493,7 @@ class NovaPactStatusManager:
         
         # 5. State-Machine persistent speichern (Enterprise-Requirement)
         self._storage.save(request_id, state_machine)
+        self._emit(request_id, None, initial_status, context)
         
         # 6. Audit-Logging
         self._logger.info(
@@ -451,7 +528,16 @@ class NovaPactStatusManager:
         Raises:
             KeyError: Wenn request_id nicht existiert
             StatusTransitionError: Bei illegaler Aktion
+            ReviewLeaseError: Wenn ein anderer Reviewer den Lease hält
         """
+        # 0. Lease prüfen: verhindert doppelte Bearbeitung durch parallele Reviewer
+        if self._leases is not None:
+            holder = self._leases.active_holder(request_id)
+            if holder is not None and holder != actor:
+                raise ReviewLeaseError(f"Run {request_id} ist von {holder} beansprucht", request_id, holder)
+            if holder is None and self._require_lease:
+                raise ReviewLeaseError(f"Review von {request_id} erfordert einen Lease", request_id, None)
+        
         # 1. State-Machine laden
         state_machine = self._storage.load(request_id)
         if state_machine is None:
@@ -479,8 +565,13 @@ class NovaPactStatusManager:
         )
         
         try:
+            old_status = state_machine.current_status
             new_status = state_machine.transition(target_status, context)
             self._storage.save(request_id, state_machine)  # Persistieren
+            if self._leases is not None:
+                self._leases.release(request_id, actor)  # Arbeit erledigt
+            if new_status != old_status:
+                self._emit(request_id, old_status, new_status, context)
             return new_status
         except StatusTransitionError as e:
             self._logger.error(
@@ -532,12 +623,15 @@ class NovaPactStatusManager:
         )
         
         try:
+            old_status = state_machine.current_status
             new_status = state_machine.transition(
                 target_status,
                 context,
                 is_admin_override=True
             )
             self._storage.save(request_id, state_machine)
+            if new_status != old_status:
+                self._emit(request_id, old_status, new_status, context)
             return new_status
         except (StatusTransitionError, AdminOverrideError) as e:
             self._logger.error(
@@ -551,6 +645,104 @@ class NovaPactStatusManager:
             )
             raise
     
+    def _plan_bulk(
+        self,
+        items: List[Tuple[str, SystemStatus, TransitionContext, bool]],
+        actor: str,
+    ) -> List[Dict[str, Any]]:
+        """
+        Phase 1: jede Transition auf einer geladenen Kopie validieren und ausführen.
+        Phase 2: alle gültigen gemeinsam speichern (save_many), Leases freigeben.
+        Fehler betreffen nur den jeweiligen Eintrag (Teilerfolg-Semantik).
+        """
+        outcomes: List[Dict[str, Any]] = []
+        planned: Dict[str, StatusStateMachine] = {}
+        changes: List[Tuple[str, SystemStatus, SystemStatus, TransitionContext]] = []
+        for request_id, target_status, context, is_admin_override in items:
+            out: Dict[str, Any] = {"request_id": request_id}
+            outcomes.append(out)
+            if request_id in planned:
+                out.update(error="Doppelter Eintrag im Batch", error_type="duplicate")
+                continue
+            if self._leases is not None and not is_admin_override:
+                holder = self._leases.active_holder(request_id)
+                if (holder is not None and holder != actor) or (holder is None and self._require_lease):
+                    out.update(error=f"Lease gehalten von {holder}" if holder else "Lease erforderlich",
+                               error_type="lease", holder=holder)
+                    continue
+            state_machine = self._storage.load(request_id)
+            if state_machine is None:
+                out.update(error=f"Request {request_id} nicht gefunden", error_type="not_found")
+                continue
+            old_status = state_machine.current_status
+            try:
+                out["status"] = state_machine.transition(target_status, context, is_admin_override=is_admin_override)
+            except (StatusTransitionError, AdminOverrideError) as e:
+                out.update(error=str(e), error_type="transition")
+                continue
+            planned[request_id] = state_machine
+            if out["status"] != old_status:
+                changes.append((request_id, old_status, out["status"], context))
+        
+        if planned:
+            if self._defer is not None and not self._storage.transactional:
+                self._defer(lambda: self._storage.save_many(planned))
+            else:
+                self._storage.save_many(planned)
+            if self._leases is not None:
+                for request_id in planned:
+                    self._leases.release(request_id, actor)
+            for change in changes:
+                self._emit(*change)
+        return outcomes
+    
+    def bulk_review_actions(
+        self,
+        actions: List[Tuple[str, str, Optional[str]]],
+        actor: str,
+        role: str,
+        auth_type: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Bulk-Variante von manual_review_action: actions = [(request_id, action, reason)].
+        Returns pro Eintrag {"request_id", "status"} oder {"request_id", "error", "error_type"}.
+        """
+        action_map = {"approve": SystemStatus.APPROVED, "reject": SystemStatus.REJECTED}
+        now = datetime.now(timezone.utc)
+        items = []
+        invalid: Dict[int, Dict[str, Any]] = {}
+        for i, (request_id, action, reason) in enumerate(actions):
+            if action not in action_map:
+                invalid[i] = {"request_id": request_id, "error": f"Ungültige Aktion: {action}", "error_type": "invalid_action"}
+                continue
+            context = TransitionContext(
+                actor=actor, role=role, auth_type=auth_type, timestamp=now,
+                reason=reason or f"Manual {action}", metadata={"action": action, "bulk": True},
+            )
+            items.append((request_id, action_map[action], context, False))
+        planned = iter(self._plan_bulk(items, actor))
+        return [invalid[i] if i in invalid else next(planned) for i in range(len(actions))]
+    
+    def bulk_admin_override(
+        self,
+        overrides: List[Tuple[str, SystemStatus, str]],
+        actor: str,
+        role: str,
+        auth_type: str
+    ) -> List[Dict[str, Any]]:
+        """Bulk-Variante von admin_override: overrides = [(request_id, target_status, reason)]"""
+        if role != "admin":
+            raise AdminOverrideError(f"Admin-Override erfordert Rolle 'admin'. Aktuell: {role}", actor, role)
+        now = datetime.now(timezone.utc)
+        items = [
+            (request_id, target_status, TransitionContext(
+                actor=actor, role=role, auth_type=auth_type, timestamp=now,
+                reason=f"Admin override: {reason}", metadata={"admin_override": True, "bulk": True},
+            ), True)
+            for request_id, target_status, reason in overrides
+        ]
+        return self._plan_bulk(items, actor)
+    
     def get_status(self, request_id: str) -> Optional[SystemStatus]:
         """Thread-safe Status-Abfrage"""
         state_machine = self._storage.load(request_id)
@@ -48,6 +48,8 @@ def _bootstrap_test_env(monkeypatch):
 
         # Tabellen anlegen
         status_store.init_db()
+        # Status-Cache ist prozessweit -> Einträge aus vorherigen Test-DBs verwerfen
+        status_store.RUN_STATE_CACHE.clear()
 
         # --- Outputs/Audit roots ---
         out_root = root / "outputs"
@@ -65,6 +67,11 @@ def _bootstrap_test_env(monkeypatch):
         monkeypatch.setenv("NP_AUDIT_PATH", str(audit_root))
         monkeypatch.setenv("NP_LOG_DIR", str(root / "logs"))
 
+        # Config-Snapshot: pro Test beim ersten Zugriff neu aus der (gepatchten) Umgebung bauen
+        monkeypatch.setattr("gcu_v1.config._active", None)
+        monkeypatch.setattr("gcu_v1.config._recorded_version", None)
+        monkeypatch.setattr("gcu_v1.config._PATH_SNAPSHOTS", {})
+
         yield
 
 
@@ -0,0 +1,122 @@
+﻿import asyncio
+
+import httpx
+import pytest
+
+from prometheus_client import REGISTRY
+
+from gcu_v1.api import admission
+from gcu_v1.api.admission import AdmissionMiddleware, AdmissionPool, Shed, default_pools, pool_for_path
+
+
+def _slow_app(delay):
+    async def app(scope, receive, send):
+        await asyncio.sleep(delay)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+@pytest.mark.asyncio
+async def test_pool_queues_then_sheds_with_retry_after():
+    pool = AdmissionPool("t", limit=1, max_queue=1, max_wait_s=0.05)
+
+    assert await pool.acquire() == 0.0
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0)
+    assert pool.queued == 1
+
+    with pytest.raises(Shed) as full:
+        await pool.acquire()
+    assert full.value.status_code == 429 and full.value.retry_after >= 1
+
+    pool.release(0.01)  # slot handed to the waiter
+    assert await waiter >= 0.0
+    assert pool.in_flight == 1 and pool.queued == 0
+
+    with pytest.raises(Shed) as timeout:
+        await pool.acquire()
+    assert timeout.value.reason == "timeout" and timeout.value.status_code == 503
+    assert pool.queued == 0
+
+    pool.release(0.01)
+    assert pool.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_codel_sheds_immediately_while_queue_stands():
+    pool = AdmissionPool("t", limit=1, max_queue=10, max_wait_s=5, codel_target_s=0.001, codel_interval_s=0.0)
+    await pool.acquire()
+    waiters = [asyncio.create_task(pool.acquire()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+
+    pool.release(0.01)  # first sojourn above target -> interval starts
+    pool.release(0.01)  # still above target after interval -> dropping
+    assert pool.dropping
+    with pytest.raises(Shed) as e:
+        await pool.acquire()
+    assert e.value.reason == "codel"
+
+    pool.release(0.01)
+    pool.release(0.01)  # queue empty -> leaves dropping state
+    await asyncio.gather(*waiters)
+    assert not pool.dropping and pool.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_sheds_run_but_not_health_or_control():
+    pools = {
+        "run": AdmissionPool("run", limit=1, max_queue=0, max_wait_s=1),
+        "control": AdmissionPool("control", limit=1, max_queue=0, max_wait_s=1),
+    }
+    app = AdmissionMiddleware(_slow_app(0.1), pools=pools)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        r1, r2, h, rv = await asyncio.gather(
+            c.post("/run"),
+            c.post("/run"),
+            c.get("/health"),
+            c.post("/review/abc"),
+        )
+    assert sorted([r1.status_code, r2.status_code]) == [200, 429]
+    shed = r1 if r1.status_code == 429 else r2
+    assert int(shed.headers["retry-after"]) >= 1
+    assert h.status_code == 200 and rv.status_code == 200
+    assert pools["run"].in_flight == 0 and pools["control"].in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_as_the_wait_times_out_is_observed():
+    pool = AdmissionPool("t-grant", limit=1, max_queue=1, max_wait_s=1)
+    await pool.acquire()
+    count = lambda: REGISTRY.get_sample_value("gcu_admission_queue_wait_seconds_count", {"pool": "t-grant"})
+    before = count()
+
+    async def grant_then_time_out(aw, timeout):
+        pool.release(0.01)  # hands the slot to this waiter in the same tick
+        raise asyncio.TimeoutError
+
+    real_wait_for = admission.asyncio.wait_for
+    admission.asyncio.wait_for = grant_then_time_out
+    try:
+        assert await pool.acquire() >= 0.0
+    finally:
+        admission.asyncio.wait_for = real_wait_for
+    assert count() == before + 1 and pool.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_ops_endpoints_have_their_own_pool_and_profile_runs_alone():
+    assert [pool_for_path(p) for p in ("/stats", "/status/batch", "/audit/search", "/debug/audit/r", "/health")] == [
+        "ops", "ops", "ops", "ops", None,
+    ]
+    pools = default_pools()
+    assert pool_for_path("/debug/profile") == "profile" and pools["profile"].limit == 1
+
+    app = AdmissionMiddleware(_slow_app(0.1), pools=pools)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        p1, p2, ov = await asyncio.gather(
+            c.get("/debug/profile"), c.get("/debug/profile"), c.post("/admin/override/abc"),
+        )
+    assert sorted([p1.status_code, p2.status_code]) == [200, 429]
+    assert ov.status_code == 200
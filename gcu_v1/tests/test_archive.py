@@ -0,0 +1,194 @@
+﻿import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import archive
+
+OLD = time.time() - 40 * 86400
+
+
+def _run(outputs, run_id, old=True):
+    d = outputs / run_id
+    d.mkdir(parents=True)
+    (d / "input.json").write_text(json.dumps({"capability": "c", "payload": {"text": "x" * 500}}), encoding="utf-8")
+    (d / "audit.json").write_text(json.dumps({"run_id": run_id, "events": [{"type": "e"}] * 20}), encoding="utf-8")
+    (d / "governance_audit.jsonl").write_text('{"event": "GOV_CONFIG"}\n', encoding="utf-8")
+    (d / "governance_audit.jsonl.idx").write_bytes(b"\0" * 8)
+    if old:
+        for f in d.iterdir():
+            os.utime(f, (OLD, OLD))
+    return d
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setenv("NP_ARCHIVE_DIR", str(tmp_path / "archive"))
+    return tmp_path / "outputs", tmp_path / "archive"
+
+
+def test_compact_packs_verifies_and_deletes_old_runs(dirs):
+    outputs, root = dirs
+    originals = {}
+    for rid in ("a", "b", "c"):
+        d = _run(outputs, rid)
+        originals[rid] = {f.name: f.read_bytes() for f in d.iterdir() if not f.name.endswith(".idx")}
+    _run(outputs, "fresh", old=False)
+
+    assert archive.compact(outputs, older_than_days=30, dry_run=True)["candidates"] == 3
+    r = archive.compact(outputs, older_than_days=30)
+    assert (r["archived"], r["changed"], r["failed"], r["files_deleted"]) == (3, 0, 0, 9)
+    assert r["bytes_out"] < r["bytes_in"]
+    assert sorted(p.name for p in outputs.iterdir()) == ["fresh"]
+    for rid, files in originals.items():
+        assert archive.read_run(rid) == files
+    assert archive.read_run("fresh") is None
+    assert archive.compact(outputs, older_than_days=30)["candidates"] == 0
+
+
+def test_failed_verification_keeps_originals(dirs, monkeypatch):
+    outputs, root = dirs
+    _run(outputs, "a")
+    real = archive._read_record
+    monkeypatch.setattr(archive, "_read_record", lambda *a: real(*a)[:-1] + b"!")
+    r = archive.compact(outputs, older_than_days=30)
+    assert (r["archived"], r["failed"]) == (0, 1)
+    assert (outputs / "a" / "audit.json").exists()
+    assert archive.read_run("a") is None
+    # Retried by the next job once the record reads back intact
+    monkeypatch.setattr(archive, "_read_record", real)
+    assert archive.compact(outputs, older_than_days=30)["archived"] == 1
+    assert not (outputs / "a").exists() and archive.read_member("a", "audit.json")
+
+
+def test_run_changed_while_packing_stays_hot(dirs, monkeypatch):
+    outputs, root = dirs
+    d = _run(outputs, "a")
+    real = archive._pack
+
+    def pack_then_review(*args):
+        out = real(*args)
+        with open(d / "governance_audit.jsonl", "a", encoding="utf-8") as f:
+            f.write('{"event": "GOV_REVIEW_ACTION"}\n')
+        return out
+
+    monkeypatch.setattr(archive, "_pack", pack_then_review)
+    r = archive.compact(outputs, older_than_days=30)
+    assert (r["archived"], r["changed"], r["files_deleted"]) == (1, 1, 0)
+    assert (d / "governance_audit.jsonl").read_text(encoding="utf-8").count("\n") == 2
+
+
+def test_torn_segment_tail_is_cut_before_next_append(dirs):
+    outputs, root = dirs
+    _run(outputs, "a")
+    archive.compact(outputs, older_than_days=30)
+    seg = next(root.glob("segment-*"))
+    with open(seg, "ab") as f:
+        f.write(b"half a record")
+    _run(outputs, "b")
+    archive.compact(outputs, older_than_days=30)
+    assert archive.read_member("a", "audit.json") and archive.read_member("b", "audit.json")
+
+
+def test_segments_roll_over(dirs):
+    outputs, root = dirs
+    for rid in ("a", "b", "c"):
+        _run(outputs, rid)
+    archive.compact(outputs, older_than_days=30, segment_max_bytes=1, batch=1)
+    assert len(list(root.glob("segment-*"))) == 3
+    assert archive.main(["--outputs", str(outputs), "--older-than-days", "30", "--dry-run"]) == 0
+
+
+def test_repacking_an_archived_run_keeps_its_archived_files(dirs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the server writes to the cwd-relative gcu_v1/outputs
+    outputs = tmp_path / "gcu_v1" / "outputs"
+    d = _run(outputs, "a")
+    originals = {f.name: f.read_bytes() for f in d.iterdir()}
+    assert archive.compact(outputs, older_than_days=30)["archived"] == 1
+
+    srv._append_governance_audit("a", "GOV_REVIEW_ACTION", {"action": "approve"})
+    assert sorted(p.name for p in (outputs / "a").iterdir() if not p.name.endswith(".idx")) == ["governance_audit.jsonl"]
+    for f in (outputs / "a").iterdir():
+        os.utime(f, (OLD, OLD))
+    r = archive.compact(outputs, older_than_days=30)
+    assert (r["archived"], r["failed"], r["files_deleted"]) == (1, 0, 1)
+
+    files = archive.read_run("a")
+    assert sorted(files) == ["audit.json", "governance_audit.jsonl", "input.json"]
+    assert [json.loads(ln)["event"] for ln in files["governance_audit.jsonl"].splitlines()] == [
+        "GOV_CONFIG", "GOV_REVIEW_ACTION",
+    ]
+    assert files["audit.json"] == originals["audit.json"] and files["input.json"] == originals["input.json"]
+
+
+def test_append_waiting_on_compaction_extends_the_archived_trail(dirs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    outputs = tmp_path / "gcu_v1" / "outputs"
+    _run(outputs, "a")
+    real = archive._snapshot
+    calls = []
+
+    def review_during_delete(run_dir):
+        calls.append(run_dir)
+        if len(calls) == 2:  # _delete_originals, under the append lock
+            t = threading.Thread(target=srv._append_governance_audit, args=("a", "GOV_REVIEW_ACTION", {}))
+            t.start()
+            t.join(0.2)
+            assert t.is_alive()  # blocked until the originals are gone
+            calls.append(t)
+        return real(run_dir)
+
+    monkeypatch.setattr(archive, "_snapshot", review_during_delete)
+    assert archive.compact(outputs, older_than_days=30)["files_deleted"] == 3
+    calls[-1].join(5)
+
+    path = outputs / "a" / "governance_audit.jsonl"
+    assert [json.loads(ln)["event"] for ln in path.read_text(encoding="utf-8").splitlines()] == [
+        "GOV_CONFIG", "GOV_REVIEW_ACTION",
+    ]
+    assert os.path.getsize(str(path) + ".idx") == 16
+
+
+def test_appending_to_a_new_run_does_not_touch_the_index(dirs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    outputs, root = dirs
+    srv._append_governance_audit("new", "GOV_CONFIG", {})
+    assert not root.exists()
+
+    _run(outputs, "a")
+    archive.compact(outputs, older_than_days=30)
+    before = (root / archive.INDEX_NAME).stat().st_mtime_ns
+    srv._append_governance_audit("new-2", "GOV_CONFIG", {})
+    assert archive.read_run("new-2") is None
+    assert (root / archive.INDEX_NAME).stat().st_mtime_ns == before
+
+
+@pytest.mark.asyncio
+async def test_debug_audit_reads_archive_and_review_restores_trail(dirs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    run_id = f"arch-{uuid.uuid4().hex}"
+    srv._append_governance_audit(run_id, "GOV_CONFIG", {"threshold": 0.85})
+    srv._append_governance_audit(run_id, "GOV_STATUS_COMPUTED", {"status": "needs_review"})
+    run_dir = Path(srv._run_output_dir(run_id)).resolve()
+    for f in run_dir.iterdir():
+        os.utime(f, (OLD, OLD))
+    assert archive.compact(run_dir.parent, older_than_days=30)["archived"] == 1
+    assert not run_dir.exists()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test") as c:
+        j = (await c.get(f"/debug/audit/{run_id}")).json()
+        assert j["tier"] == "archive" and [e["event"] for e in j["audit_trail"]] == ["GOV_CONFIG", "GOV_STATUS_COMPUTED"]
+        s = await c.get(f"/debug/audit/{run_id}", params={"stream": "true", "cursor": "1"})
+        assert [json.loads(x)["event"] for x in s.text.splitlines()] == ["GOV_STATUS_COMPUTED"]
+        assert not run_dir.exists()  # reads do not recreate the run directory
+
+        srv._append_governance_audit(run_id, "GOV_REVIEW_ACTION", {"action": "approve"})
+        j = (await c.get(f"/debug/audit/{run_id}")).json()
+        assert j["tier"] == "hot"
+        assert [e["event"] for e in j["audit_trail"]] == ["GOV_CONFIG", "GOV_STATUS_COMPUTED", "GOV_REVIEW_ACTION"]
@@ -0,0 +1,135 @@
+﻿import json
+import os
+import time
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import audit_index
+from gcu_v1.pipeline.finalize_audit import finalize_audit
+
+
+def _audit(run_id, ts, signals, classification="high-risk", status="needs_review"):
+    return {
+        "run_id": run_id,
+        "timestamp": ts,
+        "status": status,
+        "result": {
+            "classification": classification,
+            "explainability": [{"rule": "KW_SIGNAL", "signal": s, "weight": 0.4} for s in signals],
+            "metadata": {"flags": ["risk_flag"]},
+        },
+        "events": [{"ts": ts, "type": "policy_block", "detail": "missing consent"}],
+    }
+
+
+async def _search(**params):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test") as c:
+        return await c.get("/audit/search", params=params)
+
+
+@pytest.fixture
+def index_on(monkeypatch):
+    monkeypatch.setenv("NP_AUDIT_INDEX", "1")
+    yield
+    audit_index.flush()
+
+
+@pytest.mark.asyncio
+async def test_finalize_audit_and_review_reasons_are_searchable(index_on, tmp_path):
+    for i, (ts, sig) in enumerate([
+        ("2026-01-10T10:00:00+00:00", ["geldwäsche"]),
+        ("2026-02-10T10:00:00+00:00", ["geldwäsche", "betrug"]),
+        ("2026-03-10T10:00:00+00:00", ["betrug"]),
+        ("2026-05-10T10:00:00+00:00", ["geldwäsche"]),
+    ]):
+        finalize_audit(tmp_path, _audit(f"r{i}", ts, sig), {"run_id": f"r{i}", "events": []})
+    srv._append_governance_audit("r1", "GOV_REVIEW_ACTION", {"action": "reject", "new_status": "rejected", "reason": "Verdacht auf Terrorfinanzierung"})
+    srv._append_governance_audit("r1", "GOV_STATUS_COMPUTED", {"status": "ok"})  # not indexed
+    audit_index.flush()
+
+    ids = lambda r: [it["run_id"] for it in r.json()["items"]]
+    r = await _search(signal="geldwäsche", since="2026-01-01T00:00:00Z", until="2026-03-31T23:59:59Z")
+    assert ids(r) == ["r1", "r0"]  # newest first, Q1 only
+    assert ids(await _search(q="signals:geldwasche AND signals:betrug")) == ["r1"]  # diacritics folded
+    assert ids(await _search(reason="terrorfinanzierung")) == ["r1"]
+    assert (await _search(reason="terrorfinanzierung")).json()["items"][0]["kind"] == "governance"
+    assert ids(await _search(reason="missing consent", classification="high-risk", kind="run")) == ["r3", "r2", "r1", "r0"]
+
+    page = (await _search(signal="geldwäsche", limit=2)).json()
+    assert [it["run_id"] for it in page["items"]] == ["r3", "r1"]
+    page = (await _search(signal="geldwäsche", limit=2, cursor=page["next_cursor"])).json()
+    assert [it["run_id"] for it in page["items"]] == ["r0"] and page["next_cursor"] is None
+
+    assert (await _search(q='signals:"unterminated')).status_code == 400
+    assert (await _search(since="last quarter")).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("NP_AUDIT_INDEX", raising=False)
+    assert (await _search(signal="x")).status_code == 404
+
+
+def _write_run(outputs, run_id, ts, signals):
+    d = outputs / run_id
+    d.mkdir(parents=True, exist_ok=True)
+    (d / "audit.json").write_text(json.dumps(_audit(run_id, ts, signals)), encoding="utf-8")
+    return d
+
+
+def test_backfill_is_incremental_and_resumable(tmp_path):
+    outputs = tmp_path / "outputs"
+    for i in range(5):
+        _write_run(outputs, f"run{i}", f"2026-01-0{i + 1}T00:00:00+00:00", ["geldwäsche"])
+    conn = audit_index.connect(tmp_path / "idx.db")
+
+    # Interrupted pass: checkpoint says run0..run2 are done
+    audit_index._set_state(conn, "pass_started", str(time.time()))
+    audit_index._set_state(conn, "pass_cursor", "run2")
+    conn.commit()
+    r = audit_index.backfill(outputs, batch=2, conn=conn)
+    assert (r["resumed_after"], r["runs_scanned"], r["docs_added"]) == ("run2", 2, 2)
+
+    r = audit_index.backfill(outputs, full=True, batch=2, conn=conn)
+    assert (r["runs_scanned"], r["docs_added"]) == (5, 3)
+
+    # Next pass only reads what changed since the last completed one
+    time.sleep(0.01)
+    with open(outputs / "run1" / "governance_audit.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"ts": "2026-01-09T00:00:00Z", "event": "GOV_ADMIN_OVERRIDE",
+                            "payload": {"target_status": "rejected", "reason": "geldwäsche bestätigt"}}) + "\n")
+    _write_run(outputs, "run5", "2026-01-08T00:00:00+00:00", ["betrug"])
+    r = audit_index.backfill(outputs, conn=conn)
+    assert (r["runs_scanned"], r["docs_added"]) == (6, 2)
+
+    items, _ = audit_index.search(reason="geldwäsche", conn=conn)
+    assert [(it["run_id"], it["kind"]) for it in items] == [("run1", "governance")]
+    assert len(audit_index.search(signal="geldwäsche", conn=conn)[0]) == 5
+    conn.close()
+
+
+def test_ids_keep_time_order_across_spilled_milliseconds(tmp_path):
+    conn = audit_index.connect(tmp_path / "idx.db")
+    t0, t1 = "2026-01-01T00:00:00.000+00:00", "2026-01-01T00:00:00.001+00:00"
+    with conn:
+        assert audit_index.index_docs(conn, audit_index.docs_from_audit(_audit("late", t1, ["x"]))) == 1
+    burst = [d for i in range(1030) for d in audit_index.docs_from_audit(_audit(f"b{i}", t0, ["x"]))]
+    with conn:
+        assert audit_index.index_docs(conn, burst) == 1030  # spills past the doc already at t1
+        assert audit_index.index_docs(conn, burst[:10]) == 0
+    assert conn.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM audit_doc").fetchone() == (1031, 1031)
+    ids = dict(conn.execute("SELECT run_id, id FROM audit_doc"))
+    assert ids["b0"] < ids["b1023"] < ids["late"] < ids["b1024"]
+    conn.close()
+
+
+def test_index_settings_come_from_the_config_snapshot(monkeypatch):
+    from gcu_v1.config import current_config
+
+    monkeypatch.setenv("NP_AUDIT_INDEX_BATCH", "7")
+    cfg = current_config()
+    assert not cfg.audit_index_enabled and cfg.audit_index_batch == 7
+    monkeypatch.setenv("NP_AUDIT_INDEX", "1")  # not seen until reload
+    assert not audit_index.enabled()
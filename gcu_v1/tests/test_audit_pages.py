@@ -0,0 +1,133 @@
+﻿import gzip
+import json
+import os
+import threading
+import uuid
+import zlib
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.api import auditlog
+
+
+def _records(path):
+    return [json.loads(line) for line in auditlog.iter_lines(path)]
+
+
+def test_append_indexes_and_catches_up_legacy_and_torn_files(tmp_path):
+    path = str(tmp_path / "governance_audit.jsonl")
+    # Written before the index existed, with a blank line
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"i": 0}\n\n{"i": 1}\n')
+    assert auditlog.count(path) == 2
+
+    auditlog.append_lines(path, [json.dumps({"i": i, "t": "ü"}) + "\n" for i in (2, 3, 4)])
+    assert os.path.getsize(auditlog.index_path(path)) == 5 * 8
+    assert [r["i"] for r in _records(path)] == [0, 1, 2, 3, 4]
+
+    page, total = auditlog.read_page(path, 3, 10)
+    assert total == 5 and [r["i"] for r in page] == [3, 4]
+    assert auditlog.read_page(path, 9, 10) == ([], 5)
+
+    # Crash between data and index write: torn index entry, unindexed record
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"i": 5}\n')
+    with open(auditlog.index_path(path), "ab") as f:
+        f.write(b"\x01\x02")
+    assert auditlog.count(path) == 6
+    assert [r["i"] for r in auditlog.read_page(path, 4, 2)[0]] == [4, 5]
+
+
+@pytest.fixture
+def trail(monkeypatch):
+    run_id = f"audit-pages-{uuid.uuid4().hex}"  # outputs/ is shared between tests
+    srv._append_governance_audit_many(run_id, [("e", {"i": i, "pad": "x" * 50}) for i in range(7)])
+    mem = [{"from": "a", "to": "b", "context": {"i": 7 + i}} for i in range(3)]
+    monkeypatch.setattr(srv.status_manager, "get_audit_trail", lambda rid: mem if rid == run_id else None)
+    return run_id
+
+
+def _i(entry):
+    return entry["payload"]["i"] if "payload" in entry else entry["context"]["i"]
+
+
+@pytest.mark.asyncio
+async def test_pages_span_governance_and_memory_trail(trail):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test") as c:
+        seen, cursor = [], None
+        while True:
+            r = await c.get(f"/debug/audit/{trail}", params={"limit": 4, **({"cursor": cursor} if cursor else {})})
+            j = r.json()
+            assert j["total"] == 10 and j["count"] == len(j["audit_trail"])
+            seen += [_i(e) for e in j["audit_trail"]]
+            cursor = j["next_cursor"]
+            if cursor is None:
+                break
+        assert seen == list(range(10))
+
+        assert (await c.get(f"/debug/audit/{trail}", params={"cursor": "x"})).status_code == 400
+        assert (await c.get(f"/debug/audit/{trail}", params={"limit": 0})).status_code == 400
+        assert (await c.get("/debug/audit/unknown-run")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_and_gzip(trail):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test") as c:
+        r = await c.get(f"/debug/audit/{trail}", params={"stream": "true", "cursor": "5"},
+                        headers={"Accept-Encoding": "identity"})
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        assert [_i(json.loads(line)) for line in r.text.splitlines()] == [5, 6, 7, 8, 9]
+
+        # Raw bytes as sent, to check the encoding itself
+        async with c.stream("GET", f"/debug/audit/{trail}", params={"stream": "true"},
+                            headers={"Accept-Encoding": "gzip"}) as s:
+            raw = b"".join([chunk async for chunk in s.aiter_raw()])
+        assert s.headers["content-encoding"] == "gzip"
+        assert len(zlib.decompress(raw, 31).splitlines()) == 10
+
+        async with c.stream("GET", f"/debug/audit/{trail}", params={"limit": 10},
+                            headers={"Accept-Encoding": "gzip"}) as s:
+            raw = b"".join([chunk async for chunk in s.aiter_raw()])
+        assert s.headers["content-encoding"] == "gzip"
+        assert json.loads(gzip.decompress(raw))["count"] == 10
+
+        small = await c.get(f"/debug/audit/{trail}", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers and small.json()["count"] == 1
+
+
+def test_index_lock_is_per_file(tmp_path):
+    a, b = str(tmp_path / "a.jsonl"), str(tmp_path / "b.jsonl")
+    auditlog.append_lines(a, ['{"i": 0}\n'])
+    done = threading.Event()
+
+    with auditlog._locked_index(a):
+        # Another run's trail is not blocked by a held (or slow, first-read) index of this one
+        t = threading.Thread(target=lambda: (auditlog.append_lines(b, ['{"i": 0}\n']), done.set()))
+        t.start()
+        assert done.wait(5)
+    t.join()
+    assert auditlog.count(b) == 1
+    assert auditlog._LOCKS == {}
+
+
+@pytest.mark.skipif(auditlog.fcntl is None, reason="needs flock")
+def test_waiter_on_a_deleted_index_relocks_the_new_one(tmp_path):
+    path = str(tmp_path / "run" / "governance_audit.jsonl")
+    auditlog.append_lines(path, ['{"i": 0}\n'])
+    done = threading.Event()
+
+    # What the archive job does (from another process): delete the run while holding the flock
+    with open(auditlog.index_path(path), "a+b") as held:
+        auditlog.fcntl.flock(held.fileno(), auditlog.fcntl.LOCK_EX)
+        t = threading.Thread(target=lambda: (auditlog.append_lines(path, ['{"i": 1}\n']), done.set()))
+        t.start()
+        assert not done.wait(0.2)
+        os.unlink(path)
+        os.unlink(auditlog.index_path(path))
+        os.rmdir(tmp_path / "run")
+    assert done.wait(5)
+    t.join()
+    assert [r["i"] for r in _records(path)] == [1]
+    assert os.path.getsize(auditlog.index_path(path)) == 8
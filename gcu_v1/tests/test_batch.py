@@ -0,0 +1,71 @@
+﻿import io
+import json
+from pathlib import Path
+
+import pytest
+
+from gcu_v1.api.batch import run_batch
+from gcu_v1.api.run import build_parser
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(PROJECT_ROOT)
+    d = tmp_path / "in"
+    (d / "sub").mkdir(parents=True)
+    (d / "a.txt").write_text("GDPR confidential liability audit investigation", encoding="utf-8")
+    (d / "b.txt").write_text("random text", encoding="utf-8")
+    (d / "sub" / "c.txt").write_text("marketing newsletter", encoding="utf-8")
+    (d / "skip.bin").write_bytes(b"\x00")
+    return d
+
+
+def _args(tmp_path, corpus, *extra):
+    return build_parser().parse_args([
+        "--input-dir", str(corpus),
+        "--glob", "**/*.txt",
+        "--outputs", str(tmp_path / "out"),
+        "--ledger", str(tmp_path / "ledger.db"),
+        *extra,
+    ])
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_batch_streams_jsonl_and_resumes_from_ledger(tmp_path, corpus, capsys, jobs):
+    out = io.StringIO()
+    code = run_batch(_args(tmp_path, corpus, "--jobs", jobs), out=out)
+
+    recs = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert code == 1  # b.txt / c.txt land in needs_review
+    assert sorted(Path(r["path"]).name for r in recs) == ["a.txt", "b.txt", "c.txt"]
+    assert all(len(r["sha256"]) == 64 for r in recs)
+
+    summary = json.loads(capsys.readouterr().err.strip().splitlines()[-1])["batch_summary"]
+    assert summary["processed"] == 3 and summary["skipped"] == 0
+
+    out2 = io.StringIO()
+    run_batch(_args(tmp_path, corpus, "--jobs", jobs), out=out2)
+    recs2 = [json.loads(line) for line in out2.getvalue().splitlines()]
+    assert all(r["skipped"] for r in recs2)
+    assert {r["run_id"] for r in recs2} == {r["run_id"] for r in recs}
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_batch_processes_identical_files_once(tmp_path, corpus, capsys, jobs):
+    (corpus / "sub" / "a_copy.txt").write_bytes((corpus / "a.txt").read_bytes())
+    out = io.StringIO()
+    run_batch(_args(tmp_path, corpus, "--jobs", jobs), out=out)
+
+    recs = [json.loads(line) for line in out.getvalue().splitlines()]
+    summary = json.loads(capsys.readouterr().err.strip().splitlines()[-1])["batch_summary"]
+    assert summary["files"] == 4 and summary["processed"] == 3 and summary["skipped"] == 1
+    assert len({r["run_id"] for r in recs if not r.get("skipped")}) == 3
+
+    from gcu_v1.api.batch import open_ledger
+
+    ledger = open_ledger(tmp_path / "ledger.db")
+    assert ledger.execute("SELECT COUNT(*) FROM in_flight").fetchone()[0] == 0
+    assert ledger.execute("SELECT COUNT(*) FROM processed").fetchone()[0] == 3
+    ledger.close()
@@ -0,0 +1,127 @@
+﻿import json
+import os
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import status_store
+from gcu_v1.status_machine import ClassificationResult, InMemoryStorage, NovaPactStatusManager
+
+PENDING = ClassificationResult(confidence=0.2, hitl_required=True, approval=False)
+DONE = ClassificationResult(confidence=0.9, hitl_required=False, approval=True, admin_override=True)
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    # SQLite storage: state machines take part in the same transaction as run_status
+    monkeypatch.chdir(tmp_path)
+    mgr = NovaPactStatusManager(status_store.SQLiteMachineStorage(), leases=status_store.SQLiteReviewLeases())
+    monkeypatch.setattr(srv, "status_manager", mgr)
+    return mgr
+
+
+def _seed(mgr, run_id, result=PENDING):
+    mgr.process_classification(run_id, result, "sys", "auto", "api_key")
+    status_store.persist_run_state(run_id, str(mgr.get_status(run_id)), True, True, False, capability="c", confidence=0.2)
+
+
+async def _post(path, body):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test") as c:
+        return await c.post(path, json=body)
+
+
+def _audit_lines(run_id):
+    path = srv._governance_audit_path(run_id)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.asyncio
+async def test_bulk_review_partial_failure(manager):
+    for rid in ("a", "b", "c", "d"):
+        _seed(manager, rid)
+    _seed(manager, "approved", DONE)
+    status_store.claim_run("d", "bob", 60)
+
+    r = await _post("/review/bulk", {"actor": "alice", "role": "reviewer", "auth_type": "sso", "items": [
+        {"run_id": "a", "action": "approve"},
+        {"run_id": "b", "action": "reject", "reason": "spam"},
+        {"run_id": "c", "action": "escalate"},
+        {"run_id": "a", "action": "reject"},
+        {"run_id": "missing", "action": "approve"},
+        {"run_id": "approved", "action": "reject"},
+        {"run_id": "d", "action": "approve"},
+    ]})
+    body = r.json()
+    assert r.status_code == 200 and (body["applied"], body["failed"]) == (2, 5)
+    assert [it.get("status") or it["error_type"] for it in body["items"]] == [
+        "approved", "rejected", "invalid_action", "duplicate", "not_found", "transition", "lease",
+    ]
+    assert body["items"][-1]["holder"] == "bob"
+
+    a, b, c = (status_store.load_run_state(x) for x in "abc")
+    assert (a["status"], a["approval_provided"]) == ("approved", True)
+    assert status_store.query_review_queue("approved")[0]["capability"] == "c"
+    assert (b["status"], b["approval_provided"]) == ("rejected", False)
+    assert c["status"] == "needs_review"
+    assert [e["event"] for e in _audit_lines("a")] == ["GOV_REVIEW_ACTION"]
+    assert _audit_lines("c") == []
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def any_manager(request, monkeypatch, tmp_path):
+    # memory: the server's default; its saves are deferred until run_status commits
+    monkeypatch.chdir(tmp_path)
+    storage = status_store.SQLiteMachineStorage() if request.param == "sqlite" else InMemoryStorage()
+    mgr = NovaPactStatusManager(storage, leases=status_store.SQLiteReviewLeases(), defer=status_store.after_commit)
+    monkeypatch.setattr(srv, "status_manager", mgr)
+    return mgr
+
+
+@pytest.mark.asyncio
+async def test_bulk_review_is_one_transaction(any_manager, monkeypatch):
+    manager = any_manager
+    _seed(manager, "x")
+
+    def boom(updates):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(srv, "update_run_statuses", boom)
+    with pytest.raises(RuntimeError):
+        await _post("/review/bulk", {"actor": "alice", "role": "r", "auth_type": "sso",
+                                     "items": [{"run_id": "x", "action": "approve"}]})
+
+    # The state machine save was rolled back together with the failed run_status update
+    assert str(manager.get_status("x")) == "needs_review"
+    assert status_store.load_run_state("x")["status"] == "needs_review"
+    assert _audit_lines("x") == []
+
+    # Once run_status commits, the deferred save lands as well
+    monkeypatch.setattr(srv, "update_run_statuses", status_store.update_run_statuses)
+    await _post("/review/bulk", {"actor": "alice", "role": "r", "auth_type": "sso",
+                                 "items": [{"run_id": "x", "action": "approve"}]})
+    assert str(manager.get_status("x")) == "approved"
+    assert status_store.load_run_state("x")["status"] == "approved"
+
+
+@pytest.mark.asyncio
+async def test_bulk_admin_override(manager):
+    _seed(manager, "o1")
+    _seed(manager, "o2")
+    items = [
+        {"run_id": "o1", "target_status": "rejected", "reason": "incident"},
+        {"run_id": "o2", "target_status": "bogus", "reason": "x"},
+    ]
+
+    r = await _post("/admin/override/bulk", {"actor": "root", "role": "reviewer", "auth_type": "sso", "items": items})
+    assert r.status_code == 403
+
+    body = (await _post("/admin/override/bulk", {"actor": "root", "role": "admin", "auth_type": "sso", "items": items})).json()
+    assert [it.get("status") or it["error_type"] for it in body["items"]] == ["rejected", "invalid_target"]
+    assert status_store.load_run_state("o1")["status"] == "rejected"
+    assert [e["event"] for e in _audit_lines("o1")] == ["GOV_ADMIN_OVERRIDE"]
+
+    assert (await _post("/review/bulk", {"actor": "a", "role": "r", "auth_type": "s", "items": []})).status_code == 400
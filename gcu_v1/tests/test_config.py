@@ -0,0 +1,73 @@
+﻿import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.api.run import run_capability
+from gcu_v1.config import current_config, reload_config
+from gcu_v1.tests.test_api import _install_fake_run_module
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_snapshot_is_stamped_into_audit_and_pins_kill_switch(tmp_path, monkeypatch):
+    monkeypatch.chdir(PROJECT_ROOT)
+    monkeypatch.setenv("NP_MANIFEST_PATH", "gcu_v1/manifests/gcu_v1.json")
+    monkeypatch.setenv("GCU_KILL", "1")
+    cfg = current_config()
+    monkeypatch.delenv("GCU_KILL")  # not seen until reload
+
+    res = run_capability("doc_triage", {"text": "x"}, manifest=cfg.manifest_path, outputs=str(tmp_path))
+    assert res["status"] == "aborted"
+    audit = json.loads(Path(res["audit"]).read_text(encoding="utf-8-sig"))
+    assert audit["config_version"] == cfg.version
+
+    _, new = reload_config("test")
+    assert new.version != cfg.version and new.generation > cfg.generation
+    res = run_capability("doc_triage", {"text": "x"}, manifest=new.manifest_path, outputs=str(tmp_path))
+    assert res["status"] != "aborted"
+
+
+@pytest.mark.asyncio
+async def test_env_changes_apply_only_after_admin_reload(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"ok": true}', encoding="utf-8")
+    monkeypatch.setenv("NP_MANIFEST_PATH", str(manifest))
+    monkeypatch.setenv("NP_CAPABILITY", "np_document_triage")
+    _install_fake_run_module(monkeypatch, run_id="cfg-1", confidence=0.95)
+    body = {"capability": "np_document_triage", "payload": {"text": "x"}}
+
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        v1 = (await c.get("/debug/config")).json()["version"]
+        monkeypatch.setenv("NP_CAPABILITY", "other_capability")
+        assert (await c.post("/run", json=body)).status_code == 200
+
+        r = await c.post("/admin/config/reload")
+        assert r.json()["changed"] is True and r.json()["previous_version"] == v1
+        assert (await c.post("/run", json=body)).status_code == 400
+
+
+def test_cli_runs_reuse_one_snapshot_and_record_no_events(tmp_path, monkeypatch):
+    from gcu_v1 import config
+    from gcu_v1.api.run import build_parser, dispatch
+
+    monkeypatch.chdir(PROJECT_ROOT)
+    monkeypatch.setenv("NP_CONFIG_EVENTS_PATH", str(tmp_path / "events.jsonl"))
+    builds = []
+    real_build = config.build_config
+    monkeypatch.setattr(config, "build_config", lambda **kw: builds.append(kw) or real_build(**kw))
+
+    doc = tmp_path / "doc.txt"
+    doc.write_text("x", encoding="utf-8")
+    args = build_parser().parse_args(["--input", str(doc), "--outputs", str(tmp_path / "out")])
+    audits = [json.loads(Path(dispatch(args)["audit"]).read_text(encoding="utf-8-sig")) for _ in range(5)]
+
+    assert len(builds) == 1
+    assert len({a["config_version"] for a in audits}) == 1
+    assert not (tmp_path / "events.jsonl").exists()
+
+    reload_config("test")  # explicit loads are still recorded
+    assert (tmp_path / "events.jsonl").exists()
@@ -0,0 +1,85 @@
+﻿import json
+import os
+import socket
+import threading
+from pathlib import Path
+
+import pytest
+
+from gcu_v1.api import daemon
+from gcu_v1.api.run import build_parser
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+
+
+@pytest.fixture
+def daemon_socket(tmp_path_factory, monkeypatch):
+    monkeypatch.chdir(PROJECT_ROOT)
+    # AF_UNIX paths are length-limited; keep it short
+    path = str(tmp_path_factory.mktemp("d") / "g.sock")
+    server = daemon.make_server(path)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_forward_matches_cli_semantics(daemon_socket, tmp_path, capsys):
+    doc = tmp_path / "doc.txt"
+    doc.write_text("GDPR confidential liability audit investigation", encoding="utf-8")
+
+    args = build_parser().parse_args(["--input", str(doc), "--outputs", str(tmp_path / "out")])
+    code = daemon.forward(daemon_socket, args)
+
+    out = json.loads(capsys.readouterr().out)
+    assert code == 0
+    assert out["status"] == "ok"
+    assert Path(out["audit"]).exists()
+
+    doc.write_text("random text with no strong signals", encoding="utf-8")
+    code = daemon.forward(daemon_socket, args)
+    out = json.loads(capsys.readouterr().out)
+    assert code == 1
+    assert out["hitl"] == "human"
+
+
+def test_forward_usage_error_goes_to_stderr(daemon_socket, capsys):
+    code = daemon.forward(daemon_socket, build_parser().parse_args([]))
+    captured = capsys.readouterr()
+    assert code == 1
+    assert "Usage:" in captured.err
+    assert captured.out == ""
+
+
+def test_stale_socket_is_replaced(tmp_path_factory):
+    path = tmp_path_factory.mktemp("s") / "g.sock"
+    path.write_text("")
+    server = daemon.make_server(str(path))
+    server.server_close()
+
+
+def test_client_kill_switch_is_forwarded(daemon_socket, tmp_path, capsys, monkeypatch):
+    doc = tmp_path / "doc.txt"
+    doc.write_text("GDPR confidential liability audit investigation", encoding="utf-8")
+    args = build_parser().parse_args(["--input", str(doc), "--outputs", str(tmp_path / "out")])
+
+    # The daemon's snapshot is built (and cached) without GCU_KILL
+    monkeypatch.delenv("GCU_KILL", raising=False)
+    req = {"args": {"input": str(doc), "outputs": str(tmp_path / "out")}, "cwd": str(PROJECT_ROOT)}
+    assert daemon.handle_request(req)["result"]["status"] == "ok"
+    resp = daemon.handle_request({**req, "kill": True})
+    assert resp["exit_code"] == 1 and resp["result"]["status"] == "aborted"
+
+    # Only the client has it set
+    monkeypatch.setenv("GCU_KILL", "1")
+    code = daemon.forward(daemon_socket, args)
+    out = json.loads(capsys.readouterr().out)
+    assert code == 1
+    assert out["status"] == "aborted"
+
+
+def test_socket_is_owner_only(daemon_socket):
+    assert os.stat(daemon_socket).st_mode & 0o777 == 0o600
@@ -0,0 +1,71 @@
+﻿import json
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.api.run import run_capability
+from gcu_v1.pipeline.deadline import Deadline, DeadlineExceeded, bind_deadline, parse_deadline
+from gcu_v1.pipeline.doc_triage import CHECK_EVERY_CHARS, run_doc_triage
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_parse_deadline_earliest_wins_and_is_capped():
+    now = time.perf_counter()
+    assert parse_deadline(None, None, arrival=now) is None
+    assert parse_deadline("abc", "", arrival=now) is None
+
+    d = parse_deadline("2000", str(time.time() + 0.5), arrival=now)
+    assert 0.4 < d.remaining() <= 0.5
+
+    d = parse_deadline("60000", None, arrival=now, max_ms=100)
+    assert d.remaining() <= 0.1
+    assert parse_deadline(None, None, arrival=now, default_ms=300).remaining() <= 0.3
+
+
+def test_expired_deadline_aborts_with_audit(tmp_path, monkeypatch):
+    monkeypatch.chdir(PROJECT_ROOT)
+    with bind_deadline(Deadline.after(-0.01)):
+        res = run_capability("doc_triage", {"text": "gdpr"}, outputs=str(tmp_path))
+
+    assert res["status"] == "aborted"
+    assert res["reason"] == "deadline" and res["stage"] == "intake"
+    audit = json.loads(Path(res["audit"]).read_text(encoding="utf-8-sig"))
+    assert audit["status"] == "aborted"
+    assert any(e["type"] == "aborted" and e["detail"].startswith("deadline:") for e in audit["events"])
+
+
+def test_keyword_scan_is_abandoned_cooperatively():
+    # Few signals (like the shipped bundles) over a large document: checked per signal
+    bundle = {"keywords": {"high_risk_signals": [{"signal": f"s{i}", "weight": 0.01} for i in range(3)]}}
+    calls = []
+
+    def check():
+        calls.append(1)
+        if len(calls) >= 2:
+            raise DeadlineExceeded("classification", 0.0)
+
+    with pytest.raises(DeadlineExceeded):
+        run_doc_triage("x" * (CHECK_EVERY_CHARS + 1), bundle, check=check)
+    assert len(calls) == 2  # after lower() and after the first signal
+
+    # Many signals over a short text stay below one check's worth of scanning
+    many = {"keywords": {"high_risk_signals": [{"signal": f"s{i}", "weight": 0.01} for i in range(1000)]}}
+    calls.clear()
+    run_doc_triage("text", many, check=check)
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_run_returns_504_when_budget_is_already_spent():
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post(
+            "/run",
+            json={"capability": "np_document_triage", "payload": {"text": "x"}},
+            headers={"X-Request-Timeout-Ms": "0"},
+        )
+    assert r.status_code == 504
@@ -0,0 +1,106 @@
+﻿import json
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from gcu_v1 import config
+from gcu_v1.agents import loader
+from gcu_v1.api.run import run_capability
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+RULES = {"high_risk_signals": [{"signal": "zebra", "weight": 0.9}], "potential_risk_signals": [], "safe_signals": []}
+
+
+@pytest.fixture
+def agent_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(PROJECT_ROOT)
+    src = loader.AGENTS_DIR / "agent_01_doc_triage"
+    dst = tmp_path / "agents" / "agent_01_doc_triage"
+    shutil.copytree(src, dst)
+    (dst / "keywords.json").write_text(json.dumps(RULES), encoding="utf-8")
+    monkeypatch.setattr(loader, "AGENTS_DIR", dst.parent)
+    monkeypatch.setenv("NP_CONFIG_EVENTS_PATH", str(tmp_path / "events.jsonl"))
+    return dst
+
+
+def _events(tmp_path):
+    return [json.loads(l) for l in (tmp_path / "events.jsonl").read_text(encoding="utf-8").splitlines()]
+
+
+def test_invalid_bundle_is_rejected_and_old_snapshot_kept(agent_dir, tmp_path):
+    old = config.current_config()
+    assert old.bundles["doc_triage"]["compiled_signals"] == (("HIGH_RISK_SIGNAL", "zebra", 0.9),)
+
+    bad = {"high_risk_signals": [{"signal": 42}]}
+    (agent_dir / "keywords.json").write_text(json.dumps(bad), encoding="utf-8")
+    with pytest.raises(config.ConfigRejected) as e:
+        config.reload_config("test")
+    assert "signal: expected string" in str(e.value)
+    assert config.current_config() is old
+
+    ev = _events(tmp_path)
+    assert ev[-1]["event"] == "GOV_CONFIG_RELOAD_REJECTED"
+    assert ev[-1]["payload"]["active_version"] == ev[-1]["config_version"] == old.version
+    assert ev[-1]["run_id"] == config.CONFIG_AUDIT_RUN_ID
+
+
+def test_in_flight_run_keeps_its_bundle(agent_dir, tmp_path):
+    old = config.current_config()
+    with config.bind_config(old):
+        (agent_dir / "keywords.json").write_text(json.dumps({"safe_signals": [{"signal": "zebra", "weight": -1}]}))
+        config.reload_config("test")
+        res = run_capability("doc_triage", {"text": "a zebra"}, manifest=old.manifest_path, outputs=str(tmp_path / "o"))
+    audit = json.loads(Path(res["audit"]).read_text(encoding="utf-8-sig"))
+    assert audit["config_version"] == old.version
+    assert audit["result"]["classification"] == "high-risk"
+
+    res = run_capability("doc_triage", {"text": "a zebra"}, manifest=old.manifest_path, outputs=str(tmp_path / "o"))
+    audit = json.loads(Path(res["audit"]).read_text(encoding="utf-8-sig"))
+    assert audit["config_version"] == config.current_config().version != old.version
+    assert audit["result"]["classification"] == "non-risk"
+    assert _events(tmp_path)[-1]["event"] == "GOV_CONFIG_RELOAD"
+
+
+def test_watcher_reloads_on_file_change(agent_dir, tmp_path):
+    old = config.current_config()
+    w = config.ConfigWatcher(dirs=[str(agent_dir)], debounce_ms=50).start()
+    try:
+        time.sleep(0.3)
+        (agent_dir / "keywords.json").write_text(json.dumps({**RULES, "safe_signals": [{"signal": "x", "weight": -0.1}]}))
+        deadline = time.time() + 5
+        while config.current_config() is old and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        w.stop()
+    new = config.current_config()
+    assert new.version != old.version
+    assert any(p.endswith("keywords.json") for p in _events(tmp_path)[-1]["payload"]["changed"])
+
+
+@pytest.mark.asyncio
+async def test_reloads_are_in_the_governance_audit_trail(tmp_path, monkeypatch):
+    import httpx
+
+    import gcu_v1.api.server as srv
+    from gcu_v1.persistence import audit_index
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("NP_CONFIG_EVENTS_PATH", raising=False)
+    monkeypatch.setenv("NP_AUDIT_INDEX", "1")
+    monkeypatch.setenv("NP_CONFIG_WATCH", "0")
+    _, first = config.reload_config("startup")
+    monkeypatch.setenv("NP_CONFIDENCE_THRESHOLD", "0.6")
+    _, second = config.reload_config("admin")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test") as c:
+        trail = (await c.get(f"/debug/audit/{config.CONFIG_AUDIT_RUN_ID}")).json()["audit_trail"]
+    assert [(e["event"], e["config_version"]) for e in trail][-2:] == [
+        ("GOV_CONFIG_RELOAD", first.version), ("GOV_CONFIG_RELOAD", second.version),
+    ]
+    assert trail[-1]["payload"]["previous_version"] == first.version
+
+    items, _ = audit_index.search(event="GOV_CONFIG_RELOAD", reason="admin")
+    assert [it["run_id"] for it in items] == [config.CONFIG_AUDIT_RUN_ID]
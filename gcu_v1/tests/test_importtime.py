@@ -0,0 +1,25 @@
+﻿from gcu_v1.bench import importtime
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       300 |        420 |   encodings
+import time:      1000 |       1420 | gcu_v1.api.run
+"""
+
+
+def test_parse_importtime_rows_and_depth():
+    rows = importtime.parse_importtime(SAMPLE)
+    assert [r["module"] for r in rows] == ["_io", "encodings", "gcu_v1.api.run"]
+    assert [r["depth"] for r in rows] == [2, 1, 0]
+    assert rows[-1]["cumulative_us"] == 1420
+
+
+def test_measure_real_interpreter_and_compare():
+    res = importtime.measure("gcu_v1.pipeline.deadline", repeats=1)
+    assert res["total_us"] > 0
+    assert any(r["module"] == "prometheus_client" for r in res["modules"])
+    assert "gcu_v1.pipeline.deadline" in importtime.format_table(res, prefix="gcu_v1")
+
+    cur = {"results": {"m": {"total_us": 1300}}}
+    rows = importtime.compare(cur, {"results": {"m": {"total_us": 1000}}}, tolerance=0.25)
+    assert rows[0]["regression"] is True
@@ -0,0 +1,43 @@
+﻿import json
+
+import pytest
+
+from gcu_v1.bench import loadtest
+from gcu_v1.bench._stats import percentile
+
+
+def _corpus(tmp_path):
+    p = tmp_path / "corpus.jsonl"
+    p.write_text(
+        json.dumps({"method": "GET", "path": "/health"}) + "\n"
+        + json.dumps({"capability": "wrong_capability", "payload": {"text": "x"}}) + "\n",
+        encoding="utf-8",
+    )
+    return loadtest.load_corpus(p)
+
+
+def test_percentile_nearest_rank():
+    data = [float(i) for i in range(1, 101)]
+    assert percentile(data, 50) == 50.0
+    assert percentile(data, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_closed_loop_reports_per_endpoint(tmp_path):
+    report = await loadtest.run_load(_corpus(tmp_path), requests=20, concurrency=4, warmup=2)
+
+    health = report["endpoints"]["GET /health"]
+    run = report["endpoints"]["POST /run"]
+    assert health["latency_s"]["count"] == 10
+    assert health["error_rate"] == 0.0
+    assert run["status_codes"] == {"400": 10}
+    assert report["overall"]["error_rate"] == 0.5
+    assert "TOTAL" in loadtest.format_report(report)
+
+
+@pytest.mark.asyncio
+async def test_open_loop_mode(tmp_path):
+    report = await loadtest.run_load(_corpus(tmp_path), requests=10, rate=500.0, poisson=True)
+    assert report["config"]["mode"] == "open"
+    assert report["overall"]["latency_s"]["count"] == 10
@@ -0,0 +1,84 @@
+﻿import logging
+import queue
+import json
+
+import pytest
+
+from gcu_v1 import logsetup
+from gcu_v1.logsetup import DebugSampler, JsonFormatter, Lazy
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self.setFormatter(JsonFormatter())
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+
+@pytest.fixture
+def collect(monkeypatch):
+    monkeypatch.setenv("NP_LOG_LEVEL", "INFO")
+    monkeypatch.setenv("NP_LOG_LEVELS", "gcu_test.verbose=DEBUG")
+    h = _Collect()
+    listener = logsetup.configure_logging(handler=h)
+    yield h, listener
+    listener.stop()
+    logsetup.configure_logging()  # back to the default stderr pipeline
+    logging.getLogger("gcu_test.verbose").setLevel(logging.NOTSET)
+
+
+def test_json_records_via_listener_with_lazy_extras(collect):
+    h, listener = collect
+    calls = []
+
+    def expensive():
+        calls.append(1)
+        return {"k": "v"}
+
+    logging.getLogger("gcu_test.quiet").debug("dropped", extra={"x": Lazy(expensive)})
+    logging.getLogger("gcu_test.verbose").debug("kept %s", "arg", extra={"x": Lazy(expensive)})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("gcu_test.quiet").error("failed", exc_info=True)
+    listener.stop()  # drains the queue
+
+    assert [r["msg"] for r in h.lines] == ["kept arg", "failed"]
+    assert h.lines[0]["x"] == {"k": "v"} and h.lines[0]["level"] == "DEBUG"
+    assert "ValueError: boom" in h.lines[1]["exc"]
+    assert calls == [1]  # only resolved for the record that was emitted
+    listener.start()
+
+
+def test_debug_sampler_keeps_share_and_whole_keys():
+    s = DebugSampler(0.25)
+    rec = lambda level, **kw: logging.makeLogRecord({"levelno": level, **kw})
+
+    assert s.filter(rec(logging.INFO))
+    kept = sum(s.filter(rec(logging.DEBUG)) for _ in range(100))
+    assert kept == 25
+    for key in ("run-a", "run-b", "run-c"):
+        first = s.filter(rec(logging.DEBUG, sample_key=key))
+        assert all(s.filter(rec(logging.DEBUG, sample_key=key)) == first for _ in range(5))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    q = queue.Queue(maxsize=1)
+    h = logsetup._BoundedQueueHandler(q)
+    before = logsetup.LOG_RECORDS_DROPPED_TOTAL.labels(reason="queue_full")._value.get()
+    for i in range(3):
+        h.handle(logging.makeLogRecord({"msg": f"m{i}", "levelno": logging.INFO}))
+    assert q.qsize() == 1
+    assert logsetup.LOG_RECORDS_DROPPED_TOTAL.labels(reason="queue_full")._value.get() == before + 2
+
+
+def test_uvicorn_level_follows_np_log_level(monkeypatch):
+    monkeypatch.delenv("NP_LOG_LEVEL", raising=False)
+    assert logsetup.uvicorn_log_level() == "info"
+    monkeypatch.setenv("NP_LOG_LEVEL", "warn")
+    assert logsetup.uvicorn_log_level() == "warning"
+    monkeypatch.setenv("NP_LOG_LEVEL", "NOTSET")
+    assert logsetup.uvicorn_log_level() == "debug"
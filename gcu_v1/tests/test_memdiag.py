@@ -0,0 +1,60 @@
+﻿import httpx
+import pytest
+import pytest_asyncio
+
+import gcu_v1.api.server as srv
+from gcu_v1.api import memdiag
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("NP_DEBUG_MEMORY", "1")
+    monkeypatch.setenv("NP_MEMORY_SNAPSHOT_DIR", str(tmp_path / "mem"))
+    monkeypatch.setenv("NP_MEMORY_MAX_SNAPSHOTS", "2")
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+    memdiag.stop()
+
+
+@pytest.mark.asyncio
+async def test_memory_disabled_by_default(client, monkeypatch):
+    monkeypatch.delenv("NP_DEBUG_MEMORY")
+    r = await client.get("/debug/memory")
+    assert r.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_snapshot_diff_and_retention(client):
+    assert (await client.post("/debug/memory/snapshot/a")).status_code == 400  # not tracing
+
+    r = await client.post("/debug/memory/start", params={"frames": 5})
+    assert r.json()["tracing"] is True
+
+    assert (await client.post("/debug/memory/snapshot/a")).status_code == 200
+    hoard = [bytearray(1024) for _ in range(2000)]
+    assert (await client.post("/debug/memory/snapshot/b")).status_code == 200
+
+    d = await client.get("/debug/memory/diff", params={"a": "a", "b": "b", "top": 5})
+    assert d.status_code == 200
+    assert d.json()["total_size_diff"] > 1024 * 1000
+    assert d.json()["top"][0]["file"].endswith("test_memdiag.py")
+    del hoard
+
+    await client.post("/debug/memory/snapshot/c")
+    names = [s["name"] for s in (await client.get("/debug/memory")).json()["snapshots"]]
+    assert names == ["b", "c"]
+
+    assert (await client.get("/debug/memory/diff", params={"a": "a", "b": "c"})).status_code == 404
+    assert (await client.post("/debug/memory/snapshot/..%2Fx")).status_code in (400, 404)
+
+
+@pytest.mark.asyncio
+async def test_project_object_counts(client):
+    from gcu_v1.status_machine import StatusStateMachine
+
+    keep = StatusStateMachine()
+    j = (await client.get("/debug/memory")).json()
+    assert j["project_objects"]["gcu_v1.status_machine.StatusStateMachine"] >= 1
+    assert any(m["metric"].startswith("gcu_") for m in j["prometheus_series"])
+    assert keep is not None
@@ -0,0 +1,18 @@
+﻿from gcu_v1.bench import pipeline_bench
+
+
+def test_suite_runs_selected_cases():
+    report = pipeline_bench.run_suite(select="StatusStateMachine", repeats=1, min_time=0.001)
+    names = set(report["results"])
+    assert "StatusStateMachine.to_dict[history=1000]" in names
+    assert all(r["median_s"] > 0 for r in report["results"].values())
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    base = {"results": {"a": {"median_s": 1.0}, "b": {"median_s": 1.0}}}
+    cur = {"results": {"a": {"median_s": 1.1}, "b": {"median_s": 1.3}, "new": {"median_s": 9.0}}}
+
+    rows = {r["case"]: r for r in pipeline_bench.compare(cur, base, tolerance=0.15)}
+    assert set(rows) == {"a", "b"}
+    assert rows["a"]["regression"] is False
+    assert rows["b"]["regression"] is True
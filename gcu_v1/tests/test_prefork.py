@@ -0,0 +1,141 @@
+﻿import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.api import prefork
+from gcu_v1.bench.prefork_rss import _children, _free_port, _wait_healthy
+from gcu_v1.persistence.status_store import SQLiteMachineStorage
+from gcu_v1.status_machine import ClassificationResult, InMemoryStorage, NovaPactStatusManager, SystemStatus
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+needs_proc = pytest.mark.skipif(
+    not hasattr(os, "fork") or not os.path.exists("/proc/self/smaps_rollup"), reason="needs fork and Linux /proc"
+)
+
+
+def test_sqlite_storage_is_shared_between_managers():
+    # Two managers = two workers: the review lands on the one that did not classify
+    a = NovaPactStatusManager(SQLiteMachineStorage())
+    b = NovaPactStatusManager(SQLiteMachineStorage())
+    result = ClassificationResult(confidence=0.2, hitl_required=True, approval=False)
+
+    assert a.process_classification("r-1", result, actor="sys", role="auto", auth_type="api_key") == SystemStatus.NEEDS_REVIEW
+    assert b.manual_review_action("r-1", "approve", actor="rev", role="reviewer", auth_type="sso") == SystemStatus.APPROVED
+    assert a.get_status("r-1") == SystemStatus.APPROVED
+    assert [t["to"] for t in a.get_audit_trail("r-1")] == ["approved"]
+
+    SQLiteMachineStorage().delete("r-1")
+    assert not SQLiteMachineStorage().exists("r-1")
+
+
+def test_multiple_workers_refuse_in_memory_storage(monkeypatch):
+    monkeypatch.setattr(srv, "status_manager", NovaPactStatusManager(InMemoryStorage()))
+    prefork.check_shared_state(1)
+    with pytest.raises(SystemExit, match="NP_STATE_STORAGE=sqlite"):
+        prefork.check_shared_state(2)
+
+    monkeypatch.setattr(srv, "status_manager", NovaPactStatusManager(SQLiteMachineStorage()))
+    prefork.check_shared_state(4)
+
+
+@needs_proc
+def test_read_memory_reports_own_process():
+    mem = prefork.read_memory(os.getpid())
+    assert mem["rss_kb"] > 0
+    assert 0 < mem["pss_kb"] <= mem["rss_kb"]
+    assert mem["private_kb"] + mem["shared_kb"] == pytest.approx(mem["rss_kb"], abs=64)
+
+
+@needs_proc
+def test_master_serves_restarts_and_stops(tmp_path):
+    port = _free_port()
+    env = {**os.environ, "PYTHONPATH": str(PROJECT_ROOT), "NP_LOG_LEVEL": "WARNING"}
+    env.pop("NP_STATE_STORAGE", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gcu_v1.api.prefork", "--workers", "2", "--port", str(port),
+         "--no-watch", "--graceful-timeout", "5"],
+        cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_healthy(port, 30)
+        first = set(_children(proc.pid))
+        assert len(first) == 2
+
+        proc.send_signal(signal.SIGHUP)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            current = set(_children(proc.pid))
+            if len(current) == 2 and not current & first:
+                break
+            time.sleep(0.2)
+        assert len(current) == 2 and not current & first
+        assert httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200
+
+        # The SQLite state DB is what the workers share
+        assert (tmp_path / "gcu_v1" / "state" / "gcu_state.db").exists()
+    finally:
+        proc.terminate()
+        assert proc.wait(timeout=30) == 0
+
+
+def test_crashed_worker_is_respawned_from_the_loop_without_blocking(monkeypatch):
+    m = prefork.Master(prefork.PreforkOptions(workers=1))
+    m.workers[4242] = time.monotonic()  # died right after start: crash backoff
+    exits = iter([(4242, 256), (0, 0)])
+    monkeypatch.setattr(prefork.os, "waitpid", lambda *a: next(exits))
+
+    t0 = time.monotonic()
+    m.reap()
+    assert time.monotonic() - t0 < 0.1  # no inline sleep / wait for readiness
+    assert m._backoff == 0.5 and len(m._respawn_at) == 1
+
+    r, w = os.pipe()
+
+    def _spawn():
+        m.workers[4343] = time.monotonic()
+        return 4343, r
+
+    monkeypatch.setattr(m, "spawn", _spawn)
+    m.respawn_due()
+    assert 4343 not in m.workers  # backoff not over yet
+
+    m._respawn_at = [0.0, 0.0]  # due; the second one would exceed --workers
+    m.respawn_due()
+    assert list(m.workers) == [4343] and m._starting == {r: 4343} and m._respawn_at == []
+
+    os.write(w, b"r")
+    os.close(w)
+    m._poll_starting()
+    assert m._starting == {}
+
+
+_FAILING_LIFESPAN = """
+import os
+from gcu_v1.api import prefork
+import gcu_v1.api.server as srv
+
+def _boom():
+    raise RuntimeError("db down")
+
+srv.init_db = _boom
+r, w = os.pipe()
+code = prefork._worker_main(prefork.bind_socket("127.0.0.1", 0), prefork.PreforkOptions(log_level="critical"), w)
+print(os.read(r, 1), code)
+"""
+
+
+@needs_proc
+def test_worker_with_failed_lifespan_never_reports_ready(tmp_path):
+    env = {**os.environ, "PYTHONPATH": str(PROJECT_ROOT), "NP_LOG_LEVEL": "CRITICAL"}
+    out = subprocess.run(
+        [sys.executable, "-c", _FAILING_LIFESPAN], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert out.stdout.split() == ["b''", "1"]
@@ -0,0 +1,66 @@
+﻿import threading
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+
+import gcu_v1.api.server as srv
+from gcu_v1.api import profiler
+
+
+@pytest_asyncio.fixture
+async def client():
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_profile_disabled_by_default(client, monkeypatch):
+    monkeypatch.delenv("NP_DEBUG_PROFILE", raising=False)
+    r = await client.get("/debug/profile", params={"seconds": 0.05})
+    assert r.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_profile_returns_top_table_and_collapsed_stacks(client, monkeypatch):
+    monkeypatch.setenv("NP_DEBUG_PROFILE", "1")
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    t = threading.Thread(target=busy_worker, name="busy-worker", daemon=True)
+    t.start()
+    try:
+        r = await client.get("/debug/profile", params={"seconds": 0.2, "interval_ms": 5})
+        c = await client.get("/debug/profile", params={"seconds": 0.05, "format": "collapsed"})
+    finally:
+        stop.set()
+
+    assert r.status_code == 200
+    j = r.json()
+    assert j["samples"] > 0
+    assert any("busy_worker" in row["function"] for row in j["top"])
+    assert "busy-worker;" in j["collapsed"]
+    assert c.status_code == 200
+    assert c.text.strip().split("\n")[0].rsplit(" ", 1)[1].isdigit()
+
+
+@pytest.mark.asyncio
+async def test_only_one_profile_at_a_time(client, monkeypatch):
+    monkeypatch.setenv("NP_DEBUG_PROFILE", "1")
+    profiler._busy.acquire()
+    try:
+        r = await client.get("/debug/profile", params={"seconds": 0.05})
+    finally:
+        profiler._busy.release()
+    assert r.status_code == 409
+
+
+def test_duration_is_capped(monkeypatch):
+    monkeypatch.setenv("NP_PROFILE_MAX_SECONDS", "0.05")
+    prof = profiler.profile(60, 0.005)
+    assert prof["seconds"] < 1.0
@@ -0,0 +1,114 @@
+﻿import threading
+import time
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import status_store
+from gcu_v1.status_machine import ClassificationResult, NovaPactStatusManager, ReviewLeaseError
+from gcu_v1.tests.test_api import _install_fake_run_module
+
+
+def _pending(n, prefix="p"):
+    for i in range(n):
+        status_store.persist_run_state(f"{prefix}{i:03d}", "needs_review", True, True, False, capability="doc_triage", confidence=0.3)
+
+
+def _client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=srv.app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_claim_conflict_extend_and_release():
+    _pending(1)
+    status_store.persist_run_state("done", "ok", False, True, False)
+    async with _client() as c:
+        r = await c.post("/review/p000/claim", json={"actor": "alice", "ttl_s": 60})
+        assert r.status_code == 200 and r.json()["holder"] == "alice"
+
+        r = await c.post("/review/p000/claim", json={"actor": "bob"})
+        assert r.status_code == 409 and r.json()["detail"]["lease"]["holder"] == "alice"
+
+        again = await c.post("/review/p000/claim", json={"actor": "alice", "ttl_s": 120})
+        assert again.status_code == 200 and again.json()["ttl_s"] > 60
+
+        assert (await c.post("/review/missing/claim", json={"actor": "bob"})).status_code == 404
+        assert (await c.post("/review/done/claim", json={"actor": "bob"})).status_code == 409
+
+        assert (await c.post("/review/p000/release", json={"actor": "bob"})).json()["released"] is False
+        assert (await c.post("/review/p000/release", json={"actor": "alice"})).json()["released"] is True
+        assert (await c.post("/review/p000/claim", json={"actor": "bob"})).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_review_is_reserved_for_lease_holder(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"ok": true}', encoding="utf-8")
+    monkeypatch.setenv("NP_MANIFEST_PATH", str(manifest))
+    _install_fake_run_module(monkeypatch, run_id="lease-1", confidence=0.2)
+    body = {"action": "approve", "role": "reviewer", "auth_type": "sso"}
+
+    async with _client() as c:
+        assert (await c.post("/run", json={"capability": "np_document_triage", "payload": {"text": "x"}})).status_code == 200
+        assert (await c.post("/review/lease-1/claim", json={"actor": "alice"})).status_code == 200
+
+        r = await c.post("/review/lease-1", json={**body, "actor": "bob"})
+        assert r.status_code == 409 and r.json()["detail"]["holder"] == "alice"
+
+        assert (await c.post("/review/lease-1", json={**body, "actor": "alice"})).status_code == 200
+    assert status_store.active_lease("lease-1") is None
+
+
+def test_claim_next_hands_out_each_run_once_under_contention():
+    _pending(60)
+    got, lock = [], threading.Lock()
+
+    def worker(name):
+        for _ in range(3):
+            leases = status_store.claim_next(name, 4, 60)
+            with lock:
+                got.extend(l["run_id"] for l in leases)
+
+    threads = [threading.Thread(target=worker, args=(f"r{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(got) == len(set(got)) == 60
+    assert status_store.claim_next("late", 5, 60) == []
+
+
+@pytest.mark.asyncio
+async def test_claim_next_is_oldest_first_and_skips_claimed():
+    _pending(5)
+    status_store.claim_run("p000", "alice", 60)
+    async with _client() as c:
+        r = await c.post("/review/claim-next", json={"actor": "bob", "n": 2})
+        assert [l["run_id"] for l in r.json()["items"]] == ["p001", "p002"]
+        queue = (await c.get("/review/queue", params={"unclaimed": "true"})).json()
+        assert [it["run_id"] for it in queue["items"]] == ["p003", "p004"]
+        assert (await c.post("/review/claim-next", json={"actor": "bob", "n": 0})).status_code == 400
+
+
+def test_expired_leases_are_reclaimable_and_reaped():
+    _pending(3)
+    assert len(status_store.claim_next("alice", 3, 0.05)) == 3
+    time.sleep(0.1)
+    assert status_store.active_lease("p000") is None
+    assert status_store.claim_run("p000", "bob", 60)["holder"] == "bob"
+
+    assert status_store.reap_expired_leases(batch=1) == 2
+    assert status_store.active_lease("p000")["holder"] == "bob"
+
+
+def test_manager_can_require_a_lease():
+    mgr = NovaPactStatusManager(status_store.SQLiteMachineStorage(), leases=status_store.SQLiteReviewLeases(), require_lease=True)
+    mgr.process_classification("m1", ClassificationResult(confidence=0.1, hitl_required=True, approval=False), "sys", "auto", "api_key")
+    status_store.persist_run_state("m1", "needs_review", True, True, False)
+
+    with pytest.raises(ReviewLeaseError):
+        mgr.manual_review_action("m1", "reject", actor="alice", role="reviewer", auth_type="sso")
+    status_store.claim_run("m1", "alice", 60)
+    assert str(mgr.manual_review_action("m1", "reject", actor="alice", role="reviewer", auth_type="sso")) == "rejected"
@@ -0,0 +1,108 @@
+﻿import sqlite3
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import status_store
+from gcu_v1.tests.test_api import _install_fake_run_module
+
+
+def _seed(rows):
+    # rows: (run_id, status, capability, confidence, age_s)
+    now = datetime.utcnow()
+    with status_store.get_conn() as c:
+        c.executemany(
+            "INSERT INTO run_status (run_id, status, hitl_required, approval_required, approval_provided, "
+            "updated_at, capability, confidence) VALUES (?, ?, 1, 1, 0, ?, ?, ?)",
+            [(rid, st, (now - timedelta(seconds=age)).isoformat(), cap, conf) for rid, st, cap, conf, age in rows],
+        )
+
+
+async def _get(params):
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.get("/review/queue", params=params)
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_cover_queue_oldest_first():
+    _seed([(f"r{i}", "needs_review", "doc_triage", 0.5, 100 - i) for i in range(5)] + [("done", "ok", "doc_triage", 0.9, 500)])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = (await _get(params)).json()
+        seen += [it["run_id"] for it in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["r0", "r1", "r2", "r3", "r4"]
+    assert page["items"][-1]["age_s"] == pytest.approx(96, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_filters_capability_confidence_band_and_age():
+    _seed([
+        ("a", "needs_review", "doc_triage", 0.10, 7200),
+        ("b", "needs_review", "doc_triage", 0.60, 3600),
+        ("c", "needs_review", "other", 0.60, 3600),
+        ("d", "needs_review", "doc_triage", 0.70, 60),
+    ])
+
+    ids = lambda r: [it["run_id"] for it in r.json()["items"]]
+    assert ids(await _get({"capability": "doc_triage"})) == ["a", "b", "d"]
+    assert ids(await _get({"min_confidence": 0.5, "max_confidence": 0.7})) == ["b", "c"]
+    assert ids(await _get({"min_age_s": 1800})) == ["a", "b", "c"]
+    assert ids(await _get({"max_age_s": 4000, "capability": "doc_triage"})) == ["b", "d"]
+    assert (await _get({"cursor": "not-a-cursor"})).status_code == 400
+    assert (await _get({"status": "bogus"})).status_code == 400
+
+
+def test_queue_queries_use_index_without_sort():
+    with status_store.get_conn() as c:
+        for filters in (
+            {},
+            {"capability": "x", "after": ("2026-01-01", "r"), "min_confidence": 0.2},
+            {"updated_before": "2026-01-01", "max_confidence": 0.5},
+            {"unleased_at": 1.0e9, "capability": "x"},
+        ):
+            sql, params = status_store.review_queue_sql(**filters)
+            plan = " | ".join(r[3] for r in c.execute("EXPLAIN QUERY PLAN " + sql, params))
+            assert "INDEX idx_run_status_queue" in plan, plan
+            assert "TEMP B-TREE" not in plan and "SCAN" not in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_run_records_capability_and_review_keeps_it(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"ok": true}', encoding="utf-8")
+    monkeypatch.setenv("NP_MANIFEST_PATH", str(manifest))
+    _install_fake_run_module(monkeypatch, run_id="rq-1", confidence=0.3)
+
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        assert (await c.post("/run", json={"capability": "np_document_triage", "payload": {"text": "x"}})).status_code == 200
+        item = (await c.get("/review/queue")).json()["items"][0]
+        assert (item["run_id"], item["capability"], item["confidence"]) == ("rq-1", "np_document_triage", 0.3)
+
+        body = {"action": "approve", "actor": "rev", "role": "reviewer", "auth_type": "sso"}
+        assert (await c.post("/review/rq-1", json=body)).status_code == 200
+        assert (await c.get("/review/queue")).json()["items"] == []
+        assert (await c.get("/review/queue", params={"status": "approved"})).json()["items"][0]["capability"] == "np_document_triage"
+
+
+def test_init_db_migrates_pre_queue_schema(tmp_path, monkeypatch):
+    db = tmp_path / "old.db"
+    with sqlite3.connect(db) as c:
+        c.execute(
+            "CREATE TABLE run_status (run_id TEXT PRIMARY KEY, status TEXT NOT NULL, hitl_required INTEGER NOT NULL, "
+            "approval_required INTEGER NOT NULL, approval_provided INTEGER NOT NULL, updated_at TEXT NOT NULL)"
+        )
+        c.execute("INSERT INTO run_status VALUES ('old', 'needs_review', 1, 1, 0, '2026-01-01T00:00:00')")
+    monkeypatch.setattr(status_store, "DB_PATH", db)
+
+    status_store.init_db()
+    assert status_store.query_review_queue()[0]["run_id"] == "old"
+    assert status_store.query_review_queue()[0]["capability"] is None
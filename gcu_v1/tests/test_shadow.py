@@ -0,0 +1,121 @@
+﻿import json
+import os
+import threading
+
+import pytest
+
+from gcu_v1.agents import loader
+from gcu_v1.pipeline import shadow
+from gcu_v1.pipeline.doc_triage import run_doc_triage
+
+
+def _bundle(signals):
+    return {
+        "capability": "doc_triage",
+        "keywords": {"high_risk_signals": [{"signal": s, "weight": 0.8} for s in signals]},
+    }
+
+
+def _counter(outcome: str) -> float:
+    return shadow.SHADOW_EVALUATIONS_TOTAL.labels(capability="doc_triage", outcome=outcome)._value.get()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_pool():
+    yield
+    shadow.shutdown_shadow(wait=True)
+
+
+def test_shadow_disagreement_is_recorded_but_primary_unchanged():
+    before = _counter("disagree")
+
+    primary = run_doc_triage("geldwäsche verdacht", _bundle(["geldwäsche"]))
+    fut = shadow.submit_shadow("geldwäsche verdacht", primary, _bundle(["nichts"]), sample_rate=1.0)
+
+    out = fut.result(timeout=5)
+    assert out["agree"] is False
+    assert out["score_delta"] < 0
+    assert primary["classification"] == "high-risk"
+    assert _counter("disagree") == before + 1
+
+
+def test_shadow_sample_rate_zero_skips():
+    primary = run_doc_triage("x", _bundle([]))
+    assert shadow.submit_shadow("x", primary, _bundle([]), sample_rate=0.0) is None
+
+
+def test_shadow_drops_when_pool_saturated(monkeypatch):
+    monkeypatch.setenv("NP_SHADOW_MAX_PENDING", "1")
+    monkeypatch.setenv("NP_SHADOW_WORKERS", "1")
+    gate = threading.Event()
+
+    real_run = shadow.run_doc_triage
+
+    def _blocking(*a, **kw):
+        gate.wait(5)
+        return real_run(*a, **kw)
+
+    monkeypatch.setattr(shadow, "run_doc_triage", _blocking)
+    before = _counter("dropped")
+
+    primary = run_doc_triage("x", _bundle([]))
+    first = shadow.submit_shadow("x", primary, _bundle([]), sample_rate=1.0)
+    second = shadow.submit_shadow("x", primary, _bundle([]), sample_rate=1.0)
+    gate.set()
+
+    assert first is not None
+    assert second is None
+    assert _counter("dropped") == before + 1
+    assert first.result(timeout=5)["agree"] is True
+
+
+def test_load_shadow_bundle_disabled_and_broken(tmp_path):
+    assert loader.load_shadow_bundle("doc_triage", "") is None
+    assert loader.load_shadow_bundle("doc_triage", str(tmp_path / "missing")) is None
+
+    for name in ("manifest.json", "policy.json", "schema.json"):
+        (tmp_path / name).write_text("{}", encoding="utf-8")
+    (tmp_path / "keywords.json").write_text(json.dumps({"high_risk_signals": []}), encoding="utf-8")
+
+    b = loader.load_shadow_bundle("doc_triage", str(tmp_path))
+    assert b["shadow"] is True
+    assert loader.load_shadow_bundle("doc_triage", str(tmp_path)) is b
+
+    # Any bundle file invalidates the cache, not only keywords.json
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"confidence_threshold": 0.5}', encoding="utf-8")
+    st = manifest.stat()
+    os.utime(manifest, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    b2 = loader.load_shadow_bundle("doc_triage", str(tmp_path))
+    assert b2 is not b and b2["manifest"] == {"confidence_threshold": 0.5}
+
+
+def test_shadow_dir_comes_from_config_snapshot(monkeypatch, tmp_path):
+    from gcu_v1.config import reload_config
+
+    monkeypatch.setenv("NP_SHADOW_BUNDLE_DIR", str(tmp_path / "missing"))
+    _, cfg = reload_config("test")
+    assert cfg.shadow_bundle_dir == str(tmp_path / "missing")
+    monkeypatch.delenv("NP_SHADOW_BUNDLE_DIR")
+    reload_config("test")
+
+
+def test_shadow_bundle_is_compiled_into_the_snapshot_and_failures_log_once(monkeypatch, tmp_path, caplog):
+    from gcu_v1.config import current_config
+
+    monkeypatch.setenv("NP_SHADOW_BUNDLE_DIR", str(tmp_path))
+    with caplog.at_level("WARNING", logger=loader.__name__):
+        assert loader.load_shadow_bundle("doc_triage", str(tmp_path)) is None
+        assert loader.load_shadow_bundle("doc_triage", str(tmp_path)) is None
+    assert len(caplog.records) == 1  # cached until the files change
+
+    for name in ("manifest.json", "policy.json", "schema.json"):
+        (tmp_path / name).write_text("{}", encoding="utf-8")
+    (tmp_path / "keywords.json").write_text(json.dumps({"high_risk_signals": []}), encoding="utf-8")
+    monkeypatch.setitem(loader._CAPABILITY_MAP, "other_triage", "agent_01_doc_triage")
+    cfg = current_config()
+    assert cfg.shadow_sample_rate == 0.1
+    assert {c: b["capability"] for c, b in cfg.shadow_bundles.items()} == {
+        "doc_triage": "doc_triage", "other_triage": "other_triage",
+    }
+    assert loader.load_shadow_bundle("doc_triage") is cfg.shadow_bundles["doc_triage"]
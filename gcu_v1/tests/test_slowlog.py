@@ -0,0 +1,69 @@
+﻿import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+import gcu_v1.api.server as srv
+from gcu_v1.api.slowlog import SlowRequestLog
+from gcu_v1.pipeline.tracing import Tracer
+from gcu_v1.tests.test_api import _install_fake_run_module
+
+
+@pytest_asyncio.fixture
+async def client(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"ok": true}', encoding="utf-8")
+    monkeypatch.setenv("NP_MANIFEST_PATH", str(manifest))
+    monkeypatch.setenv("NP_CAPABILITY", "np_document_triage")
+
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_slow_run_writes_fingerprint_record_without_payload(client, monkeypatch, tmp_path):
+    log_path = tmp_path / "slow.jsonl"
+    monkeypatch.setenv("NP_SLOW_REQUEST_MS", "0.001")  # the server takes the threshold from the snapshot
+    monkeypatch.setattr(srv, "slow_log", SlowRequestLog(threshold_ms=0.0, path=str(log_path)))
+    _install_fake_run_module(monkeypatch, run_id="slow-1", confidence=0.95, status="ok")
+
+    r = await client.post("/run", json={
+        "capability": "np_document_triage",
+        "payload": {"text": "TOP-SECRET-PAYLOAD"},
+    })
+    assert r.status_code == 200
+
+    raw = log_path.read_text(encoding="utf-8")
+    assert "TOP-SECRET-PAYLOAD" not in raw
+    rec = json.loads(raw.strip().splitlines()[-1])
+    assert rec["run_id"] == "slow-1"
+    assert rec["path"] == "/run"
+    assert rec["queue_wait_ms"] >= 0
+    assert "gov_db" in rec["stages_ms"]
+    assert rec["db_ms"] >= 0 and rec["file_io_ms"] >= 0
+
+
+def test_slow_log_is_rate_limited(tmp_path):
+    log = SlowRequestLog(threshold_ms=1.0, path=str(tmp_path / "s.jsonl"), max_per_min=2)
+    t = Tracer("x")
+    kw = dict(queue_wait_s=0.0, path="/run", status="ok", run_id="r", tracer=t)
+
+    assert log.maybe_record(total_s=0.0001, **kw) is None  # below threshold
+    assert log.maybe_record(total_s=1.0, **kw) is not None
+    assert log.maybe_record(total_s=1.0, **kw) is not None
+    assert log.maybe_record(total_s=1.0, **kw) is None
+    assert len((tmp_path / "s.jsonl").read_text(encoding="utf-8").splitlines()) == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_log_off_in_snapshot_writes_nothing(client, monkeypatch, tmp_path):
+    log_path = tmp_path / "slow.jsonl"
+    monkeypatch.setenv("NP_SLOW_REQUEST_MS", "0")
+    monkeypatch.setattr(srv, "slow_log", SlowRequestLog(threshold_ms=0.001, path=str(log_path)))
+    _install_fake_run_module(monkeypatch, run_id="slow-2", confidence=0.95, status="ok")
+
+    r = await client.post("/run", json={"capability": "np_document_triage", "payload": {"text": "x"}})
+    assert r.status_code == 200
+    assert not log_path.exists()
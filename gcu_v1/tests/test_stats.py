@@ -0,0 +1,90 @@
+﻿import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import backfill_rollup, status_store
+
+
+def _group_by(c, hour_from="0000", hour_to="9999"):
+    return sorted(c.execute(
+        "SELECT substr(updated_at, 1, 13), COALESCE(capability, ''), status, hitl_required, COUNT(*) "
+        "FROM run_status WHERE substr(updated_at, 1, 13) BETWEEN ? AND ? GROUP BY 1, 2, 3, 4",
+        (hour_from, hour_to),
+    ).fetchall())
+
+
+def _rollup(c):
+    return sorted(c.execute("SELECT hour, capability, status, hitl_required, n FROM run_status_rollup").fetchall())
+
+
+def test_rollup_tracks_every_write_path():
+    status_store.persist_run_state("a", "needs_review", True, True, False, capability="triage")
+    status_store.persist_run_state("b", "ok", False, False, False)
+    status_store.persist_run_state("a", "approved", True, True, True)  # keeps capability
+    status_store.update_run_statuses([("b", "rejected", None), ("c", "needs_review", None)])
+    with status_store.transaction():
+        status_store.persist_run_state("d", "ok", False, False, False, capability="triage")
+    with pytest.raises(RuntimeError):
+        with status_store.transaction():
+            status_store.persist_run_state("e", "ok", False, False, False)
+            raise RuntimeError("rolled back with the rollup change")
+    with status_store.get_conn() as c:
+        c.execute("UPDATE run_status SET updated_at = '2020-01-01T05:00:00' WHERE run_id = 'b'")
+        c.execute("DELETE FROM run_status WHERE run_id = 'c'")
+        assert _rollup(c) == _group_by(c)
+        assert c.execute("SELECT COUNT(*) FROM run_status_rollup WHERE n <= 0").fetchone()[0] == 0
+
+
+def test_backfill_rebuilds_from_run_status(capsys):
+    status_store.persist_run_state("a", "ok", False, False, False)
+    status_store.persist_run_state("b", "needs_review", True, True, False, capability="triage")
+    with status_store.get_conn() as c:
+        c.execute("DELETE FROM run_status_rollup")  # DB from before the rollup existed
+
+    assert backfill_rollup.main(["--db", str(status_store.DB_PATH)]) == 0
+    assert '"runs": 2' in capsys.readouterr().out
+    with status_store.get_conn() as c:
+        assert _rollup(c) == _group_by(c)
+
+
+@pytest.mark.asyncio
+async def test_stats_endpoint_groups_and_filters():
+    with status_store.get_conn() as c:
+        c.executemany(
+            "INSERT INTO run_status (run_id, status, hitl_required, approval_required, approval_provided, "
+            "updated_at, capability) VALUES (?, ?, ?, 1, 0, ?, ?)",
+            [
+                ("a", "needs_review", 1, "2026-01-01T10:15:00", "triage"),
+                ("b", "needs_review", 1, "2026-01-01T10:45:00", "other"),
+                ("c", "approved", 0, "2026-01-01T11:00:00", "triage"),
+                ("d", "approved", 0, "2026-01-02T09:00:00", None),
+            ],
+        )
+
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as cl:
+        get = lambda **p: cl.get("/stats", params={"since": "2026-01-01T10:30:00", "until": "2026-01-01T11:59:00", **p})
+
+        r = (await get()).json()
+        assert (r["from_hour"], r["to_hour"], r["total"]) == ("2026-01-01T10", "2026-01-01T11", 3)
+        assert r["items"] == [{"status": "approved", "count": 1}, {"status": "needs_review", "count": 2}]
+
+        r = (await get(group_by="hour,capability", status="needs_review")).json()
+        assert r["group_by"] == ["hour", "capability"]
+        assert r["items"] == [
+            {"hour": "2026-01-01T10", "capability": "other", "count": 1},
+            {"hour": "2026-01-01T10", "capability": "triage", "count": 1},
+        ]
+
+        r = (await get(group_by="", until="2026-01-03T00:00:00", capability="triage")).json()
+        assert r["items"] == [{"count": 2}] and r["total"] == 2
+
+        r = (await get(since="2030-01-01T00:00:00", until="2030-01-02T00:00:00")).json()
+        assert r["items"] == [] and r["total"] == 0
+
+        # Offsets are converted to UTC before bucketing: 12:30+02:00 is the 10:00 UTC hour
+        r = (await get(since="2026-01-01T12:30:00+02:00", until="2026-01-01T05:59:00-06:00")).json()
+        assert (r["from_hour"], r["to_hour"], r["total"]) == ("2026-01-01T10", "2026-01-01T11", 3)
+
+        assert (await get(group_by="status,bogus")).status_code == 400
+        assert (await get(since="yesterday")).status_code == 400
@@ -0,0 +1,72 @@
+﻿import httpx
+import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.persistence import status_store
+
+
+async def _post(json, headers=None):
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.post("/status/batch", json=json, headers=headers or {})
+
+
+def test_load_run_states_one_query_and_cache_invalidated_on_write():
+    status_store.persist_run_state("a", "needs_review", True, True, False)
+    status_store.persist_run_state("b", "ok", False, False, False)
+
+    states = status_store.load_run_states(["b", "a", "missing", "a"])
+    assert list(states) == ["b", "a", "missing"]
+    assert states["a"]["status"] == "needs_review" and states["missing"] is None
+
+    # Cached: a write behind the store's back is not seen ...
+    with status_store.get_conn() as c:
+        c.execute("UPDATE run_status SET status = 'rejected' WHERE run_id = 'a'")
+    assert status_store.load_run_states(["a"])["a"]["status"] == "needs_review"
+    assert status_store.load_run_states(["a"], use_cache=False)["a"]["status"] == "rejected"
+
+    # ... but writes through persist_run_state / update_run_statuses invalidate
+    status_store.persist_run_state("a", "approved", True, True, True)
+    status_store.update_run_statuses([("b", "rejected", None), ("missing", "needs_review", None)])
+    states = status_store.load_run_states(["a", "b", "missing"])
+    assert [states[k]["status"] for k in ("a", "b", "missing")] == ["approved", "rejected", "needs_review"]
+
+
+def test_rolled_back_transaction_does_not_poison_cache():
+    status_store.persist_run_state("a", "needs_review", True, True, False)
+    with pytest.raises(RuntimeError):
+        with status_store.transaction():
+            status_store.persist_run_state("a", "approved", True, True, True)
+            raise RuntimeError("abort")
+    assert status_store.load_run_states(["a"])["a"]["status"] == "needs_review"
+
+
+@pytest.mark.asyncio
+async def test_status_batch_endpoint_etag_roundtrip():
+    status_store.persist_run_state("r1", "needs_review", True, True, False)
+
+    r = await _post({"run_ids": ["r1", "nope"]})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [(it["run_id"], it["status"], it["exists"]) for it in items] == [
+        ("r1", "needs_review", True),
+        ("nope", "NOT_FOUND", False),
+    ]
+    etag = r.headers["etag"]
+
+    again = await _post({"run_ids": ["r1", "nope"]}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag and again.content == b""
+    assert (await _post({"run_ids": ["r1", "nope"]}, headers={"If-None-Match": "W/" + etag})).status_code == 304
+
+    status_store.persist_run_state("r1", "approved", True, True, True)
+    changed = await _post({"run_ids": ["r1", "nope"]}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["items"][0]["status"] == "approved"
+
+
+@pytest.mark.asyncio
+async def test_status_batch_size_limit(monkeypatch):
+    monkeypatch.setenv("NP_STATUS_BATCH_MAX", "3")
+    assert (await _post({"run_ids": []})).status_code == 400
+    assert (await _post({"run_ids": ["a", "b", "c", "d"]})).status_code == 400
+    assert (await _post({"run_ids": ["a", "b", "c"]})).status_code == 200
@@ -0,0 +1,110 @@
+﻿import asyncio
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import gcu_v1.api.server as srv
+from gcu_v1.api.events import SlowConsumer, StatusBus, parse_filter, sse_stream
+from gcu_v1.persistence import status_store
+from gcu_v1.tests.test_api import _install_fake_run_module
+
+
+def _event(run_id, to, capability="doc_triage"):
+    return {"run_id": run_id, "from": "needs_review", "to": to, "capability": capability}
+
+
+@pytest.mark.asyncio
+async def test_filters_and_cross_thread_delivery():
+    bus = StatusBus()
+    sub = bus.subscribe(statuses=parse_filter("approved,rejected"), capabilities=parse_filter("doc_triage"))
+
+    def publisher():
+        bus.publish(_event("r1", "needs_review"))
+        bus.publish(_event("r2", "approved", capability="other"))
+        bus.publish(_event("r3", "rejected"))
+
+    t = threading.Thread(target=publisher)
+    t.start()
+    t.join()
+    got = await sub.get(timeout=1)
+    assert got["run_id"] == "r3" and got["seq"] == 3
+    assert await sub.get(timeout=0.05) is None
+    sub.close()
+    assert bus.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_dropped_and_queue_freed(monkeypatch):
+    monkeypatch.setenv("NP_EVENTS_QUEUE_MAX", "2")
+    bus = StatusBus()
+    slow, fast = bus.subscribe(), bus.subscribe()
+    for i in range(3):
+        bus.publish(_event(f"r{i}", "approved"))
+        await asyncio.sleep(0)
+        await fast.get(timeout=1)
+    await asyncio.sleep(0)
+
+    assert slow.queue.qsize() == 1  # only the overflow marker is left
+    with pytest.raises(SlowConsumer):
+        await slow.get(timeout=1)
+    assert bus.subscriber_count() == 1
+    fast.close()
+
+
+@pytest.mark.asyncio
+async def test_events_wait_for_commit_and_resolve_capability():
+    status_store.persist_run_state("c1", "needs_review", True, True, False, capability="doc_triage")
+    bus = StatusBus(resolve_capability=status_store.capability_of, defer=status_store.after_commit)
+    sub = bus.subscribe(capabilities=parse_filter("doc_triage"))
+    event = {"run_id": "c1", "from": "needs_review", "to": "approved"}
+
+    with pytest.raises(RuntimeError):
+        with status_store.transaction():
+            bus.publish(event)
+            raise RuntimeError("rollback")
+    with status_store.transaction():
+        bus.publish(event)
+        await asyncio.sleep(0)
+        assert sub.queue.empty()
+
+    got = await sub.get(timeout=1)
+    assert (got["run_id"], got["capability"]) == ("c1", "doc_triage")
+    assert sub.queue.empty()
+    sub.close()
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_format():
+    bus = StatusBus()
+    sub = bus.subscribe()
+    stream = sse_stream(sub, keepalive_s=0.05)
+    assert await stream.__anext__() == "retry: 3000\n\n"
+    assert await stream.__anext__() == ": keepalive\n\n"
+
+    bus.publish(_event("s1", "approved"))
+    chunk = await stream.__anext__()
+    lines = chunk.strip().split("\n")
+    assert lines[:2] == ["id: 1", "event: status"]
+    assert json.loads(lines[2][len("data: "):])["run_id"] == "s1"
+    await stream.aclose()
+    assert bus.subscriber_count() == 0
+
+
+def test_websocket_feed_receives_review_transition(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"ok": true}', encoding="utf-8")
+    monkeypatch.setenv("NP_MANIFEST_PATH", str(manifest))
+    _install_fake_run_module(monkeypatch, run_id="ws-1", confidence=0.2)
+    client = TestClient(srv.app)
+
+    with client.websocket_connect("/ws/status?status=approved&capability=np_document_triage") as ws:
+        assert client.post("/run", json={"capability": "np_document_triage", "payload": {"text": "x"}}).status_code == 200
+        body = {"action": "approve", "actor": "alice", "role": "reviewer", "auth_type": "sso"}
+        assert client.post("/review/ws-1", json=body).status_code == 200
+
+        msg = ws.receive_json()
+        assert (msg["type"], msg["run_id"], msg["from"], msg["to"]) == ("status", "ws-1", "needs_review", "approved")
+        assert (msg["actor"], msg["capability"]) == ("alice", "np_document_triage")
+    assert srv.status_bus.subscriber_count() == 0
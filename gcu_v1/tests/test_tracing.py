@@ -0,0 +1,66 @@
+﻿import json
+from pathlib import Path
+
+import pytest
+from prometheus_client import REGISTRY
+
+from gcu_v1.api.run import run_capability
+from gcu_v1.pipeline import tracing
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture(autouse=True)
+def _cwd(monkeypatch):
+    monkeypatch.chdir(PROJECT_ROOT)
+
+
+def _stage_count(stage: str, capability: str) -> float:
+    v = REGISTRY.get_sample_value(
+        "gcu_pipeline_stage_duration_seconds_count", {"stage": stage, "capability": capability}
+    )
+    return v or 0.0
+
+
+def test_sampled_run_records_spans_in_audit_and_metrics(tmp_path, monkeypatch):
+    monkeypatch.setenv("NP_TRACE_SAMPLE_RATE", "1")
+    before = _stage_count("intake", "doc_triage")
+
+    res = run_capability("doc_triage", {"text": "geldwäsche"}, outputs=str(tmp_path))
+    audit = json.loads(Path(res["audit"]).read_text(encoding="utf-8-sig"))
+
+    stages = [s["stage"] for s in audit["trace"]["spans"]]
+    assert stages[:3] == ["input_write", "config_load", "intake"]
+    assert {"governance", "bundle_load", "classification", "threshold"} <= set(stages)
+    assert _stage_count("intake", "doc_triage") == before + 1
+    assert _stage_count("finalize_audit", "doc_triage") >= 1
+
+
+def test_unsampled_run_has_no_trace(tmp_path, monkeypatch):
+    monkeypatch.setenv("NP_TRACE_SAMPLE_RATE", "0")
+    res = run_capability("np_document_triage", {"text": "x"}, outputs=str(tmp_path))
+    audit = json.loads(Path(res["audit"]).read_text(encoding="utf-8-sig"))
+    assert "trace" not in audit
+    assert tracing.start_trace(sample_rate=0.0) is tracing.NULL_TRACER
+
+
+def test_sample_rate_defaults_low_and_is_read_into_snapshot(monkeypatch):
+    from gcu_v1.config import current_config
+
+    monkeypatch.delenv("NP_TRACE_SAMPLE_RATE", raising=False)
+    cfg = current_config()
+    assert cfg.trace_sample_rate == tracing.DEFAULT_SAMPLE_RATE < 0.1
+
+    monkeypatch.setenv("NP_TRACE_SAMPLE_RATE", "1")  # not seen until reload
+    assert current_config().trace_sample_rate == cfg.trace_sample_rate
+
+
+def test_slow_log_timer_for_unsampled_runs_only_sums_stages():
+    timer = tracing.start_trace("x", sample_rate=0.0, force=True)
+    assert isinstance(timer, tracing.StageTimer)
+    for _ in range(3):
+        with timer.span("gov_db"):
+            pass
+    assert list(timer.stage_ms()) == ["gov_db"]
+    assert timer.to_audit() is None and not timer.sampled
+    assert isinstance(tracing.start_trace("x", sample_rate=1.0, force=True), tracing.Tracer)
@@ -0,0 +1,34 @@
+﻿import pytest
+
+import gcu_v1.api.server as srv
+from gcu_v1.api import warmup
+from gcu_v1.tests.test_api import _install_fake_run_module
+import httpx
+
+
+def test_warmup_phases_and_process_start(monkeypatch):
+    phases = warmup.warmup()
+    assert set(phases) == {"imports", "bundles", "sqlite", "classify"}
+    assert all(v >= 0 for v in phases.values())
+    assert 0 < warmup.process_start_time() <= warmup._IMPORT_T0 + 1
+
+
+@pytest.mark.asyncio
+async def test_time_to_first_run_is_recorded_once(tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text('{"ok": true}', encoding="utf-8")
+    monkeypatch.setenv("NP_MANIFEST_PATH", str(manifest))
+    monkeypatch.setattr(warmup, "_first_run_done", False)
+    _install_fake_run_module(monkeypatch, run_id="ttfr-1", confidence=0.95)
+
+    transport = httpx.ASGITransport(app=srv.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        body = {"capability": "np_document_triage", "payload": {"text": "x"}}
+        assert (await c.post("/run", json=body)).status_code == 200
+        first = warmup.TIME_TO_FIRST_RUN_SECONDS._value.get()
+        assert (await c.post("/run", json=body)).status_code == 200
+        m = (await c.get("/metrics")).text
+
+    assert first > 0
+    assert warmup.TIME_TO_FIRST_RUN_SECONDS._value.get() == first
+    assert "gcu_time_to_first_run_seconds" in m